@@ -0,0 +1,89 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Measures the startup cost of the urlquery package, each run in a fresh
+    interpreter:
+
+    * import: "import urlquery",
+    * api: first use of a module level function (loads the API modules),
+    * client: first URLQuery session (loads requests).
+
+    The median of the runs is compared to the budgets (milliseconds), the
+    script exits with status 1 if one of them is exceeded.
+
+        python benchmarks/import_time.py --runs 20 --json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+_probe = r'''
+import json, time
+t0 = time.perf_counter()
+import urlquery
+t1 = time.perf_counter()
+urlquery.reputation
+t2 = time.perf_counter()
+urlquery.URLQuery().transport._session()
+t3 = time.perf_counter()
+print(json.dumps({'import': (t1 - t0) * 1000, 'api': (t2 - t1) * 1000,
+                  'client': (t3 - t2) * 1000}))
+'''
+
+default_budgets = {'import': 5., 'api': 50., 'client': 250.}
+
+
+def measure(runs):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [root] + [p for p in [env.get('PYTHONPATH')] if p])
+    samples = []
+    for _ in range(runs):
+        out = subprocess.check_output([sys.executable, '-c', _probe],
+                                      env=env)
+        samples.append(json.loads(out.decode('utf-8')))
+    results = {}
+    for phase in default_budgets:
+        values = sorted(s[phase] for s in samples)
+        results[phase] = {'median_ms': values[len(values) // 2],
+                          'min_ms': values[0], 'max_ms': values[-1]}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--json', action='store_true',
+                        help='Machine-readable output.')
+    for phase, budget in default_budgets.items():
+        parser.add_argument('--{}-budget'.format(phase), type=float,
+                            default=budget,
+                            help='(ms, default: {})'.format(budget))
+    args = parser.parse_args()
+
+    results = measure(args.runs)
+    over = []
+    for phase, result in results.items():
+        result['budget_ms'] = getattr(args, '{}_budget'.format(phase))
+        if result['median_ms'] > result['budget_ms']:
+            over.append(phase)
+    if args.json:
+        print(json.dumps({'benchmark': 'import_time', 'runs': args.runs,
+                          'python': sys.version.split()[0],
+                          'results': results, 'over_budget': over},
+                         indent=2, sort_keys=True))
+    else:
+        for phase, result in results.items():
+            print('{:8} {:8.2f} ms (budget {:.0f} ms){}'.format(
+                phase, result['median_ms'], result['budget_ms'],
+                ' OVER BUDGET' if phase in over else ''))
+    return 1 if over else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,257 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Local stand-in for the urlquery v3 JSON API, for benchmarks and
+    offline tests. Every method answers with made-up but well-formed
+    objects (see the README), after latency seconds, and error_rate of the
+    requests fail with an HTTP 500.
+
+        python benchmarks/server.py --port 8080 --latency 0.05
+
+    or, from Python:
+
+        server = StandInServer(latency=.05)
+        server.start()
+        uq = URLQuery(base_url=server.url)
+"""
+
+import argparse
+import base64
+import gzip
+import json
+import random
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+_ok = {'status': 'ok'}
+_countries = [('LU', 'Luxembourg'), ('US', 'United States'),
+              ('DE', 'Germany'), ('NO', 'Norway'), ('IE', 'Ireland')]
+
+
+def _url(i):
+    cc, country = _countries[i % len(_countries)]
+    domain = 'example{}.{}'.format(i % 997, cc.lower())
+    return {'addr': 'http://www{}.{}/path/{}?q={}'.format(i % 7, domain, i,
+                                                       i * 31),
+            'fqdn': 'www{}.{}'.format(i % 7, domain), 'domain': domain,
+            'tld': cc.lower(),
+            'ip': {'addr': '10.{}.{}.{}'.format(i % 251, i % 13, i % 199),
+                   'cc': cc, 'country': country, 'asn': 1000 + i % 50,
+                   'as': 'AS{} Example Networks'.format(1000 + i % 50)}}
+
+
+def _settings():
+    return {'useragent': 'Mozilla/5.0', 'referer': '', 'pool': 'default',
+            'access_level': 'public'}
+
+
+class Responses(object):
+    """
+        Builds the response of every method. The large ones (urlfeed and
+        the screenshots of reports) are generated once and reused, so the
+        server spends its time serving rather than building them.
+
+        :param feed_size: Number of URL objects in a urlfeed.
+
+        :param payload_bytes: Size of the screenshot of a detailed report.
+    """
+
+    def __init__(self, feed_size=1000, payload_bytes=65536):
+        self.feed_size = feed_size
+        self.payload_bytes = payload_bytes
+        self._feed = None
+        self._screenshot = None
+        self._lock = threading.Lock()
+
+    def feed(self):
+        with self._lock:
+            if self._feed is None:
+                self._feed = [_url(i) for i in range(self.feed_size)]
+        return self._feed
+
+    def screenshot(self):
+        with self._lock:
+            if self._screenshot is None:
+                data = (b'\x89PNG' * (self.payload_bytes // 4 + 1))[
+                    :self.payload_bytes]
+                self._screenshot = {
+                    'base64_data': base64.b64encode(data).decode('ascii'),
+                    'media_type': 'image/png'}
+        return self._screenshot
+
+    def report(self, report_id, details=False, date=None):
+        report = {'report_id': report_id,
+                  'date': time.strftime('%Y-%m-%d %H:%M:%S',
+                                        time.gmtime(date or time.time())),
+                  'url': _url(hash(str(report_id)) % 100000),
+                  'settings': _settings(), 'urlquery_alert_count': 0,
+                  'ids_alert_count': 1, 'blacklist_alert_count': 0}
+        if details:
+            report['screenshot'] = self.screenshot()
+        return report
+
+    def queue_status(self, queue_id, url=None):
+        return {'status': 'done', 'queue_id': queue_id,
+                'report_id': queue_id, 'priority': 'low',
+                'url': url if url is not None else _url(queue_id),
+                'settings': _settings()}
+
+    def answer(self, query):
+        method = query.get('method')
+        if method == 'urlfeed':
+            start = int(query.get('timestamp') or time.time())
+            step = 86400 if query.get('interval') == 'day' else 3600
+            start -= start % step
+            return {'_response_': _ok, 'start_time': start,
+                    'end_time': start + step, 'feed': self.feed()}
+        if method == 'report':
+            details = query.get('include_details') or \
+                query.get('include_screenshot')
+            response = self.report(query.get('report_id'), details)
+            response['_response_'] = _ok
+            return response
+        if method == 'report_list':
+            start = int(query.get('timestamp') or time.time())
+            limit = int(query.get('limit', 50))
+            return {'_response_': _ok,
+                    'reports': [self.report(start + i, date=start + i)
+                                for i in range(limit)]}
+        if method == 'search':
+            return {'_response_': _ok,
+                    'reports': [self.report(i) for i in range(10)]}
+        if method == 'reputation':
+            return {'_response_': _ok, 'q': query.get('q'),
+                    'reputation': 'unknown'}
+        if method == 'submit':
+            response = self.queue_status(random.randint(1, 1 << 30),
+                                         {'addr': query.get('url')})
+            response['_response_'] = _ok
+            return response
+        if method == 'mass_submit':
+            return [self.queue_status(random.randint(1, 1 << 30),
+                                      {'addr': url})
+                    for url in query.get('urls', [])]
+        if method == 'queue_status':
+            response = self.queue_status(query.get('queue_id'))
+            response['_response_'] = _ok
+            return response
+        if method == 'user_agent_list':
+            return {'_response_': _ok,
+                    'user_agents': ['Mozilla/5.0', 'Opera/9.80']}
+        return {'_response_': {'status': 'error',
+                               'error': 'Unknown method'}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, Nagle's algorithm would
+    # hold the body back until the client acknowledges the headers.
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        config = self.server.config
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        query = json.loads(body.decode('utf-8'))
+        if config.latency:
+            time.sleep(config.latency)
+        if config.error_rate and random.random() < config.error_rate:
+            self._reply(500, b'<html>Internal Server Error</html>', False)
+            return
+        data = json.dumps(config.responses.answer(query)).encode('utf-8')
+        self._reply(200, data, query.get('gzip'))
+
+    def _reply(self, status, data, compressed):
+        self.send_response(status)
+        if compressed:
+            data = gzip.compress(data, 1)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class StandInServer(object):
+    """
+        Threaded HTTP server answering the v3 JSON API on
+        http://host:port/ (port 0 picks a free one, see url).
+
+        :param latency: Seconds waited before answering every request.
+
+        :param error_rate: Fraction of the requests answered with an HTTP
+            500.
+
+        :param feed_size, payload_bytes: See Responses.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0., error_rate=0.,
+                 feed_size=1000, payload_bytes=65536):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.responses = Responses(feed_size, payload_bytes)
+        self._server = _ThreadingHTTPServer((host, port), _Handler)
+        self._server.config = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}/v3/json'.format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.)
+    parser.add_argument('--error-rate', type=float, default=0.)
+    parser.add_argument('--feed-size', type=int, default=1000)
+    parser.add_argument('--payload-bytes', type=int, default=65536)
+    args = parser.parse_args()
+    server = StandInServer(args.host, args.port, args.latency,
+                           args.error_rate, args.feed_size,
+                           args.payload_bytes)
+    # The first line tells the benchmark suite where to connect.
+    print(server.url)
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Client benchmarks against the local stand-in server (server.py), so
+    that runs are reproducible and do not touch the live API:
+
+    * reputation, report: sequential single calls,
+    * report_many: bulk fetch of detailed reports (with screenshots),
+    * urlfeed, iter_urlfeed: large feed pulls, parsed at once or streamed.
+
+    Every scenario runs in a fresh interpreter and reports the throughput,
+    the p50/p99 latency of its operations, the CPU time of the client per
+    operation and its peak memory (RSS).
+
+        python benchmarks/suite.py --latency 0.005 --json --output run.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _root)
+
+scenarios = ['reputation', 'report', 'report_many', 'urlfeed',
+             'iter_urlfeed']
+
+
+def _rss_kb():
+    # Peak resident set size of this process, ru_maxrss is in bytes on
+    # macOS and in kilobytes elsewhere.
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    index = int(round(percent / 100. * (len(values) - 1)))
+    return values[index]
+
+
+transports = {'requests': 'RequestsTransport',
+              'urllib3': 'Urllib3Transport', 'httpx': 'HTTPXTransport'}
+
+
+def _client(base_url, gzip, transport='requests'):
+    from urlquery import URLQuery
+    from urlquery import transport as transport_module
+
+    class TimedURLQuery(URLQuery):
+        # Latency of every request sent, whatever the method sending it.
+        __slots__ = ['latencies']
+
+        def send(self, query):
+            start = time.perf_counter()
+            try:
+                return URLQuery.send(self, query)
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+
+    uq = TimedURLQuery(base_url=base_url, gzip_default=gzip,
+                       transport=getattr(transport_module,
+                                         transports[transport])())
+    uq.latencies = []
+    return uq
+
+
+def _check(response, errors):
+    if isinstance(response, dict) and response.get('error'):
+        errors['APIError'] = errors.get('APIError', 0) + 1
+
+
+def _error(exc, errors):
+    name = type(exc).__name__
+    errors[name] = errors.get(name, 0) + 1
+
+
+def _run_reputation(uq, count, errors):
+    for i in range(count):
+        try:
+            _check(uq.reputation('www.example{}.com'.format(i)), errors)
+        except Exception as e:
+            _error(e, errors)
+    return count, uq.latencies
+
+
+def _run_report(uq, count, errors):
+    for i in range(count):
+        try:
+            _check(uq.report(i), errors)
+        except Exception as e:
+            _error(e, errors)
+    return count, uq.latencies
+
+
+def _run_report_many(uq, count, errors):
+    for report_id, report, error in uq.report_many(range(count),
+                                                   include_details=True):
+        if error is not None:
+            _error(error, errors)
+        else:
+            _check(report, errors)
+    return count, uq.latencies
+
+
+def _run_urlfeed(uq, count, errors):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            _check(uq.urlfeed(), errors)
+        except Exception as e:
+            _error(e, errors)
+        latencies.append(time.perf_counter() - start)
+    return count, latencies
+
+
+def _run_iter_urlfeed(uq, count, errors):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            with uq.iter_urlfeed() as urls:
+                for url in urls:
+                    pass
+        except Exception as e:
+            _error(e, errors)
+        latencies.append(time.perf_counter() - start)
+    return count, latencies
+
+
+def run_scenario(name, base_url, count, gzip=False, transport='requests',
+                 warmup=3):
+    """
+        Runs the scenario name in this process and returns its results.
+        Should be called in a fresh interpreter for the memory figures to
+        be meaningful (see main).
+    """
+    run = globals()['_run_' + name]
+    uq = _client(base_url, gzip, transport)
+    run(uq, warmup, {})
+    del uq.latencies[:]
+    baseline = _rss_kb()
+    errors = {}
+    cpu, wall = time.process_time(), time.perf_counter()
+    operations, latencies = run(uq, count, errors)
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    uq.close()
+    peak = _rss_kb()
+    return {'scenario': name, 'operations': operations,
+            'requests': len(latencies), 'seconds': wall,
+            'throughput_per_s': operations / wall if wall else None,
+            'latency_p50_ms': _percentile(latencies, 50) * 1000,
+            'latency_p99_ms': _percentile(latencies, 99) * 1000,
+            'cpu_ms_per_op': cpu * 1000 / operations,
+            'peak_rss_kb': peak,
+            'peak_rss_delta_kb': peak - baseline if peak else None,
+            'errors': errors}
+
+
+def _start_server(args):
+    command = [sys.executable, os.path.join(_root, 'benchmarks',
+                                            'server.py'),
+               '--port', '0', '--latency', str(args.latency),
+               '--error-rate', str(args.error_rate),
+               '--feed-size', str(args.feed_size),
+               '--payload-bytes', str(args.payload_bytes)]
+    server = subprocess.Popen(command, stdout=subprocess.PIPE)
+    return server, server.stdout.readline().decode('ascii').strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('scenarios', nargs='*', default=scenarios,
+                        metavar='scenario',
+                        help='Among: {} (default: all)'.format(
+                            ', '.join(scenarios)))
+    parser.add_argument('--count', type=int, default=200,
+                        help='Operations per scenario (default: 200, and '
+                        'a tenth of it for the feed pulls).')
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--transport', choices=sorted(transports),
+                        default='requests')
+    parser.add_argument('--latency', type=float, default=0.,
+                        help='Server latency (seconds).')
+    parser.add_argument('--error-rate', type=float, default=0.)
+    parser.add_argument('--feed-size', type=int, default=20000)
+    parser.add_argument('--payload-bytes', type=int, default=65536)
+    parser.add_argument('--base-url',
+                        help='Use a server already running instead of '
+                        'starting one.')
+    parser.add_argument('--json', action='store_true',
+                        help='Machine-readable output.')
+    parser.add_argument('--output', help='Also write the JSON results to '
+                        'this file.')
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        # Child process: one scenario, results on stdout.
+        print(json.dumps(run_scenario(args.run, args.base_url, args.count,
+                                      args.gzip, args.transport)))
+        return 0
+
+    unknown = set(args.scenarios) - set(scenarios)
+    if unknown:
+        parser.error('unknown scenario: {}'.format(', '.join(unknown)))
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server, base_url = _start_server(args)
+    results = []
+    try:
+        for name in args.scenarios:
+            count = args.count
+            if name in ('urlfeed', 'iter_urlfeed'):
+                count = max(1, count // 10)
+            command = [sys.executable, os.path.abspath(__file__),
+                       '--run', name, '--base-url', base_url,
+                       '--count', str(count), '--transport',
+                       args.transport]
+            if args.gzip:
+                command.append('--gzip')
+            out = subprocess.check_output(command)
+            results.append(json.loads(out.decode('utf-8')))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {'benchmark': 'suite', 'python': sys.version.split()[0],
+              'settings': {'gzip': args.gzip, 'transport': args.transport,
+                           'latency': args.latency,
+                           'error_rate': args.error_rate,
+                           'feed_size': args.feed_size,
+                           'payload_bytes': args.payload_bytes},
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        print('{:14} {:>8} {:>10} {:>9} {:>9} {:>9} {:>10} {:>7}'.format(
+            'scenario', 'ops', 'ops/s', 'p50 ms', 'p99 ms', 'cpu ms',
+            'peak MB', 'errors'))
+        for r in results:
+            print('{:14} {:8d} {:10.1f} {:9.2f} {:9.2f} {:9.3f} {:10.1f} '
+                  '{:7d}'.format(
+                      r['scenario'], r['operations'], r['throughput_per_s'],
+                      r['latency_p50_ms'], r['latency_p99_ms'],
+                      r['cpu_ms_per_op'], (r['peak_rss_kb'] or 0) / 1024.,
+                      sum(r['errors'].values())))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
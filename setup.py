@@ -1,6 +1,6 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
-from distutils.core import setup
+from setuptools import setup
 
 setup(
     name='urlquery',
@@ -12,6 +12,14 @@ setup(
     maintainer='Raphaël Vinot',
     maintainer_email='raphael.vinot@circl.lu',
     packages=['urlquery'],
+    python_requires='>=3.7',
+    install_requires=['requests>=2.16.0', 'urllib3>=1.21.1',
+                      'python-dateutil'],
+    extras_require={
+        'aiohttp': ['aiohttp'],
+        'numpy': ['numpy'],
+        'httpx': ['httpx[http2]'],
+    },
     license='GNU GPLv3',
     long_description=open('README.md').read(),
     )
@@ -0,0 +1,178 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import unittest
+from unittest import mock
+
+from urlquery import URLQuery, api, records
+from urlquery.cursor import ReportCursor
+from urlquery.errors import APIError
+
+
+def _report(report_id, date):
+    return {'report_id': report_id, 'date': date}
+
+
+def _page(*reports):
+    return {'_response_': {'status': 'ok'}, 'reports': list(reports)}
+
+
+def _ids(reports):
+    return [records.field(r, 'report_id') for r in reports]
+
+
+class ReportCursorTest(unittest.TestCase):
+
+    def test_page_boundary(self):
+        cursor = ReportCursor(100, None, 4)
+        fresh = cursor.advance(_page(_report(1, 100), _report(2, 101),
+                                     _report(3, 102), _report(4, 102)))
+        self.assertEqual(_ids(fresh), [1, 2, 3, 4])
+        self.assertFalse(cursor.done)
+        # The next page starts at the date of the last report.
+        self.assertEqual(cursor.position, 102)
+        fresh = cursor.advance(_page(_report(3, 102), _report(4, 102),
+                                     _report(5, 102), _report(6, 103)))
+        self.assertEqual(_ids(fresh), [5, 6])
+        self.assertEqual(cursor.position, 103)
+        fresh = cursor.advance(_page(_report(6, 103), _report(7, 104)))
+        self.assertEqual(_ids(fresh), [7])
+        self.assertTrue(cursor.done)
+
+    def test_only_last_date_deduplicated(self):
+        # Only the reports sharing the date of the new position can come
+        # back on the next page.
+        cursor = ReportCursor(100, None, 2)
+        cursor.advance(_page(_report(1, 100), _report(2, 101)))
+        fresh = cursor.advance(_page(_report(1, 101), _report(2, 101)))
+        self.assertEqual(_ids(fresh), [1])
+
+    def test_until(self):
+        cursor = ReportCursor(100, 102, 4)
+        fresh = cursor.advance(_page(_report(1, 100), _report(2, 102),
+                                     _report(3, 103), _report(4, 104)))
+        # 102 is included, the reports after until are dropped.
+        self.assertEqual(_ids(fresh), [1, 2])
+        self.assertTrue(cursor.done)
+
+    def test_until_on_last_report(self):
+        cursor = ReportCursor(100, 103, 2)
+        fresh = cursor.advance(_page(_report(1, 101), _report(2, 103)))
+        self.assertEqual(_ids(fresh), [1, 2])
+        self.assertFalse(cursor.done)
+        self.assertEqual(cursor.position, 103)
+        fresh = cursor.advance(_page(_report(2, 103), _report(3, 104)))
+        self.assertEqual(_ids(fresh), [])
+        self.assertTrue(cursor.done)
+
+    def test_whole_page_same_date(self):
+        cursor = ReportCursor(100, None, 3)
+        fresh = cursor.advance(_page(_report(1, 100), _report(2, 100),
+                                     _report(3, 100)))
+        self.assertEqual(_ids(fresh), [1, 2, 3])
+        # Moves one second forward instead of asking the same page again.
+        self.assertEqual(cursor.position, 101)
+        self.assertFalse(cursor.done)
+        fresh = cursor.advance(_page(_report(4, 101)))
+        self.assertEqual(_ids(fresh), [4])
+        self.assertTrue(cursor.done)
+
+    def test_date_strings(self):
+        cursor = ReportCursor('2014-05-01 12:00:00', None, 2)
+        fresh = cursor.advance(_page(_report(1, '2014-05-01 12:00:00'),
+                                     _report(2, '2014-05-01 12:00:05')))
+        self.assertEqual(_ids(fresh), [1, 2])
+        self.assertEqual(cursor.position, 1398945605)
+        fresh = cursor.advance(_page(_report(2, '2014-05-01 12:00:05')))
+        self.assertEqual(_ids(fresh), [])
+        self.assertTrue(cursor.done)
+
+    def test_records(self):
+        page = records.decode('report_list', _page(_report(1, 100),
+                                                   _report(2, 100)))
+        cursor = ReportCursor(100, None, 2)
+        self.assertEqual(_ids(cursor.advance(page)), [1, 2])
+        self.assertEqual(cursor.position, 101)
+
+    def test_empty_page(self):
+        cursor = ReportCursor(100, None, 2)
+        self.assertEqual(cursor.advance(_page()), [])
+        self.assertTrue(cursor.done)
+        self.assertEqual(cursor.position, 100)
+
+    def test_error(self):
+        cursor = ReportCursor(100, None, 2)
+        error = {'_response_': {'status': 'error', 'error': 'Invalid key'}}
+        with self.assertRaises(APIError) as e:
+            cursor.advance(error)
+        self.assertEqual(e.exception.response, error)
+
+
+class FakeReportList(URLQuery):
+    # report_list answered from reports, sorted by date: the reports
+    # created at or after timestamp, limit at most.
+    __slots__ = ['reports', 'calls']
+
+    def report_list(self, timestamp=None, limit=50, gzip=False,
+                    apikey=None):
+        self.calls.append((timestamp, limit, gzip, apikey))
+        return _page(*[r for r in self.reports
+                       if r['date'] >= timestamp][:limit])
+
+
+def _client(reports):
+    client = FakeReportList()
+    client.reports = reports
+    client.calls = []
+    return client
+
+
+class IterReportsTest(unittest.TestCase):
+
+    reports = [_report(i, 100 + i // 3) for i in range(20)]
+
+    def test_iter_reports(self):
+        for page_size in (1, 2, 3, 4, 5, 50):
+            client = _client(self.reports)
+            found = list(client.iter_reports(100, page_size=page_size))
+            if page_size <= 3:
+                # Three reports per second: a page of them all has the
+                # same date and the next ones of that second are skipped.
+                self.assertEqual(len(set(_ids(found))), len(found))
+            else:
+                self.assertEqual(_ids(found), list(range(20)),
+                                 'page_size {}'.format(page_size))
+
+    def test_until(self):
+        client = _client(self.reports)
+        found = list(client.iter_reports(101, 103, page_size=4))
+        self.assertEqual(_ids(found), list(range(3, 12)))
+
+    def test_module_function_delegates(self):
+        client = _client(self.reports)
+        with mock.patch.object(api, 'default_client', return_value=client):
+            found = list(api.iter_reports(100, page_size=7))
+        self.assertEqual(_ids(found), list(range(20)))
+        # The defaults of the module level functions: no key is ''.
+        self.assertEqual(client.calls[0], (100, 7, False, ''))
+
+    def test_module_function_gzip_default(self):
+        client = _client(self.reports)
+        with mock.patch.object(api, 'default_client', return_value=client), \
+                mock.patch.object(api, 'gzip_default', True):
+            list(api.iter_reports(100, page_size=50, apikey='key'))
+        self.assertEqual(client.calls, [(100, 50, True, 'key')])
+
+    def test_other_module_functions_delegate(self):
+        client = mock.Mock()
+        with mock.patch.object(api, 'default_client', return_value=client):
+            api.backfill(100, 200, 'flagged', 'day', 2, None, True)
+            api.report_many([1, 2], max_workers=3, apikey='key')
+        client.backfill.assert_called_once_with(100, 200, 'flagged', 'day',
+                                                2, None, True, '')
+        client.report_many.assert_called_once_with(
+            [1, 2], 0, False, False, False, 3, False, False, 'key')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,245 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from urlquery import ratelimit
+from urlquery.ratelimit import RateLimiter, TokenBucket, retry_after
+
+
+class Clock(object):
+    # Stands for the time module in urlquery.ratelimit.
+
+    def __init__(self, now=1000.):
+        self.now = now
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def _query(method='report', key='key'):
+    return {'method': method, 'key': key}
+
+
+class RetryAfterTest(unittest.TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(retry_after('120'), 120.)
+        self.assertEqual(retry_after(' 5 '), 5.)
+        self.assertEqual(retry_after('0'), 0.)
+
+    def test_http_date(self):
+        date = 'Wed, 21 Oct 2015 07:28:00 GMT'
+        self.assertEqual(retry_after(date, 1445412480 - 30), 30.)
+        self.assertEqual(retry_after('Wed, 21 Oct 2015 09:28:00 +0200',
+                                     1445412480 - 30), 30.)
+        # A date in the past: no wait.
+        self.assertEqual(retry_after(date, 1445412480 + 30), 0.)
+
+    def test_invalid(self):
+        self.assertIsNone(retry_after(None))
+        self.assertIsNone(retry_after(''))
+        self.assertIsNone(retry_after('soon'))
+        self.assertIsNone(retry_after('-1'))
+        self.assertIsNone(retry_after('1.5'))
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def bucket(self, rate, burst=None, now=1000.):
+        with mock.patch.object(ratelimit, 'time', Clock(now)):
+            return TokenBucket(rate, burst)
+
+    def test_reserve(self):
+        bucket = self.bucket(2., burst=2)
+        self.assertEqual([bucket.reserve(1000.) for _ in range(4)],
+                         [0., 0., .5, 1.])
+        # One second later: two tokens paid the debt back.
+        self.assertEqual(bucket.reserve(1001.), .5)
+        # Refilled up to burst only.
+        self.assertEqual(bucket.reserve(1100.), 0.)
+        self.assertEqual(bucket.reserve(1100.), 0.)
+        self.assertEqual(bucket.reserve(1100.), .5)
+
+    def test_default_burst(self):
+        self.assertEqual(self.bucket(5.).burst, 5.)
+        self.assertEqual(self.bucket(.5).burst, 1.)
+        self.assertEqual(self.bucket(None).burst, 1.)
+
+    def test_no_rate(self):
+        bucket = self.bucket(None)
+        self.assertEqual([bucket.reserve(1000.) for _ in range(100)],
+                         [0.] * 100)
+
+    def test_pause(self):
+        bucket = self.bucket(2., burst=2)
+        bucket.pause(1000., 10.)
+        # No token until the end of the pause, then restarts empty.
+        self.assertEqual(bucket.reserve(1000.), 10.5)
+        self.assertEqual(bucket.reserve(1005.), 6.)
+        self.assertEqual(bucket.reserve(1011.), .5)
+        # A shorter pause does not shorten the current one.
+        bucket = self.bucket(2., burst=2)
+        bucket.pause(1000., 10.)
+        bucket.pause(1000., 1.)
+        self.assertEqual(bucket.reserve(1000.), 10.5)
+
+    def test_pause_without_rate(self):
+        # Retry-After is honoured even without a rate.
+        bucket = self.bucket(None)
+        bucket.pause(1000., 3.)
+        self.assertEqual(bucket.reserve(1001.), 2.)
+        self.assertEqual(bucket.reserve(1003.), 0.)
+
+    def test_throttled(self):
+        bucket = self.bucket(10.)
+        bucket.throttled(1000., .5, .1, 1.)
+        self.assertEqual(bucket.rate, 5.)
+        # Within delay of the last decrease: calls already in flight.
+        bucket.throttled(1000.5, .5, .1, 1.)
+        self.assertEqual(bucket.rate, 5.)
+        bucket.throttled(1001., .5, .1, 1.)
+        self.assertEqual(bucket.rate, 2.5)
+        for i in range(10):
+            bucket.throttled(1002. + i, .5, .1, 1.)
+        self.assertEqual(bucket.rate, .1)
+
+    def test_succeeded(self):
+        bucket = self.bucket(10.)
+        bucket.succeeded(1000., .5)
+        self.assertEqual(bucket.rate, 10.)
+        bucket.throttled(1000., .5, .1, 1.)
+        bucket.succeeded(1004., .5)
+        self.assertEqual(bucket.rate, 7.)
+        bucket.succeeded(1005., .5)
+        self.assertEqual(bucket.rate, 7.5)
+        # Up to the configured rate only.
+        bucket.succeeded(2000., .5)
+        self.assertEqual(bucket.rate, 10.)
+
+    def test_state(self):
+        bucket = self.bucket(10.)
+        bucket.throttled(1000., .5, .1, 1.)
+        bucket.reserve(1000.)
+        other = self.bucket(10.)
+        other.restore(bucket.state())
+        self.assertEqual(other.state(), bucket.state())
+        self.assertEqual(other.reserve(1000.), bucket.reserve(1000.))
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch.object(ratelimit, 'time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_global_rate(self):
+        limiter = RateLimiter(rate=2., burst=1)
+        self.assertEqual(limiter.reserve(_query()), 0.)
+        self.assertEqual(limiter.reserve(_query('search', 'other')), .5)
+        self.clock.now += 1.
+        self.assertEqual(limiter.reserve(_query()), 0.)
+
+    def test_no_rate(self):
+        limiter = RateLimiter()
+        for _ in range(100):
+            self.assertEqual(limiter.reserve(_query()), 0.)
+        self.assertEqual(limiter.rates(),
+                         {'*:*': None, 'method:report': None,
+                          'key:' + limiter._names(_query())[2][1]: None})
+
+    def test_method_rate(self):
+        limiter = RateLimiter(methods={'mass_submit': 1.})
+        self.assertEqual(limiter.reserve(_query('mass_submit')), 0.)
+        self.assertEqual(limiter.reserve(_query('mass_submit')), 1.)
+        self.assertEqual(limiter.reserve(_query('report')), 0.)
+
+    def test_key_rate(self):
+        limiter = RateLimiter(keys={'slow': .5}, key_rate=1.)
+        self.assertEqual(limiter.reserve(_query(key='a')), 0.)
+        self.assertEqual(limiter.reserve(_query(key='a')), 1.)
+        self.assertEqual(limiter.reserve(_query(key='b')), 0.)
+        self.assertEqual(limiter.reserve(_query(key='slow')), 0.)
+        self.assertEqual(limiter.reserve(_query(key='slow')), 2.)
+        # Keys are only known by their hash.
+        self.assertFalse(any('slow' in name for name in limiter.rates()))
+
+    def test_acquire(self):
+        limiter = RateLimiter(rate=1., burst=1)
+        limiter.acquire(_query())
+        limiter.acquire(_query())
+        self.assertEqual(self.clock.slept, [1.])
+
+    def test_throttled(self):
+        limiter = RateLimiter(rate=10., decrease=.5, increase=1.)
+        self.assertTrue(limiter.feedback(_query(), 429, '3'))
+        self.assertEqual(limiter.rates()['*:*'], 5.)
+        # Paused for Retry-After, then empty.
+        self.assertEqual(limiter.reserve(_query()), 3. + .2)
+        self.clock.now += 10.
+        self.assertFalse(limiter.feedback(_query(), 200))
+        self.assertEqual(limiter.rates()['*:*'], 10.)
+
+    def test_throttled_without_retry_after(self):
+        limiter = RateLimiter()
+        self.assertTrue(limiter.feedback(_query(), 429))
+        self.assertEqual(limiter.reserve(_query()), 1.)
+        # A 503 is only a throttling with a Retry-After.
+        self.assertFalse(limiter.feedback(_query(), 503))
+        self.assertTrue(limiter.feedback(_query(), 503, '2'))
+        self.assertFalse(limiter.feedback(_query(), 500, '2'))
+
+    def test_throttled_http_date(self):
+        self.clock.now = 1445412480 - 30
+        limiter = RateLimiter()
+        limiter.feedback(_query(), 429, 'Wed, 21 Oct 2015 07:28:00 GMT')
+        self.assertEqual(limiter.reserve(_query()), 30.)
+
+
+@unittest.skipIf(ratelimit.fcntl is None, 'needs fcntl')
+class SharedRateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch.object(ratelimit, 'time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'rates.json')
+
+    def test_shared_tokens(self):
+        first = RateLimiter(rate=1., burst=1, path=self.path)
+        second = RateLimiter(rate=1., burst=1, path=self.path)
+        self.assertEqual(first.reserve(_query()), 0.)
+        self.assertEqual(second.reserve(_query()), 1.)
+        self.assertEqual(first.reserve(_query()), 2.)
+
+    def test_shared_throttling(self):
+        first = RateLimiter(rate=4., path=self.path)
+        second = RateLimiter(rate=4., path=self.path)
+        first.feedback(_query(), 429, '5')
+        self.assertEqual(second.reserve(_query()), 5. + .5)
+        self.assertEqual(second.rates()['*:*'], 2.)
+
+    def test_corrupt_file(self):
+        with open(self.path, 'w') as f:
+            f.write('not json')
+        limiter = RateLimiter(rate=1., burst=1, path=self.path)
+        self.assertEqual(limiter.reserve(_query()), 0.)
+        self.assertEqual(limiter.reserve(_query()), 1.)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from urlquery.store import (DETAILS, DOMAIN_GRAPH, SCREENSHOT, ReportStore,
+                            flags)
+
+
+def _query(report_id=1, key='key', recent_limit=0, **includes):
+    query = {'method': 'report', 'report_id': report_id, 'key': key,
+             'recent_limit': recent_limit}
+    query.update(includes)
+    return query
+
+
+def _report(report_id=1, blobs=(), **fields):
+    report = {'_response_': {'status': 'ok'}, 'report_id': report_id,
+              'url': {'addr': 'http://www.example.com/'}}
+    for name in blobs:
+        report[name] = {'base64_data': 'AAAA', 'media_type': 'image/png'}
+    report.update(fields)
+    return report
+
+
+class ReportStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'reports.db')
+        self.store = ReportStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_flags(self):
+        self.assertEqual(flags(_query()), 0)
+        self.assertEqual(flags(_query(include_details=True,
+                                      include_domain_graph=True)),
+                         DETAILS | DOMAIN_GRAPH)
+        self.assertEqual(flags(_query(include_screenshot=True)), SCREENSHOT)
+        self.assertEqual(flags(_query(include_screenshot=False)), 0)
+
+    def test_round_trip(self):
+        self.assertIsNone(self.store.get(_query()))
+        self.store.put(_query(), _report())
+        self.assertEqual(self.store.get(_query()), _report())
+        self.assertEqual(len(self.store), 1)
+        # Same key: replaced.
+        self.store.put(_query(), _report())
+        self.assertEqual(len(self.store), 1)
+
+    def test_superset(self):
+        full = _query(include_details=True, include_screenshot=True,
+                      include_domain_graph=True)
+        self.store.put(full, _report(blobs=['screenshot', 'domain_graph']))
+        self.assertEqual(self.store.get(_query(include_details=True)),
+                         _report())
+        self.assertEqual(self.store.get(_query(include_screenshot=True)),
+                         _report(blobs=['screenshot']))
+        self.assertEqual(self.store.get(full),
+                         _report(blobs=['screenshot', 'domain_graph']))
+
+    def test_subset_does_not_answer(self):
+        self.store.put(_query(include_details=True), _report())
+        self.assertIsNone(self.store.get(_query(include_screenshot=True)))
+        self.assertIsNone(self.store.get(_query(include_details=True,
+                                                include_domain_graph=True)))
+
+    def test_smallest_superset(self):
+        # The copy with the fewest extra details answers.
+        self.store.put(_query(include_details=True,
+                              include_screenshot=True),
+                       _report(blobs=['screenshot'], marker='details'))
+        self.store.put(_query(include_screenshot=True),
+                       _report(blobs=['screenshot'], marker='screenshot'))
+        self.assertEqual(self.store.get(
+            _query(include_screenshot=True))['marker'], 'screenshot')
+        self.assertEqual(self.store.get(
+            _query(include_details=True))['marker'], 'details')
+
+    def test_unrequested_blobs_removed(self):
+        self.store.put(_query(include_screenshot=True,
+                              include_domain_graph=True),
+                       _report(blobs=['screenshot', 'domain_graph']))
+        report = self.store.get(_query())
+        self.assertNotIn('screenshot', report)
+        self.assertNotIn('domain_graph', report)
+        report = self.store.get(_query(include_domain_graph=True))
+        self.assertNotIn('screenshot', report)
+        self.assertIn('domain_graph', report)
+
+    def test_api_keys_apart(self):
+        self.store.put(_query(key='private'), _report(marker='private'))
+        self.assertIsNone(self.store.get(_query(key='other')))
+        self.assertIsNone(self.store.get(_query(key=None)))
+        self.store.put(_query(key=None), _report())
+        # No key and an empty key are the same scope.
+        self.assertEqual(self.store.get(_query(key='')), _report())
+        self.assertIn('marker', self.store.get(_query(key='private')))
+
+    def test_report_id_and_recent_limit(self):
+        self.store.put(_query(report_id=1), _report(1))
+        self.assertIsNone(self.store.get(_query(report_id=2)))
+        self.assertEqual(self.store.get(_query(report_id='1')), _report(1))
+        self.assertIsNone(self.store.get(_query(recent_limit=5)))
+        self.assertEqual(self.store.get(_query(recent_limit=None)),
+                         _report(1))
+
+    def test_compact(self):
+        self.store.put(_query(), _report())
+        self.store.put(_query(include_details=True), _report())
+        self.store.put(_query(include_details=True, include_screenshot=True),
+                       _report(blobs=['screenshot']))
+        # Not a superset of the screenshot only copy.
+        self.store.put(_query(include_domain_graph=True),
+                       _report(blobs=['domain_graph']))
+        # Other scope and other report: kept.
+        self.store.put(_query(key='other'), _report())
+        self.store.put(_query(report_id=2), _report(2))
+        self.assertEqual(len(self.store), 6)
+        self.assertEqual(self.store.compact(), 2)
+        self.assertEqual(len(self.store), 4)
+        self.assertEqual(self.store.get(_query()), _report())
+        self.assertEqual(self.store.get(_query(include_domain_graph=True)),
+                         _report(blobs=['domain_graph']))
+        self.assertEqual(self.store.get(_query(key='other')), _report())
+        self.assertEqual(self.store.compact(), 0)
+
+    def test_shared_file(self):
+        self.store.put(_query(), _report())
+        other = ReportStore(self.path)
+        try:
+            self.assertEqual(other.get(_query()), _report())
+            other.put(_query(report_id=2), _report(2))
+        finally:
+            other.close()
+        self.assertEqual(self.store.get(_query(report_id=2)), _report(2))
+
+
+if __name__ == '__main__':
+    unittest.main()
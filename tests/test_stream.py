@@ -0,0 +1,167 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+import os
+import sys
+import unittest
+
+from urlquery import URLQuery
+from urlquery.compression import TransferStats, decompress_chunks
+from urlquery.errors import APIError
+from urlquery.stream import ArrayParser, FeedStream
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'benchmarks'))
+from server import StandInServer  # noqa: E402
+
+
+_feed = [
+    {'addr': u'http://www.exämple.lu/pàth?q=1', 'fqdn': u'www.exämple.lu',
+     'ip': {'addr': '10.0.0.1', 'cc': 'LU', 'asn': 1234}},
+    {'addr': u'http://例え.jp/', 'fqdn': u'例え.jp', 'ip': None},
+    {'addr': 'http://www.example.com/"quoted"/[]{},:',
+     'fqdn': 'www.example.com', 'ip': {'addr': '10.0.0.2', 'asn': 7}},
+]
+_urlfeed = {'_response_': {'status': 'ok'}, 'start_time': 1400000000,
+            'feed': _feed, 'end_time': 1400003600}
+_error = {'_response_': {'status': 'error', 'error': u'Invalid kéy'}}
+
+
+def _body(response):
+    return json.dumps(response, ensure_ascii=False, indent=1).encode('utf-8')
+
+
+def _splits(body):
+    # The body cut in two at every byte offset.
+    for i in range(len(body) + 1):
+        yield i, [body[:i], body[i:]]
+
+
+class ArrayParserTest(unittest.TestCase):
+
+    def parse(self, chunks):
+        parser = ArrayParser('feed')
+        items = []
+        for chunk in chunks:
+            items.extend(parser.feed(chunk))
+        items.extend(parser.feed(b'', True))
+        return items, parser
+
+    def test_split_at_every_offset(self):
+        body = _body(_urlfeed)
+        for i, chunks in _splits(body):
+            items, parser = self.parse(chunks)
+            self.assertEqual(items, _feed, 'split at {}'.format(i))
+            self.assertEqual(parser.metadata['start_time'], 1400000000)
+            self.assertEqual(parser.metadata['end_time'], 1400003600)
+            self.assertNotIn('feed', parser.metadata)
+
+    def test_byte_by_byte(self):
+        body = _body(_urlfeed)
+        items, parser = self.parse(body[i:i + 1] for i in range(len(body)))
+        self.assertEqual(items, _feed)
+        self.assertEqual(parser.metadata['end_time'], 1400003600)
+
+    def test_compact_body(self):
+        body = json.dumps(_urlfeed, separators=(',', ':')).encode('utf-8')
+        for i, chunks in _splits(body):
+            self.assertEqual(self.parse(chunks)[0], _feed)
+
+    def test_error_body(self):
+        body = _body(_error)
+        for i, chunks in _splits(body):
+            items, parser = self.parse(chunks)
+            self.assertEqual(items, [])
+            self.assertEqual(parser.metadata, _error)
+            self.assertRaises(APIError, parser.check)
+
+    def test_truncated_body(self):
+        body = _body(_urlfeed)
+        for i in range(len(body)):
+            self.assertRaises(ValueError, self.parse, [body[:i]])
+
+    def test_not_an_object(self):
+        self.assertRaises(ValueError, self.parse, [b'[1, 2]'])
+        self.assertRaises(ValueError, self.parse, [b'{"feed": []} {}'])
+
+
+class FeedStreamTest(unittest.TestCase):
+
+    def stream(self, chunks):
+        closed = []
+        stream = FeedStream(iter(chunks), 'feed', lambda: closed.append(1))
+        return stream, closed
+
+    def test_split_at_every_offset(self):
+        body = _body(_urlfeed)
+        for i, chunks in _splits(body):
+            stream, closed = self.stream(chunks)
+            with stream:
+                self.assertEqual(list(stream), _feed)
+            self.assertEqual(stream.start_time, 1400000000)
+            self.assertEqual(stream.end_time, 1400003600)
+            self.assertEqual(closed, [1])
+
+    def test_gzip_split_at_every_offset(self):
+        body = gzip.compress(_body(_urlfeed))
+        for i, chunks in _splits(body):
+            stats = TransferStats('urlfeed')
+            stream, closed = self.stream(decompress_chunks(chunks, stats))
+            self.assertEqual(list(stream), _feed)
+            self.assertEqual(stats.response_wire_bytes, len(body))
+
+    def test_error_body(self):
+        body = _body(_error)
+        for i, chunks in _splits(body):
+            stream, closed = self.stream(chunks)
+            with self.assertRaises(APIError) as e:
+                list(stream)
+            self.assertEqual(e.exception.response, _error)
+            self.assertEqual(closed, [1])
+
+    def test_truncated_body_closes(self):
+        body = _body(_urlfeed)
+        stream, closed = self.stream([body[:len(body) // 2]])
+        self.assertRaises(ValueError, list, stream)
+        self.assertEqual(closed, [1])
+
+    def test_hook(self):
+        stream, closed = self.stream([_body(_urlfeed)])
+        stream._hook = lambda url: url['fqdn']
+        self.assertEqual(list(stream), [url['fqdn'] for url in _feed])
+
+
+class StandInServerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StandInServer(feed_size=300).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def test_iter_urlfeed(self):
+        for gzip_enabled in (False, True):
+            with URLQuery(base_url=self.server.url,
+                          gzip_default=gzip_enabled) as uq:
+                expected = uq.urlfeed(timestamp=1400000000)
+                # Small chunks cut the body inside most values.
+                with uq.iter_urlfeed(timestamp=1400000000,
+                                     chunk_size=7) as urls:
+                    self.assertEqual(list(urls), expected['feed'])
+                    self.assertEqual(urls.start_time,
+                                     expected['start_time'])
+                    self.assertEqual(urls.end_time, expected['end_time'])
+
+    def test_error_response(self):
+        with URLQuery(base_url=self.server.url) as uq:
+            query = uq._prepare({'method': 'unknown'})
+            with self.assertRaises(APIError):
+                list(uq.stream(query, 'feed', chunk_size=5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from datetime import date, datetime, timedelta, timezone
+import unittest
+
+from urlquery.timeutil import (last_closed, query_timestamp, slice_end,
+                               slice_start, slices, to_epoch)
+
+
+# 2014-05-01 00:00:00 and 12:00:00 UTC.
+_day = 1398902400
+_noon = _day + 12 * 3600
+
+
+class ToEpochTest(unittest.TestCase):
+
+    def test_iso_date(self):
+        self.assertEqual(to_epoch('2014-05-01'), _day)
+        self.assertEqual(to_epoch(' 2014-05-01 '), _day)
+
+    def test_iso_without_timezone(self):
+        # Taken as UTC.
+        self.assertEqual(to_epoch('2014-05-01T12:00:00'), _noon)
+        self.assertEqual(to_epoch('2014-05-01 12:00:00'), _noon)
+        self.assertEqual(to_epoch('2014-05-01T12:00'), _noon)
+
+    def test_iso_with_timezone(self):
+        self.assertEqual(to_epoch('2014-05-01T12:00:00Z'), _noon)
+        self.assertEqual(to_epoch('2014-05-01t12:00:00z'), _noon)
+        self.assertEqual(to_epoch('2014-05-01T14:00:00+02:00'), _noon)
+        self.assertEqual(to_epoch('2014-05-01T14:00:00+0200'), _noon)
+        self.assertEqual(to_epoch('2014-05-01T14:00:00+02'), _noon)
+        self.assertEqual(to_epoch('2014-05-01T06:30:00-05:30'), _noon)
+
+    def test_iso_with_fraction(self):
+        self.assertEqual(to_epoch('2014-05-01T12:00:00.5'), _noon + .5)
+        self.assertEqual(to_epoch('2014-05-01T12:00:00,25Z'), _noon + .25)
+        self.assertEqual(to_epoch('2014-05-01 14:00:00.5+02:00'),
+                         _noon + .5)
+        # Digits after the microseconds are ignored.
+        self.assertAlmostEqual(to_epoch('2014-05-01T12:00:00.1234567'),
+                               _noon + .123456, places=6)
+
+    def test_datetime(self):
+        self.assertEqual(to_epoch(datetime(2014, 5, 1, 12)), _noon)
+        self.assertEqual(to_epoch(datetime(2014, 5, 1, 12, 0, 0, 500000)),
+                         _noon + .5)
+        aware = datetime(2014, 5, 1, 14, tzinfo=timezone(timedelta(hours=2)))
+        self.assertEqual(to_epoch(aware), _noon)
+        self.assertEqual(to_epoch(datetime(2014, 5, 1, 12,
+                                           tzinfo=timezone.utc)), _noon)
+
+    def test_date(self):
+        self.assertEqual(to_epoch(date(2014, 5, 1)), _day)
+
+    def test_numbers(self):
+        self.assertEqual(to_epoch(_noon), _noon)
+        self.assertEqual(to_epoch(_noon + .5), _noon + .5)
+        self.assertIsInstance(to_epoch(_noon), float)
+
+    def test_dateutil_fallback(self):
+        self.assertEqual(to_epoch('May 1 2014 12:00'), _noon)
+        self.assertEqual(to_epoch('Thu, 01 May 2014 14:00:00 +0200'), _noon)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError) as e:
+            to_epoch('not a date')
+        self.assertEqual(str(e.exception),
+                         "Unable to convert time to timestamp: 'not a date'")
+        # Out of range ISO-8601 fields go to dateutil, which fails too.
+        self.assertRaises(ValueError, to_epoch, '2014-13-01')
+        self.assertRaises(ValueError, to_epoch, None)
+        self.assertRaises(ValueError, to_epoch, True)
+        self.assertRaises(ValueError, to_epoch, [_noon])
+
+    def test_query_timestamp(self):
+        query = {}
+        self.assertEqual(query_timestamp(query, '2014-05-01'), _day)
+        self.assertEqual(query, {})
+        self.assertIsNone(query_timestamp(query, 'not a date'))
+        self.assertEqual(query['error'],
+                         "Unable to convert time to timestamp: 'not a date'")
+
+
+class SliceTest(unittest.TestCase):
+
+    def test_slice_start(self):
+        self.assertEqual(slice_start(_noon, 'hour'), _noon)
+        self.assertEqual(slice_start(_noon + 3599.9, 'hour'), _noon)
+        self.assertEqual(slice_start(_noon + 3600, 'hour'), _noon + 3600)
+        self.assertEqual(slice_start(_noon - .5, 'hour'), _noon - 3600)
+        self.assertEqual(slice_start(_noon, 'day'), _day)
+        self.assertEqual(slice_start('2014-05-01T23:59:59Z', 'day'), _day)
+        self.assertEqual(slice_start('2014-05-02T00:00:00Z', 'day'),
+                         _day + 86400)
+
+    def test_slice_end(self):
+        self.assertEqual(slice_end(_noon, 'hour'), _noon + 3600)
+        self.assertEqual(slice_end(_noon + 3599, 'hour'), _noon + 3600)
+        self.assertEqual(slice_end(_noon, 'day'), _day + 86400)
+
+    def test_last_closed(self):
+        self.assertEqual(last_closed('hour', _noon + 10), _noon)
+        self.assertEqual(last_closed('hour', _noon), _noon)
+        self.assertEqual(last_closed('day', _noon), _day)
+        self.assertLessEqual(last_closed('hour'), to_epoch(datetime.now(
+            timezone.utc)))
+
+    def test_slices(self):
+        self.assertEqual(list(slices(_noon, _noon + 3 * 3600, 'hour')),
+                         [_noon, _noon + 3600, _noon + 7200])
+        # Partial slices at both ends overlap the range.
+        self.assertEqual(list(slices(_noon + 1800, _noon + 3601, 'hour')),
+                         [_noon, _noon + 3600])
+        self.assertEqual(list(slices(_noon, _noon + 1, 'day')), [_day])
+        self.assertEqual(list(slices('2014-05-01', '2014-05-03', 'day')),
+                         [_day, _day + 86400])
+
+    def test_empty_slices(self):
+        self.assertEqual(list(slices(_noon, _noon, 'hour')), [])
+        self.assertEqual(list(slices(_noon + 3600, _noon, 'hour')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
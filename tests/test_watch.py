@@ -0,0 +1,183 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import ipaddress
+import random
+import unittest
+
+from urlquery import records
+from urlquery.watch import Automaton, PrefixTable, WatchList
+
+
+def _naive(patterns, text):
+    found = set()
+    for pattern, values in patterns.items():
+        if pattern in text:
+            found |= set(values)
+    return found
+
+
+class AutomatonTest(unittest.TestCase):
+
+    def test_overlapping(self):
+        patterns = {'he': ['he'], 'she': ['she'], 'his': ['his'],
+                    'hers': ['hers']}
+        automaton = Automaton(patterns)
+        self.assertEqual(automaton.search('ushers'), {'he', 'she', 'hers'})
+        self.assertEqual(automaton.search('ahishe'), {'his', 'she', 'he'})
+        self.assertEqual(automaton.search('hhhh'), set())
+
+    def test_pattern_in_another(self):
+        automaton = Automaton({'paypal': ['long'], 'pal': ['short'],
+                               'ypa': ['middle']})
+        self.assertEqual(automaton.search('www.paypal.com'),
+                         {'long', 'short', 'middle'})
+        # Only found through the failure links of the longer pattern.
+        self.assertEqual(automaton.search('paypa'), {'middle'})
+        self.assertEqual(automaton.search('paypai-pal'), {'middle', 'short'})
+
+    def test_same_prefix(self):
+        automaton = Automaton({'abc': [1], 'abd': [2], 'ab': [3]})
+        self.assertEqual(automaton.search('xabd'), {2, 3})
+        self.assertEqual(automaton.search('aab'), {3})
+        self.assertEqual(automaton.search('abab'), {3})
+
+    def test_values_merged(self):
+        automaton = Automaton({'bank': ['a', 'b'], 'ban': ['c']})
+        self.assertEqual(automaton.search('banking'), {'a', 'b', 'c'})
+
+    def test_no_patterns(self):
+        self.assertEqual(Automaton({}).search('anything'), set())
+
+    def test_random(self):
+        # Against a naive search, the transitions remembered by a search
+        # being reused by the next ones.
+        rng = random.Random(42)
+        patterns = dict((''.join(rng.choice('abc')
+                                 for _ in range(rng.randint(1, 5))), [i])
+                        for i in range(40))
+        automaton = Automaton(patterns)
+        for _ in range(300):
+            text = ''.join(rng.choice('abcd')
+                           for _ in range(rng.randint(0, 30)))
+            self.assertEqual(automaton.search(text),
+                             _naive(patterns, text), text)
+
+
+class PrefixTableTest(unittest.TestCase):
+
+    blocks = {'10.0.0.0/8': ['a'], '10.1.0.0/16': ['b'],
+              '10.1.2.0/24': ['c'], '10.1.2.3/32': ['d'],
+              '192.0.2.0/25': ['e'], '0.0.0.0/0': ['any4'],
+              '2001:db8::/32': ['f'], '2001:db8:1::/48': ['g'],
+              '2001:db8:1:2::/64': ['h'], '2001:db8:1:2::1/128': ['i']}
+
+    def setUp(self):
+        self.table = PrefixTable(self.blocks)
+
+    def test_ipv4(self):
+        search = self.table.search
+        self.assertEqual(search('10.1.2.3'), {'any4', 'a', 'b', 'c', 'd'})
+        self.assertEqual(search('10.1.2.4'), {'any4', 'a', 'b', 'c'})
+        self.assertEqual(search('10.1.3.1'), {'any4', 'a', 'b'})
+        self.assertEqual(search('10.2.0.1'), {'any4', 'a'})
+        self.assertEqual(search('11.0.0.1'), {'any4'})
+        self.assertEqual(search('192.0.2.127'), {'any4', 'e'})
+        self.assertEqual(search('192.0.2.128'), {'any4'})
+
+    def test_ipv6(self):
+        search = self.table.search
+        self.assertEqual(search('2001:db8:1:2::1'), {'f', 'g', 'h', 'i'})
+        self.assertEqual(search('2001:db8:1:2::2'), {'f', 'g', 'h'})
+        self.assertEqual(search('2001:db8:1:3::1'), {'f', 'g'})
+        self.assertEqual(search('2001:db8:2::1'), {'f'})
+        self.assertEqual(search('2001:db9::1'), set())
+        self.assertEqual(search('2001:DB8:1:2:0:0:0:1'),
+                         {'f', 'g', 'h', 'i'})
+
+    def test_versions_apart(self):
+        table = PrefixTable({'::/0': ['any6']})
+        self.assertEqual(table.search('10.0.0.1'), set())
+        self.assertEqual(table.search('::a00:1'), {'any6'})
+        self.assertEqual(self.table.search('::a01:203'), set())
+
+    def test_host_bits_ignored(self):
+        table = PrefixTable({'10.1.2.3/16': ['x']})
+        self.assertEqual(table.search('10.1.200.200'), {'x'})
+
+    def test_invalid_address(self):
+        self.assertEqual(self.table.search('not an ip'), set())
+        self.assertEqual(self.table.search('10.1.2'), set())
+        self.assertEqual(self.table.search(''), set())
+
+    def test_random(self):
+        rng = random.Random(7)
+        networks = [ipaddress.ip_network(block)
+                    for block in self.blocks]
+        for _ in range(2000):
+            if rng.random() < .5:
+                addr = ipaddress.IPv4Address(
+                    rng.choice([0x0a000000, 0x0a010200, 0xc0000200]) |
+                    rng.getrandbits(rng.choice([0, 8, 16, 24])))
+            else:
+                addr = ipaddress.IPv6Address(
+                    (0x20010db8000100020000000000000000 |
+                     rng.getrandbits(rng.choice([0, 8, 64, 80, 96]))))
+            expected = set()
+            for network in networks:
+                if addr.version == network.version and addr in network:
+                    expected |= set(self.blocks[str(network)])
+            self.assertEqual(self.table.search(str(addr)), expected,
+                             str(addr))
+
+
+class WatchListTest(unittest.TestCase):
+
+    def setUp(self):
+        self.watch = WatchList()
+        self.watch.add('bank', hosts=['PayPal'], urls=['/wp-admin/'],
+                       cidrs=['192.0.2.0/24'])
+        self.watch.add('lu', countries=['LU'], tlds=['LU'])
+        self.watch.add('exact', fqdns=['www.example.com'], asns=[64496])
+
+    def test_match(self):
+        url = {'addr': 'http://www.paypal.com.example.net/',
+               'fqdn': 'WWW.PAYPAL.COM.EXAMPLE.NET', 'tld': 'net',
+               'ip': {'addr': '198.51.100.1', 'cc': 'US', 'asn': 1}}
+        self.assertEqual(self.watch.match(url), {'bank'})
+        url = {'addr': 'http://www.example.com/wp-admin/x',
+               'fqdn': 'www.example.com', 'tld': 'com',
+               'ip': {'addr': '192.0.2.7', 'country': 'LU', 'asn': 64496}}
+        self.assertEqual(self.watch.match(url), {'bank', 'lu', 'exact'})
+        self.assertEqual(self.watch.match({'addr': 'http://x.lu/',
+                                           'tld': 'lu', 'ip': None}),
+                         {'lu'})
+        self.assertEqual(self.watch.match(None), set())
+
+    def test_records(self):
+        url = records.Decoder().url({
+            'addr': 'http://a.lu/', 'fqdn': 'a.lu', 'tld': 'lu',
+            'ip': {'addr': '192.0.2.1'}})
+        self.assertEqual(self.watch.match(url), {'bank', 'lu'})
+
+    def test_changes_recompile(self):
+        url = {'addr': 'http://www.example.com/', 'fqdn': 'www.example.com'}
+        self.assertEqual(self.watch.match(url), {'exact'})
+        self.watch.add('example', hosts=['example'])
+        self.assertEqual(self.watch.match(url), {'exact', 'example'})
+        self.watch.remove('exact')
+        self.assertEqual(self.watch.match(url), {'example'})
+        self.assertEqual(len(self.watch), 3)
+
+    def test_scan(self):
+        urls = [{'addr': 'http://a/', 'fqdn': 'a'},
+                {'addr': 'http://paypal.example/', 'fqdn': 'paypal.example'}]
+        self.assertEqual(list(self.watch.scan(urls)), [(urls[1], {'bank'})])
+
+    def test_invalid_cidr(self):
+        self.assertRaises(ValueError, self.watch.add, 'bad',
+                          cidrs=['10.0.0.0/33'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,2 +1,38 @@
-from api import *
-from ooapi import URLQuery
+import importlib
+
+# The submodules, and the HTTP libraries behind them, are only imported
+# when one of their names is first used, so that "import urlquery" stays
+# cheap for short-lived scripts.
+_api = ['urlfeed', 'iter_urlfeed', 'backfill', 'submit', 'user_agent_list',
+        'mass_submit', 'iter_mass_submit', 'queue_status', 'report',
+        'report_many', 'report_list', 'iter_reports', 'search',
+        'reputation', 'default_client', 'base_url', 'gzip_default',
+        'rate_limiter', 'retry_policy']
+_lazy = dict((name, 'api') for name in _api)
+_lazy.update({'URLQuery': 'ooapi',
+              'SubmissionTracker': 'tracker', 'SubmissionError': 'tracker',
+              'ResponseCache': 'cache',
+              'ReportStore': 'store'})
+
+__all__ = sorted(_lazy)
+
+# Submodules, also reachable as attributes of the package ("urlquery.api").
+_submodules = frozenset([
+    'aio', 'api', 'bloom', 'cache', 'checkpoint', 'compression', 'cursor',
+    'errors', 'feed', 'filters', 'metrics', 'ooapi', 'parallel', 'profiler',
+    'ratelimit', 'records', 'retry', 'singleflight', 'store', 'stream',
+    'timeutil', 'tracker', 'transport', 'watch'])
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module('.' + name, __name__)
+    module = _lazy.get(name)
+    if module is None:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(
+            __name__, name))
+    return getattr(importlib.import_module('.' + module, __name__), name)
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy) | _submodules)
@@ -0,0 +1,545 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+import asyncio
+from collections import deque
+import time
+
+import aiohttp
+
+from .checkpoint import Checkpoint
+from .compression import Decompressor
+from .cursor import ReportCursor
+from .feed import _slice_key, closed
+from .errors import APIError, ServerError, is_error
+from .ooapi import URLQuery
+from . import records
+from .parallel import ChunkAttempts, chunks
+from .stream import ArrayParser
+from .timeutil import last_closed, slices
+from .transport import Transport
+
+
+async def _imap(func, items, window, ordered=False):
+    """
+        Asynchronous version of parallel.imap: awaits func(item) for the
+        items, with at most window calls pending, and yields (item,
+        result, error) tuples. items is only pulled from as the results
+        are consumed, so it can be a large lazy iterator.
+    """
+    items = iter(items)
+    pending = deque() if ordered else set()
+
+    async def call(item):
+        try:
+            return item, await func(item), None
+        except Exception as e:
+            return item, None, e
+
+    def fill():
+        while len(pending) < window:
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            task = asyncio.ensure_future(call(item))
+            if ordered:
+                pending.append(task)
+            else:
+                pending.add(task)
+
+    try:
+        fill()
+        while pending:
+            if ordered:
+                yield await pending.popleft()
+            else:
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending.discard(task)
+                    yield task.result()
+            fill()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+class AsyncFeedStream(object):
+    """
+        Asynchronous iterator version of FeedStream, returned by
+        AsyncURLQuery.iter_urlfeed:
+
+            async with uq.iter_urlfeed(interval='day') as urls:
+                async for url in urls:
+                    ...
+
+        The request is sent on the first iteration and holds one of the
+        max_concurrency slots until the stream is exhausted or closed.
+    """
+    __slots__ = ["_client", "_query", "_chunk_size", "_hook", "_parser",
+                 "_items", "_response", "_decompressor", "_done", "_start"]
+
+    def __init__(self, client, query, key, chunk_size, hook=None):
+        self._client = client
+        self._query = query
+        self._chunk_size = chunk_size
+        self._hook = hook
+        self._parser = ArrayParser(key)
+        self._items = iter(())
+        self._response = None
+        self._decompressor = None
+        self._done = False
+        self._start = None
+
+    @property
+    def metadata(self):
+        return self._parser.metadata
+
+    @property
+    def start_time(self):
+        return self._parser.metadata.get('start_time')
+
+    @property
+    def end_time(self):
+        return self._parser.metadata.get('end_time')
+
+    def __aiter__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def __anext__(self):
+        while True:
+            for item in self._items:
+                if self._hook is not None:
+                    item = self._hook(item)
+                return item
+            if self._done:
+                raise StopAsyncIteration
+            try:
+                if self._response is None:
+                    self._client._client_session()
+                    await self._client._semaphore.acquire()
+                    self._start = time.perf_counter()
+                    try:
+                        self._response, self._decompressor = \
+                            await self._client._retrying(
+                                self._client._open, self._query)
+                    except BaseException as e:
+                        self._client._semaphore.release()
+                        if isinstance(e, Exception):
+                            self._client._observe(self._query, self._start,
+                                                  e)
+                        raise
+                data = await self._response.content.read(self._chunk_size)
+                final = not data
+                if final:
+                    data = self._decompressor.flush()
+                else:
+                    data = self._decompressor.feed(data)
+                self._items = iter(self._parser.feed(data, final))
+            except BaseException:
+                await self.aclose()
+                raise
+            if final:
+                await self.aclose()
+                self._parser.check()
+
+    async def aclose(self):
+        """
+            Releases the underlying connection.
+        """
+        if self._done:
+            return
+        self._done = True
+        if self._response is not None:
+            self._response.release()
+            self._client._semaphore.release()
+            self._client._transferred(self._decompressor.stats)
+            self._client._observe(self._query, self._start)
+
+
+class AsyncURLQuery(URLQuery):
+    """
+        asyncio flavour of URLQuery.
+
+        Every API method of URLQuery (urlfeed, submit, mass_submit,
+        queue_status, report, report_list, search, reputation and
+        user_agent_list) takes the same parameters, is validated against
+        the same tables and returns an awaitable instead of the decoded
+        response:
+
+            async with AsyncURLQuery(apikey=key) as uq:
+                reports = await asyncio.gather(
+                    *[uq.report(r, include_details=True) for r in ids])
+
+        All the requests of an instance share one aiohttp connection pool.
+        The transports of urlquery.transport (urllib3, httpx, recording
+        and replay) are synchronous and cannot be used here, hence no
+        transport parameter: requests always go through aiohttp.
+
+        :param max_concurrency: Maximum number of requests in flight at
+            the same time, the others wait for a slot. (default: 100)
+
+        :param limit: Total number of connections kept by the pool.
+            (default: 100)
+
+        :param limit_per_host: Maximum number of connections to a single
+            host, 0 means no limit. (default: 0)
+
+        :param cache: Optional ResponseCache, see URLQuery.
+
+        :param report_store: Optional ReportStore, see URLQuery. It is
+            accessed from the default executor so that SQLite never blocks
+            the event loop.
+
+        :param compress_threshold, on_transfer, records, rate_limiter,
+            retry_policy, single_flight, metrics: See URLQuery.
+            last_transfer is the last call completed on the loop thread.
+            The rate limiter and the retries wait with asyncio.sleep.
+    """
+    __slots__ = ["max_concurrency", "_limit", "_limit_per_host", "_http",
+                 "_semaphore"]
+
+    def __init__(self, base_url=None, gzip_default=False, apikey=None,
+                 max_concurrency=100, limit=100, limit_per_host=0,
+                 cache=None, report_store=None, compress_threshold=8192,
+                 on_transfer=None, records=False, rate_limiter=None,
+                 retry_policy=None, single_flight=None, metrics=None):
+        super(AsyncURLQuery, self).__init__(
+            base_url, gzip_default, apikey, cache=cache,
+            report_store=report_store, compress_threshold=compress_threshold,
+            on_transfer=on_transfer, records=records,
+            rate_limiter=rate_limiter, retry_policy=retry_policy,
+            single_flight=single_flight, metrics=metrics,
+            transport=Transport())
+        self.max_concurrency = max_concurrency
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._http = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        """
+            Closes the aiohttp session and all its pooled connections.
+        """
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+        self.close()
+
+    def _client_session(self):
+        # aiohttp sessions and asyncio semaphores belong to the running
+        # loop, so they are only created on first use.
+        if self._http is None or self._http.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._limit, limit_per_host=self._limit_per_host)
+            # Bodies are decompressed by Decompressor, which also counts
+            # the bytes received.
+            self._http = aiohttp.ClientSession(connector=connector,
+                                               auto_decompress=False)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._http
+
+    async def send(self, query):
+        """
+            POSTs an already prepared query to base_url and returns the
+            decoded response.
+        """
+        if self.metrics is None:
+            return await self._send(query)
+        start = time.perf_counter()
+        try:
+            response = await self._send(query)
+        except Exception as e:
+            self._observe(query, start, e)
+            raise
+        self._observe(query, start, response=response)
+        return response
+
+    async def _send(self, query):
+        if self.cache is not None:
+            response = self.cache.get(query)
+            if response is not None:
+                if self.metrics is not None:
+                    self.metrics.cache_hit(query.get('method'))
+                return response
+        flight = self.single_flight
+        if flight is None:
+            response = await self._retrying(self._post, query)
+        else:
+            response = await self._coalesced(flight, query)
+        if self.cache is not None:
+            self.cache.put(query, response)
+        return response
+
+    async def _coalesced(self, flight, query):
+        # The shared request runs in its own task, which every caller
+        # awaits through a shield: cancelling one caller (or its timeout)
+        # neither cancels the request nor fails the other callers.
+        def request():
+            task = asyncio.ensure_future(self._retrying(self._post, query))
+            task.add_done_callback(done)
+            return task
+
+        def done(task):
+            flight._leave(key)
+            if not task.cancelled():
+                # Marks the exception as retrieved when nobody waits.
+                task.exception()
+
+        key, task, leader = flight._join(query, request)
+        if key is None:
+            return await self._retrying(self._post, query)
+        if not leader:
+            self._joined(query)
+        return await asyncio.shield(task)
+
+    async def _retrying(self, func, query):
+        policy = self.retry_policy
+        if policy is None:
+            return await func(query)
+        attempt = 0
+        error = None
+        while True:
+            policy.before(error)
+            try:
+                result = await func(query)
+            except Exception as e:
+                wait = policy.failed(query.get('method'), e, attempt,
+                                     (aiohttp.ClientError,
+                                      asyncio.TimeoutError))
+                if wait is None:
+                    raise
+                error = e
+                await asyncio.sleep(wait)
+                attempt += 1
+            else:
+                policy.succeeded()
+                return result
+
+    async def _open(self, query):
+        r, decompressor = await self._request(query)
+        if r.status >= 500:
+            r.release()
+            raise ServerError(r.status)
+        return r, decompressor
+
+    async def _request(self, query):
+        body, headers, stats = self._encode(query)
+        limiter = self.rate_limiter
+        for attempt in range(limiter.retries + 1 if limiter else 1):
+            if limiter is not None:
+                wait = limiter.reserve(query)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            r = await self._client_session().post(self.base_url, data=body,
+                                                  headers=headers)
+            if limiter is None or attempt == limiter.retries or \
+                    not limiter.feedback(query, r.status,
+                                         r.headers.get('Retry-After')):
+                break
+            r.release()
+        return r, Decompressor(stats, r.headers.get('Content-Encoding'))
+
+    async def _post(self, query, chunk_size=65536):
+        self._client_session()
+        async with self._semaphore:
+            r, decompressor = await self._request(query)
+            try:
+                parts = []
+                async for chunk in r.content.iter_chunked(chunk_size):
+                    parts.append(decompressor.feed(chunk))
+                parts.append(decompressor.flush())
+            finally:
+                r.release()
+        self._transferred(decompressor.stats)
+        if r.status >= 500:
+            raise ServerError(r.status)
+        return json.loads(b''.join(parts).decode('utf-8'))
+
+    def stream(self, query, key, chunk_size=65536, hook=None):
+        """
+            Asynchronous version of URLQuery.stream, returns an
+            AsyncFeedStream.
+        """
+        return AsyncFeedStream(self, query, key, chunk_size, hook)
+
+    async def query(self, query, gzip=False, apikey=None):
+        if query.get('error') is not None:
+            return query
+        response = await self.send(self._prepare(query, gzip, apikey))
+        return self._decode(query['method'], response)
+
+    async def _stored_report(self, query, gzip, apikey):
+        self._prepare(query, gzip, apikey)
+        loop = asyncio.get_event_loop()
+        report = await loop.run_in_executor(None, self.report_store.get,
+                                            query)
+        if report is None:
+            report = await self.send(query)
+            if not is_error(report):
+                await loop.run_in_executor(None, self.report_store.put,
+                                           query, report)
+        return self._decode('report', report)
+
+    async def report_many(self, report_ids, recent_limit=0,
+                          include_details=False, include_screenshot=False,
+                          include_domain_graph=False, ordered=False,
+                          gzip=False, apikey=None):
+        """
+            Asynchronous generator version of URLQuery.report_many: at
+            most max_concurrency reports are pending at the same time,
+            report_ids is only pulled from as they complete.
+
+            :return: (report_id, BASICREPORT, error) tuples.
+        """
+        def fetch(report_id):
+            return self.report(report_id, recent_limit, include_details,
+                               include_screenshot, include_domain_graph,
+                               gzip, apikey)
+
+        results = _imap(fetch, report_ids, self.max_concurrency, ordered)
+        try:
+            async for result in results:
+                yield result
+        finally:
+            await results.aclose()
+
+    async def mass_submit(self, urls, useragent=None, referer=None,
+                          access_level='public', priority='low',
+                          callback_url=None, chunk_size=100, retries=2,
+                          checkpoint=None, gzip=False, apikey=None):
+        """
+            Asynchronous version of URLQuery.mass_submit, the chunks are
+            sent concurrently within the max_concurrency limit.
+        """
+        query = self._mass_submit_query(useragent, referer, access_level,
+                                        priority, callback_url)
+        if query.get('error') is not None:
+            return query
+        return [status async for status in self._mass_submit(
+            query, urls, chunk_size, retries, checkpoint, gzip, apikey)]
+
+    def iter_mass_submit(self, urls, useragent=None, referer=None,
+                         access_level='public', priority='low',
+                         callback_url=None, chunk_size=100, retries=2,
+                         checkpoint=None, gzip=False, apikey=None):
+        """
+            Asynchronous generator version of URLQuery.iter_mass_submit.
+        """
+        query = self._mass_submit_query(useragent, referer, access_level,
+                                        priority, callback_url)
+        if query.get('error') is not None:
+            raise ValueError(query['error'])
+        return self._mass_submit(query, urls, chunk_size, retries,
+                                 checkpoint, gzip, apikey)
+
+    async def _mass_submit(self, query, urls, chunk_size, retries,
+                           checkpoint, gzip, apikey):
+        if checkpoint is not None and not isinstance(checkpoint, Checkpoint):
+            checkpoint = Checkpoint(checkpoint)
+
+        async def send(numbered):
+            index, chunk = numbered
+            attempts = ChunkAttempts(index, chunk, retries, checkpoint)
+            while not attempts.done:
+                chunk_query = dict(query)
+                chunk_query['urls'] = chunk
+                try:
+                    response = await self.send(
+                        self._prepare(chunk_query, gzip, apikey))
+                except Exception as e:
+                    wait = attempts.failed(e)
+                else:
+                    wait = attempts.result(response)
+                if wait is not None:
+                    await asyncio.sleep(wait)
+            return attempts.response
+
+        decoder = records.Decoder() if self.records else None
+        results = _imap(send, enumerate(chunks(urls, chunk_size)),
+                        self.max_concurrency, True)
+        try:
+            async for _, statuses, error in results:
+                if error is not None:
+                    raise error
+                for status in statuses:
+                    if decoder is not None:
+                        status = decoder.queue_status(status)
+                    yield status
+        finally:
+            await results.aclose()
+
+    async def iter_reports(self, since, until=None, page_size=50,
+                           gzip=False, apikey=None):
+        """
+            Asynchronous generator version of URLQuery.iter_reports, the
+            next page is fetched by a separate task.
+        """
+        cursor = ReportCursor(since, until, page_size)
+        page = asyncio.ensure_future(self.report_list(
+            cursor.position, page_size, gzip, apikey))
+        try:
+            while not cursor.done:
+                reports = cursor.advance(await page)
+                if not cursor.done:
+                    page = asyncio.ensure_future(self.report_list(
+                        cursor.position, page_size, gzip, apikey))
+                for report in reports:
+                    yield report
+        finally:
+            page.cancel()
+
+    async def backfill(self, start, end=None, feed='unfiltered',
+                       interval='hour', max_workers=4, checkpoint=None,
+                       gzip=False, apikey=None):
+        """
+            Asynchronous generator version of URLQuery.backfill.
+        """
+        if feed not in self._feed_type:
+            raise ValueError('Feed can only be in ' +
+                             ', '.join(self._feed_type))
+        if interval not in self._intervals:
+            raise ValueError('Interval can only be in ' +
+                             ', '.join(self._intervals))
+        if end is None:
+            end = last_closed(interval)
+        if checkpoint is not None and not isinstance(checkpoint, Checkpoint):
+            checkpoint = Checkpoint(checkpoint)
+
+        todo = [s for s in slices(start, end, interval)
+                if checkpoint is None or
+                _slice_key(feed, interval, s) not in checkpoint]
+
+        def fetch(slice_start):
+            return self.urlfeed(feed, interval, slice_start, gzip, apikey)
+
+        results = _imap(fetch, todo, max_workers, True)
+        try:
+            async for slice_start, response, error in results:
+                if error is not None:
+                    raise error
+                if is_error(response):
+                    raise APIError(response)
+                yield slice_start, response
+                if checkpoint is not None and closed(slice_start, interval):
+                    checkpoint.add(_slice_key(feed, interval, slice_start))
+        finally:
+            await results.aclose()
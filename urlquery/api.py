@@ -1,19 +1,17 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-try:
-    import simplejson as json
-except ImportError:
-    import json
+import threading
 
-import requests
-from dateutil.parser import parse
-from datetime import datetime, timedelta
-import time
+from . import parallel
+from . import timeutil
+from .ooapi import URLQuery
 
 
 base_url = 'https://uqapi.net/v3/json'
 gzip_default = False
+rate_limiter = None
+retry_policy = None
 
 __feed_type = ['unfiltered', 'flagged']
 __intervals = ['hour', 'day']
@@ -22,6 +20,31 @@ __search_types = ['string', 'regexp', 'ids_alert',
                   'urlquery_alert', 'js_script_hash']
 __result_types = ['reports', 'url_list']
 __url_matchings = ['url_host', 'url_path']
+__access_levels = ['public', 'nonpublic', 'private']
+
+__client = None
+__client_lock = threading.Lock()
+
+
+def default_client():
+    """
+        Returns the URLQuery instance shared by all the module level
+        functions, so they all reuse the same keep-alive connection pool.
+        It is created on first use and follows the module level base_url,
+        rate_limiter and retry_policy.
+    """
+    global __client
+    if __client is None:
+        with __client_lock:
+            if __client is None:
+                __client = URLQuery(base_url=base_url)
+    if __client.base_url != base_url:
+        __client.base_url = base_url
+    if __client.rate_limiter is not rate_limiter:
+        __client.rate_limiter = rate_limiter
+    if __client.retry_policy is not retry_policy:
+        __client.retry_policy = retry_policy
+    return __client
 
 
 def __set_default_values(gzip=False, apikey=None):
@@ -42,8 +65,13 @@ def __query(query, gzip=False, apikey=None):
     if query.get('error') is not None:
         return query
     query.update(__set_default_values(gzip, apikey))
-    r = requests.post(base_url, data=json.dumps(query))
-    return r.json()
+    return default_client().send(query)
+
+
+def __client_args(gzip=False, apikey=None):
+    # gzip and apikey for the methods of default_client, with the same
+    # defaults as __set_default_values.
+    return gzip_default or gzip, '' if apikey is None else apikey
 
 
 def urlfeed(feed='unfiltered', interval='hour', timestamp=None,
@@ -84,6 +112,74 @@ def urlfeed(feed='unfiltered', interval='hour', timestamp=None,
                 }
 
     """
+    query = __urlfeed_query(feed, interval, timestamp)
+    return __query(query, gzip, apikey)
+
+
+def iter_urlfeed(feed='unfiltered', interval='hour', timestamp=None,
+                 chunk_size=65536, gzip=False, apikey=None):
+    """
+        Same as urlfeed, but the response is streamed: the URL objects of
+        "feed" are parsed and yielded one by one while the body is being
+        received, so memory stays flat whatever the size of the slice.
+
+            with iter_urlfeed(interval='day') as urls:
+                for url in urls:
+                    ...
+                print(urls.start_time, urls.end_time)
+
+        :param chunk_size: Number of bytes read from the connection at a
+            time.
+
+        :return: FeedStream iterator over the URL objects. start_time and
+            end_time are available as attributes once received.
+            Raises ValueError if the parameters are invalid, and an
+            APIError at the end of the iteration if the API returned an
+            error.
+    """
+    query = __urlfeed_query(feed, interval, timestamp)
+    if query.get('error') is not None:
+        raise ValueError(query['error'])
+    query.update(__set_default_values(gzip, apikey))
+    return default_client().stream(query, 'feed', chunk_size)
+
+
+def backfill(start, end=None, feed='unfiltered', interval='hour',
+             max_workers=4, checkpoint=None, gzip=False, apikey=None):
+    """
+        Fetches all the urlfeed slices of a time range, for example to
+        rebuild the history after an outage.
+
+        The range is split in slices aligned on the hour or day slices of
+        the service (UTC), which are fetched in parallel and returned in
+        time order.
+
+        :param start: Start of the range: Unix epoch timestamp, datetime
+            or date string. The whole slice holding start is fetched.
+
+        :param end: End of the range (excluded), same formats as start.
+            Default: the end of the last closed slice, the slice still
+            open is not fetched.
+
+        :param max_workers: Maximum number of slices fetched at the same
+            time.
+            Default: 4
+
+        :param checkpoint: Path of a checkpoint file. Slices are recorded
+            in it once processed (when the next one is requested), and
+            slices it holds are skipped, so an interrupted backfill
+            resumes where it stopped.
+
+        :return: Iterator of (slice start, URLFEED) tuples, the slice start
+            being a Unix epoch. An error returned for a slice is raised as
+            an APIError.
+    """
+    return default_client().backfill(start, end, feed, interval,
+                                     max_workers, checkpoint,
+                                     *__client_args(gzip, apikey))
+
+
+def __urlfeed_query(feed, interval, timestamp):
     query = {'method': 'urlfeed'}
     if feed not in __feed_type:
         query.update({'error':
@@ -91,23 +187,14 @@ def urlfeed(feed='unfiltered', interval='hour', timestamp=None,
     if interval not in __intervals:
         query.update({'error':
                       'Interval can only be in ' + ', '.join(__intervals)})
-    if timestamp is None:
-        ts = datetime.now()
-        if interval == 'hour':
-            ts = ts - timedelta(hours=1)
-        if interval == 'day':
-            ts = ts - timedelta(days=1)
-        timestamp = time.mktime(ts.utctimetuple())
-    else:
-        try:
-            timestamp = time.mktime(parse(timestamp).utctimetuple())
-        except:
-            query.update({'error':
-                          'Unable to convert time to timestamp: ' + str(time)})
+    timestamp = timeutil.query_timestamp(query, timestamp,
+                                         86400 if interval == 'day' else 3600)
+    if timestamp is not None and interval in __intervals:
+        timestamp = timeutil.slice_start(timestamp, interval)
     query['feed'] = feed
     query['interval'] = interval
     query['timestamp'] = timestamp
-    return __query(query, gzip, apikey)
+    return query
 
 
 def submit(url, useragent=None, referer=None, priority='low',
@@ -214,16 +301,54 @@ def user_agent_list(gzip=False, apikey=None):
 
 def mass_submit(urls, useragent=None, referer=None,
                 access_level='public', priority='low', callback_url=None,
+                chunk_size=100, max_workers=4, retries=2, checkpoint=None,
                 gzip=False, apikey=None):
     """
         See submit for details. All URLs will be queued with the same settings.
 
+        Large lists are split into chunks of chunk_size URLs, sent in
+        parallel by up to max_workers threads. A failing chunk is retried
+        on its own up to retries times.
+
+        :param checkpoint: Path of a checkpoint file. Chunks recorded in it
+            by a previous, interrupted, call with the same URLs are not
+            submitted again.
+
         :return:
 
-            {
-                [QUEUE_STATUS]  Array of QUEUE_STATUS objects, See submit
-            }
+            [QUEUE_STATUS]  Array of QUEUE_STATUS objects, See submit, in
+                            the order of urls
+    """
+    query = __mass_submit_query(useragent, referer, access_level, priority,
+                                callback_url)
+    if query.get('error') is not None:
+        return query
+    return list(__mass_submit(query, urls, chunk_size, max_workers, retries,
+                              checkpoint, gzip, apikey))
+
+
+def iter_mass_submit(urls, useragent=None, referer=None,
+                     access_level='public', priority='low', callback_url=None,
+                     chunk_size=100, max_workers=4, retries=2,
+                     checkpoint=None, gzip=False, apikey=None):
+    """
+        Same as mass_submit, but the QUEUE_STATUS objects are yielded as
+        soon as their chunk (and all the chunks before it) have been
+        submitted.
+
+        Raises ValueError if the parameters are invalid, and the error of
+        a chunk still failing after its retries.
     """
+    query = __mass_submit_query(useragent, referer, access_level, priority,
+                                callback_url)
+    if query.get('error') is not None:
+        raise ValueError(query['error'])
+    return __mass_submit(query, urls, chunk_size, max_workers, retries,
+                         checkpoint, gzip, apikey)
+
+
+def __mass_submit_query(useragent, referer, access_level, priority,
+                        callback_url):
     query = {'method': 'mass_submit'}
     if access_level not in __access_levels:
         query.update({'error':
@@ -238,7 +363,20 @@ def mass_submit(urls, useragent=None, referer=None,
     query['priority'] = priority
     if callback_url is not None:
         query['callback_url'] = callback_url
-    return __query(query, gzip, apikey)
+    return query
+
+
+def __mass_submit(query, urls, chunk_size, max_workers, retries, checkpoint,
+                  gzip, apikey):
+    def send(chunk):
+        chunk_query = dict(query)
+        chunk_query['urls'] = chunk
+        return __query(chunk_query, gzip, apikey)
+
+    for statuses in parallel.run_chunks(send, urls, chunk_size, max_workers,
+                                        retries, checkpoint):
+        for status in statuses:
+            yield status
 
 
 def queue_status(queue_id, gzip=False, apikey=None):
@@ -252,7 +390,7 @@ def queue_status(queue_id, gzip=False, apikey=None):
     """
     query = {'method': 'queue_status'}
     query['queue_id'] = queue_id
-    return __query(query, gzip=False, apikey=None)
+    return __query(query, gzip, apikey)
 
 
 def report(report_id, recent_limit=0, include_details=False,
@@ -312,6 +450,34 @@ def report(report_id, recent_limit=0, include_details=False,
     return __query(query, gzip, apikey)
 
 
+def report_many(report_ids, recent_limit=0, include_details=False,
+                include_screenshot=False, include_domain_graph=False,
+                max_workers=10, ordered=False, gzip=False, apikey=None):
+    """
+        Fetches many reports concurrently, see report for the parameters
+        applied to every report.
+
+        :param report_ids: Iterable of report IDs, for example the
+            report_id of every entry of report_list or search.
+
+        :param max_workers: Maximum number of reports fetched at the same
+            time.
+            Default: 10
+
+        :param ordered: Yield the reports in the order of report_ids
+            instead of as soon as they are fetched.
+            Default: False
+
+        :return: Iterator of (report_id, BASICREPORT, error) tuples.
+            error is the exception raised while fetching that report
+            (BASICREPORT is then None), it does not stop the batch.
+    """
+    return default_client().report_many(
+        report_ids, recent_limit, include_details, include_screenshot,
+        include_domain_graph, max_workers, ordered,
+        *__client_args(gzip, apikey))
+
+
 def report_list(timestamp=None, limit=50, gzip=False, apikey=None):
     """
     Returns a list of reports created from the given timestamp, if it’s
@@ -324,9 +490,10 @@ def report_list(timestamp=None, limit=50, gzip=False, apikey=None):
     To get reports which are nonpublic or private a API key is needed
     which has access to these.
 
-    :param timestamp: Unix Epoch timestamp from the starting point to get
+    :param timestamp: Unix epoch timestamp, datetime or date string
+        (UTC unless it has a timezone) from the starting point to get
         reports.
-        Default: If None, setted to datetime.now()
+        Default: If None, now
 
     :param limit: Number of reports in the list
         Default: 50
@@ -339,20 +506,37 @@ def report_list(timestamp=None, limit=50, gzip=False, apikey=None):
 
     """
     query = {'method': 'report_list'}
-    if timestamp is None:
-        ts = datetime.now()
-        timestamp = time.mktime(ts.utctimetuple())
-    else:
-        try:
-            timestamp = time.mktime(parse(timestamp).utctimetuple())
-        except:
-            query.update({'error':
-                          'Unable to convert time to timestamp: ' + str(time)})
-    query['timestamp'] = timestamp
+    query['timestamp'] = timeutil.query_timestamp(query, timestamp)
     query['limit'] = limit
     return __query(query, gzip, apikey)
 
 
+def iter_reports(since, until=None, page_size=50, gzip=False, apikey=None):
+    """
+        Iterates over all the reports created between since and until by
+        walking report_list pages. Reports repeated at the boundary of two
+        pages are only yielded once.
+
+        The next page is fetched in the background while the reports of
+        the current one are being consumed.
+
+        :param since: Start of the range: Unix epoch timestamp, datetime
+            or date string.
+
+        :param until: End of the range, same formats as since.
+            Default: None, no end: the iteration stops at the most recent
+            report.
+
+        :param page_size: Number of reports asked per report_list call.
+            Default: 50
+
+        :return: Iterator of BASICREPORT. An error returned by report_list
+            is raised as an APIError.
+    """
+    return default_client().iter_reports(since, until, page_size,
+                                         *__client_args(gzip, apikey))
+
+
 def search(q, search_type='string', result_type='reports',
            url_matching='url_host', date_from=None, deep=False,
            gzip=False, apikey=None):
@@ -384,8 +568,9 @@ def search(q, search_type='string', result_type='reports',
             * *url_path*: match against path
 
 
-        :param date_from: Unix epoch timestamp for starting searching point.
-            Default: If None, setted to datetime.now()
+        :param date_from: Unix epoch timestamp, datetime or date string
+            (UTC unless it has a timezone) for starting searching point.
+            Default: If None, now
 
 
         :param deep: Search all URLs, not just submitted URLs.
@@ -407,16 +592,7 @@ def search(q, search_type='string', result_type='reports',
                       'url_matching can only be in '
                       + ', '.join(__url_matchings)})
 
-    if date_from is None:
-        ts = datetime.now()
-        timestamp = time.mktime(ts.utctimetuple())
-    else:
-        try:
-            timestamp = time.mktime(parse(date_from).utctimetuple())
-        except:
-            query.update({'error':
-                          'Unable to convert time to timestamp: '
-                          + str(time)})
+    timestamp = timeutil.query_timestamp(query, date_from)
 
     query['q'] = q
     query['search_type'] = search_type
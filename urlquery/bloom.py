@@ -0,0 +1,131 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+import hashlib
+import math
+import os
+import struct
+
+
+class BloomFilter(object):
+    """
+        Fixed size set of strings with no false negatives and about
+        error_rate false positives once capacity strings have been added.
+    """
+    __slots__ = ["capacity", "error_rate", "size", "hashes", "count",
+                 "bits"]
+
+    def __init__(self, capacity, error_rate=.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = int(-capacity * math.log(error_rate) /
+                        math.log(2) ** 2) + 1
+        self.hashes = max(1, int(round(self.size / float(capacity) *
+                                       math.log(2))))
+        self.count = 0
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.md5(key.encode('utf-8')).digest()
+        h1, h2 = struct.unpack('<QQ', digest)
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def __contains__(self, key):
+        bits = self.bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add(self, key):
+        """
+            Adds key, returns False if it was (probably) already there.
+        """
+        bits = self.bits
+        added = False
+        for position in self._positions(key):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+
+class RotatingBloomFilter(object):
+    """
+        Memory bounded "already seen" set made of two Bloom filters: keys
+        are added to the current one, and once it holds capacity keys it
+        becomes the previous one and a new, empty, current filter is
+        started. A key is remembered for at least capacity additions.
+
+        :param capacity: Number of keys per generation.
+
+        :param error_rate: False positive rate of each generation.
+    """
+    __slots__ = ["capacity", "error_rate", "current", "previous"]
+
+    def __init__(self, capacity=1000000, error_rate=.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.current = BloomFilter(capacity, error_rate)
+        self.previous = None
+
+    def __contains__(self, key):
+        return key in self.current or \
+            (self.previous is not None and key in self.previous)
+
+    def add(self, key):
+        """
+            Adds key, returns False if it was (probably) already seen.
+        """
+        if self.previous is not None and key in self.previous:
+            return False
+        if self.current.count >= self.capacity:
+            self.previous = self.current
+            self.current = BloomFilter(self.capacity, self.error_rate)
+        return self.current.add(key)
+
+    def save(self, path):
+        """
+            Atomically writes the filter to path.
+        """
+        header = {'capacity': self.capacity, 'error_rate': self.error_rate,
+                  'counts': [self.current.count,
+                             None if self.previous is None
+                             else self.previous.count]}
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(json.dumps(header).encode('utf-8') + b'\n')
+            f.write(self.current.bits)
+            if self.previous is not None:
+                f.write(self.previous.bits)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+            Reads a filter written by save.
+        """
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline().decode('utf-8'))
+            bloom = cls(header['capacity'], header['error_rate'])
+            current, previous = header['counts']
+            bloom.current.bits = bytearray(f.read(len(bloom.current.bits)))
+            bloom.current.count = current
+            if previous is not None:
+                bloom.previous = BloomFilter(bloom.capacity,
+                                             bloom.error_rate)
+                bloom.previous.bits = bytearray(
+                    f.read(len(bloom.previous.bits)))
+                bloom.previous.count = previous
+        return bloom
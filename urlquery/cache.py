@@ -0,0 +1,112 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+from collections import OrderedDict
+import threading
+import time
+
+from .errors import is_error
+
+
+class ResponseCache(object):
+    """
+        In-memory cache of API responses, to put in front of a URLQuery:
+
+            uq = URLQuery(apikey=key, cache=ResponseCache())
+
+        Only the methods listed in ttls are cached, each for its own time
+        to live (in seconds). A queue_status is only cached once its
+        status is "done", and error responses are never cached.
+
+        Entries are keyed by the method, all its parameters and the API
+        key, so responses never leak between keys with different
+        permissions. When more than maxsize entries are held, the least
+        recently used ones are evicted.
+
+        The cached responses are shared between callers and must not be
+        modified.
+
+        :param maxsize: Maximum number of responses kept. (default: 10000)
+
+        :param ttls: Dict of method name to time to live, replacing
+            default_ttls.
+    """
+    __slots__ = ["maxsize", "ttls", "hits", "misses", "evictions",
+                 "_entries", "_lock"]
+
+    default_ttls = {'report': 24 * 3600, 'queue_status': 24 * 3600,
+                    'user_agent_list': 3600, 'reputation': 600}
+
+    def __init__(self, maxsize=10000, ttls=None):
+        self.maxsize = maxsize
+        if ttls is None:
+            ttls = self.default_ttls
+        self.ttls = dict(ttls)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _key(self, query):
+        if query.get('method') not in self.ttls:
+            return None
+        params = dict(query)
+        params.pop('gzip', None)
+        return json.dumps(params, sort_keys=True)
+
+    def get(self, query):
+        """
+            Returns the cached response to query, None if there is none.
+        """
+        key = self._key(query)
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[0] < time.time():
+                self.misses += 1
+                return None
+            # Re-inserting moves the entry to the most recently used end.
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def put(self, query, response):
+        """
+            Caches response to query, if it can be cached.
+        """
+        key = self._key(query)
+        if key is None or is_error(response):
+            return
+        if query['method'] == 'queue_status' and \
+                response.get('status') != 'done':
+            return
+        expires = time.time() + self.ttls[query['method']]
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, response)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+            :return: {"hits": int, "misses": int, "evictions": int,
+                      "size": int}
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'size': len(self._entries)}
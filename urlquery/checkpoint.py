@@ -0,0 +1,63 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+import os
+import threading
+
+
+class Checkpoint(object):
+    """
+        Records the units of work already completed by a long running job
+        (chunks of a mass_submit, slices of a backfill, ...) so that it
+        can be resumed after an interruption without redoing them.
+
+        The checkpoint is an append-only file with one JSON object per
+        line, every completed unit is flushed to disk as soon as it is
+        added. A line truncated by a crash is ignored when loading.
+
+        :param path: File holding the checkpoint, created if missing.
+    """
+    __slots__ = ["path", "_done", "_lock"]
+
+    def __init__(self, path):
+        self.path = path
+        self._done = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._done[entry['key']] = entry.get('value')
+
+    def __contains__(self, key):
+        return key in self._done
+
+    def __len__(self):
+        return len(self._done)
+
+    def get(self, key, default=None):
+        return self._done.get(key, default)
+
+    def keys(self):
+        return list(self._done.keys())
+
+    def add(self, key, value=None):
+        """
+            Marks key as done, value is any JSON serializable result to
+            give back on resume.
+        """
+        line = json.dumps({'key': key, 'value': value}) + '\n'
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._done[key] = value
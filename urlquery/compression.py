@@ -0,0 +1,133 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import gzip as _gzip
+import io
+import zlib
+
+
+_gzip_magic = b'\x1f\x8b'
+
+
+class TransferStats(object):
+    """
+        Sizes of the request and response of one API call.
+
+        The *_bytes attributes are the sizes of the JSON documents, the
+        *_wire_bytes ones what actually went over the network, after
+        compression. saved() is the difference summed over both ways.
+    """
+    __slots__ = ["method", "request_bytes", "request_wire_bytes",
+                 "response_bytes", "response_wire_bytes"]
+
+    def __init__(self, method=None):
+        self.method = method
+        self.request_bytes = 0
+        self.request_wire_bytes = 0
+        self.response_bytes = 0
+        self.response_wire_bytes = 0
+
+    def saved(self):
+        return (self.request_bytes - self.request_wire_bytes +
+                self.response_bytes - self.response_wire_bytes)
+
+    def to_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    def __repr__(self):
+        return 'TransferStats({})'.format(self.to_dict())
+
+
+def compress(body, threshold, level=6):
+    """
+        gzip compresses body if it is at least threshold bytes long
+        (never if threshold is None).
+
+        :return: (body, compressed) tuple.
+    """
+    if threshold is None or len(body) < threshold:
+        return body, False
+    out = io.BytesIO()
+    with _gzip.GzipFile(fileobj=out, mode='wb', compresslevel=level) as f:
+        f.write(body)
+    return out.getvalue(), True
+
+
+class Decompressor(object):
+    """
+        Incremental decoder of a response body. The compression is taken
+        from encoding, the Content-Encoding of the response (gzip or
+        deflate). Without one, gzip compression is detected from the first
+        bytes, as the API may compress a body without saying so.
+
+        feed() takes the bytes as received and returns the decoded ones,
+        both sizes are added to stats. An unsupported encoding raises a
+        ValueError on the first bytes.
+    """
+    __slots__ = ["stats", "encoding", "_head", "_zlib"]
+
+    def __init__(self, stats, encoding=None):
+        self.stats = stats
+        self.encoding = (encoding or '').strip().lower() or None
+        self._head = b''
+        self._zlib = None
+
+    def _decoder(self, head):
+        encoding = self.encoding
+        if encoding in ('gzip', 'x-gzip'):
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if encoding == 'deflate':
+            # Should be a zlib stream, but some servers send raw deflate.
+            if len(head) >= 2 and head[0] & 0x0f == 8 and \
+                    (head[0] * 256 + head[1]) % 31 == 0:
+                return zlib.decompressobj(zlib.MAX_WBITS)
+            return zlib.decompressobj(-zlib.MAX_WBITS)
+        if encoding not in (None, 'identity'):
+            raise ValueError('Unsupported Content-Encoding: {!r}'.format(
+                encoding))
+        if head.startswith(_gzip_magic):
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        return None
+
+    def feed(self, data):
+        self.stats.response_wire_bytes += len(data)
+        if self._head is not None:
+            data = self._head + data
+            if len(data) < len(_gzip_magic):
+                self._head = data
+                return b''
+            self._head = None
+            self._zlib = self._decoder(bytearray(data[:2]))
+        if self._zlib is not None:
+            data = self._zlib.decompress(data)
+        self.stats.response_bytes += len(data)
+        return data
+
+    def flush(self):
+        if self._head:
+            data, self._head = self._head, None
+            self._zlib = self._decoder(bytearray(data))
+            if self._zlib is not None:
+                data = self._zlib.decompress(data)
+                data += self._zlib.flush()
+        elif self._zlib is not None:
+            data = self._zlib.flush()
+        else:
+            data = b''
+        self.stats.response_bytes += len(data)
+        return data
+
+
+def decompress_chunks(chunks, stats, encoding=None):
+    """
+        Generator decoding the chunks of a response body with a
+        Decompressor.
+    """
+    decompressor = Decompressor(stats, encoding)
+    for chunk in chunks:
+        data = decompressor.feed(chunk)
+        if data:
+            yield data
+    data = decompressor.flush()
+    if data:
+        yield data
@@ -0,0 +1,60 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from .errors import APIError, is_error
+from .records import field
+from .timeutil import to_epoch
+
+
+class ReportCursor(object):
+    """
+        Walks report_list pages over a time range, see
+        URLQuery.iter_reports.
+
+        Every page starts at the date of the last report of the previous
+        one, so the reports sharing that date come back on both pages:
+        they are recognized by their report_id and only yielded once. If
+        a whole page shares the same date (more than page_size reports
+        created in the same second) the cursor moves one second forward
+        to make progress.
+    """
+    __slots__ = ["position", "until", "page_size", "done", "_boundary"]
+
+    def __init__(self, since, until, page_size):
+        self.position = to_epoch(since)
+        self.until = None if until is None else to_epoch(until)
+        self.page_size = page_size
+        self.done = False
+        self._boundary = set()
+
+    def advance(self, page):
+        """
+            Takes the page fetched at position and moves position to the
+            start of the next page (done is set if there is none).
+
+            :return: List of the new reports of the page within the range.
+        """
+        if is_error(page):
+            raise APIError(page)
+        reports = field(page, 'reports') or []
+        dated = [(to_epoch(field(r, 'date')), r) for r in reports]
+        last = max([date for date, _ in dated] or [self.position])
+
+        fresh = []
+        for date, report in dated:
+            if self.until is not None and date > self.until:
+                continue
+            if field(report, 'report_id') in self._boundary:
+                continue
+            fresh.append(report)
+
+        if len(reports) < self.page_size or \
+                (self.until is not None and last > self.until):
+            self.done = True
+        elif last > self.position:
+            self.position = last
+        else:
+            self.position += 1
+        self._boundary = set(field(r, 'report_id') for date, r in dated
+                             if date == self.position)
+        return fresh
@@ -0,0 +1,64 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+
+def is_error(response):
+    """
+        True if response is an error: either a query refused before being
+        sent (it then has an "error" key) or an API response whose
+        RESPONSE object has the "error" status.
+    """
+    if not isinstance(response, dict):
+        return False
+    if response.get('error') is not None:
+        return True
+    status = response.get('_response_')
+    return isinstance(status, dict) and status.get('status') == 'error'
+
+
+class APIError(Exception):
+    """
+        Raised by the helpers working on many calls at once when one of
+        the calls returns an error. The offending response is in the
+        response attribute.
+    """
+
+    def __init__(self, response, message=None):
+        if message is None:
+            message = 'API error: {}'.format(response)
+        super(APIError, self).__init__(message)
+        self.response = response
+
+
+class ServerError(Exception):
+    """
+        Raised when the API answers with an HTTP 5xx status. The status
+        code is in the status attribute.
+    """
+
+    def __init__(self, status, message=None):
+        if message is None:
+            message = 'Server error: HTTP {}'.format(status)
+        super(ServerError, self).__init__(message)
+        self.status = status
+
+
+class CircuitOpenError(Exception):
+    """
+        Raised instead of sending a call while the circuit breaker of the
+        client is open, see urlquery.retry.CircuitBreaker.
+    """
+
+
+class RecordingNotFound(LookupError):
+    """
+        Raised by urlquery.transport.ReplayTransport for a query which was
+        never recorded. The query (without the API key) is in the query
+        attribute.
+    """
+
+    def __init__(self, query, message=None):
+        if message is None:
+            message = 'No recorded response for {}'.format(query)
+        super(RecordingNotFound, self).__init__(message)
+        self.query = query
@@ -0,0 +1,198 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+import zlib
+
+from . import parallel
+from .bloom import RotatingBloomFilter
+from .checkpoint import Checkpoint
+from .errors import APIError, ServerError, is_error
+from .records import field
+from .timeutil import slice_end, slice_start, slices
+
+
+def _slice_key(feed, interval, start):
+    return '{}:{}:{}'.format(feed, interval, start)
+
+
+def backfill(fetch, start, end, feed='unfiltered', interval='hour',
+             max_workers=4, checkpoint=None):
+    """
+        Fetches every urlfeed slice between start and end, see
+        URLQuery.backfill.
+
+        :param fetch: Callable taking the start of a slice (Unix epoch)
+            and returning its URLFEED.
+
+        :return: Iterator of (slice start, URLFEED) tuples in time order.
+    """
+    if checkpoint is not None and not isinstance(checkpoint, Checkpoint):
+        checkpoint = Checkpoint(checkpoint)
+
+    todo = [s for s in slices(start, end, interval)
+            if checkpoint is None or
+            _slice_key(feed, interval, s) not in checkpoint]
+    for start, response, error in parallel.imap(fetch, todo, max_workers,
+                                                 True):
+        if error is not None:
+            raise error
+        if is_error(response):
+            raise APIError(response)
+        yield start, response
+        # Only recorded once the caller asked for the next slice, that is
+        # once it is done with this one.
+        if checkpoint is not None and closed(start, interval):
+            checkpoint.add(_slice_key(feed, interval, start))
+
+
+def closed(start, interval):
+    """
+        True if the slice starting at start is over. The slices still
+        open are never checkpointed, they are fetched again, complete,
+        by the next backfill.
+    """
+    return slice_end(start, interval) <= time.time()
+
+
+class FeedFollower(object):
+    """
+        Follows the hourly urlfeed as new slices are closed and yields
+        every URL object once:
+
+            for url in FeedFollower(uq, checkpoint='/var/lib/feed.ckpt'):
+                ...
+
+        Each slice is fetched once, delay seconds after it closes, by a
+        single streamed iter_urlfeed call; nothing is polled in between.
+        After a restart, the slices closed since the last one processed
+        are fetched first, in order.
+
+        URLs already seen (by address) are dropped. They are remembered
+        in a RotatingBloomFilter, so memory stays bounded: a URL is
+        recognized for at least dedup_capacity new URLs, and a small
+        error_rate of new URLs are wrongly taken for seen ones.
+
+        :param client: URLQuery instance. (default: the module level
+            default_client())
+
+        :param checkpoint: Optional path of a checkpoint file recording
+            the last slice processed, the de-duplication filter is saved
+            next to it (checkpoint + '.bloom'). A slice is recorded once
+            all its URLs have been consumed.
+
+        :param start: Time from which to start when there is no
+            checkpoint. (default: the last closed slice)
+
+        :param delay: Seconds to wait after the end of a slice before
+            fetching it, to let the service finish it. (default: 120)
+
+        :param retry_interval: Seconds to wait before fetching a slice
+            again after a transient failure (network error, HTTP 5xx).
+            Other errors, an APIError for an invalid key for instance,
+            are raised by follow. (default: 60)
+
+        :param on_error: Optional callable called with the exception and
+            the slice start for every transient failure, before waiting
+            retry_interval.
+    """
+    __slots__ = ["client", "feed", "delay", "retry_interval", "seen",
+                 "last_slice", "_checkpoint", "_bloom_path", "_stop",
+                 "gzip", "apikey", "on_error"]
+
+    def __init__(self, client=None, feed='unfiltered', checkpoint=None,
+                 start=None, delay=120., retry_interval=60.,
+                 dedup_capacity=1000000, error_rate=.001, gzip=False,
+                 apikey=None, on_error=None):
+        if client is None:
+            # urlquery.api imports this module through ooapi.
+            from .api import default_client
+            client = default_client()
+        if feed not in client._feed_type:
+            raise ValueError('Feed can only be in ' +
+                             ', '.join(client._feed_type))
+        self.client = client
+        self.on_error = on_error
+        self.feed = feed
+        self.delay = delay
+        self.retry_interval = retry_interval
+        self.gzip = gzip
+        self.apikey = apikey
+        self._stop = threading.Event()
+        self._checkpoint = None
+        self._bloom_path = None
+        self.last_slice = None
+        self.seen = None
+        if checkpoint is not None:
+            self._checkpoint = Checkpoint(checkpoint)
+            self._bloom_path = checkpoint + '.bloom'
+            self.last_slice = self._checkpoint.get('last_slice')
+            if os.path.exists(self._bloom_path):
+                self.seen = RotatingBloomFilter.load(self._bloom_path)
+        if self.seen is None:
+            self.seen = RotatingBloomFilter(dedup_capacity, error_rate)
+        if self.last_slice is None:
+            if start is None:
+                start = time.time() - 3600
+            self.last_slice = slice_start(start, 'hour') - 3600
+
+    def __iter__(self):
+        return self.follow()
+
+    def stop(self):
+        """
+            Makes follow return, also interrupting a wait for the next
+            slice.
+        """
+        self._stop.set()
+
+    def follow(self):
+        """
+            Generator of the new URL objects, running until stop is
+            called.
+        """
+        try:
+            while not self._stop.is_set():
+                current = self.last_slice + 3600
+                wait = current + 3600 + self.delay - time.time()
+                if wait > 0 and self._stop.wait(wait):
+                    return
+                try:
+                    for url in self._fetch(current):
+                        yield url
+                except self._transient_errors() as e:
+                    # URLs of the slice already yielded are in seen, they
+                    # will not be yielded again by the retry.
+                    if self.on_error is not None:
+                        self.on_error(e, current)
+                    if self._stop.wait(self.retry_interval):
+                        return
+                    continue
+                self._done(current)
+        finally:
+            # A slice left half way is fetched again on restart, the saved
+            # filter keeps its URLs already yielded from being repeated.
+            if self._bloom_path is not None:
+                self.seen.save(self._bloom_path)
+
+    def _transient_errors(self):
+        transport = getattr(self.client, 'transport', None)
+        return (EnvironmentError, ServerError, zlib.error) + \
+            getattr(transport, 'transient_errors', ())
+
+    def _fetch(self, current):
+        with self.client.iter_urlfeed(self.feed, 'hour', current,
+                                      gzip=self.gzip,
+                                      apikey=self.apikey) as urls:
+            for url in urls:
+                addr = field(url, 'addr')
+                if addr is None or self.seen.add(addr):
+                    yield url
+
+    def _done(self, current):
+        self.last_slice = current
+        if self._checkpoint is not None:
+            self.seen.save(self._bloom_path)
+            self._checkpoint.add('last_slice', current)
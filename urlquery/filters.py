@@ -0,0 +1,151 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .records import Record, field
+
+
+columns = ('tld', 'domain', 'fqdn', 'ip.addr', 'ip.cc', 'ip.country',
+           'ip.asn')
+
+
+def _values(values):
+    if callable(values) or isinstance(values, (list, tuple, set,
+                                               frozenset)):
+        return values
+    return [values]
+
+
+class FeedTable(object):
+    """
+        Columnar copy of urlfeed entries to evaluate many watch rules at
+        once, with NumPy.
+
+        Every column (tld, domain, fqdn, ip.addr, ip.cc, ip.country and
+        ip.asn) is stored as an array of integer codes into the list of
+        its distinct values. Rules are first evaluated on the distinct
+        values only, giving for every value the bit set of the rules it
+        matches, then one indexing operation per column spreads these
+        bit sets over all the entries.
+
+            table = FeedTable(uq.urlfeed()['feed'])
+            matches = table.evaluate({
+                'luxembourg': {'tld': 'lu', 'ip.cc': 'LU',
+                               'ip.country': 'Luxembourg'},
+                'as1299': {'ip.asn': 1299},
+            })
+            entries = table.take(matches['luxembourg'])
+
+        A rule maps columns to the accepted values: a single value, a
+        list/set of values, or a callable taking a value and returning a
+        bool. By default an entry matches a rule if any of its columns
+        matches; with "match": "all" in the rule, all of them must.
+
+        :param entries: URL objects (dicts or records) of a feed slice.
+    """
+    __slots__ = ["entries", "codes", "vocabularies", "_index"]
+
+    def __init__(self, entries):
+        if numpy is None:
+            raise ImportError('numpy is required for urlquery.filters')
+        self.entries = list(entries)
+        index = [{} for _ in columns]
+        codes = [[] for _ in columns]
+        for entry in self.entries:
+            if not isinstance(entry, (dict, Record)):
+                entry = {}
+            ip = field(entry, 'ip') or {}
+            row = (field(entry, 'tld'), field(entry, 'domain'),
+                   field(entry, 'fqdn'), field(ip, 'addr'), field(ip, 'cc'),
+                   field(ip, 'country'), field(ip, 'asn'))
+            for i, value in enumerate(row):
+                codes[i].append(index[i].setdefault(value, len(index[i])))
+        self.codes = dict((name, numpy.array(c, dtype=numpy.int32))
+                          for name, c in zip(columns, codes))
+        self._index = dict(zip(columns, index))
+        self.vocabularies = {}
+        for name, values in self._index.items():
+            vocabulary = [None] * len(values)
+            for value, code in values.items():
+                vocabulary[code] = value
+            self.vocabularies[name] = vocabulary
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _hits(self, column, values):
+        # Codes of the distinct values of column accepted by a rule.
+        values = _values(values)
+        if callable(values):
+            return [code for code, v in enumerate(self.vocabularies[column])
+                    if v is not None and values(v)]
+        index = self._index[column]
+        return [index[v] for v in values if v in index]
+
+    def evaluate(self, rules):
+        """
+            Evaluates all the rules over all the entries.
+
+            :param rules: Dict of rule name to rule.
+
+            :return: Dict of rule name to the NumPy array of the indexes of
+                the matching entries, in increasing order.
+        """
+        names = list(rules)
+        for name in names:
+            unknown = set(rules[name]) - set(columns) - set(['match'])
+            if unknown:
+                raise ValueError('Unknown column(s) in rule {}: {}'.format(
+                    name, ', '.join(sorted(unknown))))
+        # One bit per rule, 8 rules per byte: "any" rules OR their
+        # columns, "all" rules AND them.
+        width = max(1, (len(names) + 7) // 8)
+        require_all = numpy.zeros(width, dtype=numpy.uint8)
+        for r, name in enumerate(names):
+            if rules[name].get('match', 'any') == 'all':
+                require_all[r >> 3] |= 1 << (r & 7)
+        any_all = require_all.any()
+
+        matched = numpy.zeros((len(self.entries), width), dtype=numpy.uint8)
+        if any_all:
+            matched_all = numpy.tile(require_all, (len(self.entries), 1))
+        for column in columns:
+            size = len(self.vocabularies[column])
+            any_bits = numpy.zeros((size, width), dtype=numpy.uint8)
+            all_bits = numpy.full((size, width), 0xff, dtype=numpy.uint8)
+            used = False
+            for r, name in enumerate(names):
+                if column not in rules[name]:
+                    continue
+                used = True
+                byte, bit = r >> 3, 1 << (r & 7)
+                hits = self._hits(column, rules[name][column])
+                if require_all[byte] & bit:
+                    all_bits[:, byte] &= ~bit & 0xff
+                    all_bits[hits, byte] |= bit
+                else:
+                    any_bits[hits, byte] |= bit
+            if not used:
+                continue
+            codes = self.codes[column]
+            matched |= any_bits[codes]
+            if any_all:
+                matched_all &= all_bits[codes]
+        if any_all:
+            matched |= matched_all
+
+        matched = [numpy.ascontiguousarray(matched[:, byte])
+                   for byte in range(width)]
+        return dict((name, numpy.flatnonzero(
+            matched[r >> 3] & (1 << (r & 7)) != 0))
+            for r, name in enumerate(names))
+
+    def take(self, indexes):
+        """
+            Returns the entries at indexes (as returned by evaluate).
+        """
+        return [self.entries[i] for i in indexes]
@@ -0,0 +1,216 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from bisect import bisect_left
+import threading
+
+from .errors import is_error
+
+
+# Upper bounds (seconds) of the latency histogram buckets, the last one
+# (+Inf) is implicit.
+default_buckets = (.005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10.,
+                   30.)
+
+
+class MethodMetrics(object):
+    """
+        Counters of one API method, see Metrics.
+    """
+    __slots__ = ["calls", "errors", "buckets", "latency_sum",
+                 "request_bytes", "request_wire_bytes", "response_bytes",
+                 "response_wire_bytes", "cache_hits", "coalesced"]
+
+    def __init__(self, buckets):
+        self.calls = 0
+        self.errors = {}
+        self.buckets = [0] * (len(buckets) + 1)
+        self.latency_sum = 0.
+        self.request_bytes = 0
+        self.request_wire_bytes = 0
+        self.response_bytes = 0
+        self.response_wire_bytes = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+
+
+class Metrics(object):
+    """
+        Registry of what a client does, per API method:
+
+        * calls: number of calls (including the ones answered by the
+          cache or coalesced with another one),
+        * errors: number of calls failing, by exception type name
+          ("APIError" for the error responses of the API),
+        * latency: histogram of the duration of the calls, retries and
+          rate limiting included,
+        * request/response (wire) bytes: see compression.TransferStats,
+        * cache_hits, coalesced: calls answered by the ResponseCache, or
+          by the request of an identical call (SingleFlight).
+
+            metrics = Metrics()
+            uq = URLQuery(apikey=key, metrics=metrics)
+            ...
+            metrics.snapshot()['report']['latency']['count']
+            open('urlquery.prom', 'w').write(metrics.prometheus())
+
+        Recording a call costs a few microseconds. A Metrics can be
+        shared by several clients, including AsyncURLQuery instances.
+
+        :param buckets: Increasing upper bounds, in seconds, of the
+            latency histogram buckets.
+    """
+    __slots__ = ["bucket_bounds", "_methods", "_lock"]
+
+    def __init__(self, buckets=default_buckets):
+        self.bucket_bounds = tuple(buckets)
+        self._methods = {}
+        self._lock = threading.Lock()
+
+    def _method(self, method):
+        # Called with the lock held.
+        m = self._methods.get(method)
+        if m is None:
+            m = self._methods[method] = MethodMetrics(self.bucket_bounds)
+        return m
+
+    def observe(self, method, seconds, error=None, response=None):
+        """
+            Records a call of method which took seconds and raised error
+            (an exception), or returned response.
+        """
+        bucket = bisect_left(self.bucket_bounds, seconds)
+        if error is not None:
+            error = type(error).__name__
+        elif is_error(response):
+            error = 'APIError'
+        with self._lock:
+            m = self._method(method)
+            m.calls += 1
+            m.buckets[bucket] += 1
+            m.latency_sum += seconds
+            if error is not None:
+                m.errors[error] = m.errors.get(error, 0) + 1
+
+    def transferred(self, stats):
+        """
+            Records the TransferStats of a request.
+        """
+        with self._lock:
+            m = self._method(stats.method)
+            m.request_bytes += stats.request_bytes
+            m.request_wire_bytes += stats.request_wire_bytes
+            m.response_bytes += stats.response_bytes
+            m.response_wire_bytes += stats.response_wire_bytes
+
+    def cache_hit(self, method):
+        with self._lock:
+            self._method(method).cache_hits += 1
+
+    def coalesced(self, method):
+        with self._lock:
+            self._method(method).coalesced += 1
+
+    def reset(self):
+        with self._lock:
+            self._methods = {}
+
+    def snapshot(self):
+        """
+            :return: The counters of every method called so far:
+
+                {method: {
+                    "calls": int, "errors": {type: int},
+                    "latency": {"buckets": [[upper bound, cumulative
+                                             count], ...],
+                                "sum": float, "count": int},
+                    "request_bytes": int, "request_wire_bytes": int,
+                    "response_bytes": int, "response_wire_bytes": int,
+                    "cache_hits": int, "coalesced": int}}
+
+                The last upper bound is float('inf').
+        """
+        bounds = self.bucket_bounds + (float('inf'),)
+        result = {}
+        with self._lock:
+            for method, m in self._methods.items():
+                cumulative = []
+                count = 0
+                for bound, n in zip(bounds, m.buckets):
+                    count += n
+                    cumulative.append([bound, count])
+                result[method] = {
+                    'calls': m.calls, 'errors': dict(m.errors),
+                    'latency': {'buckets': cumulative,
+                                'sum': m.latency_sum, 'count': count},
+                    'request_bytes': m.request_bytes,
+                    'request_wire_bytes': m.request_wire_bytes,
+                    'response_bytes': m.response_bytes,
+                    'response_wire_bytes': m.response_wire_bytes,
+                    'cache_hits': m.cache_hits, 'coalesced': m.coalesced}
+        return result
+
+    def prometheus(self, namespace='urlquery'):
+        """
+            The counters in the Prometheus text exposition format, with
+            one "method" label per API method, for example to be served
+            on a /metrics endpoint or written for the node exporter's
+            textfile collector.
+        """
+        snapshot = sorted(self.snapshot().items(), key=lambda i: str(i[0]))
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append('# HELP {}_{} {}'.format(namespace, name,
+                                                  help_text))
+            lines.append('# TYPE {}_{} {}'.format(namespace, name, kind))
+
+        def sample(name, labels, value):
+            lines.append('{}_{}{{{}}} {}'.format(
+                namespace, name,
+                ','.join('{}="{}"'.format(k, _escape(v))
+                         for k, v in labels), _number(value)))
+
+        family('calls_total', 'counter', 'API calls.')
+        for method, m in snapshot:
+            sample('calls_total', [('method', method)], m['calls'])
+        family('errors_total', 'counter', 'API calls failing, by error '
+               'type.')
+        for method, m in snapshot:
+            for error, n in sorted(m['errors'].items()):
+                sample('errors_total', [('method', method), ('type', error)],
+                       n)
+        family('call_duration_seconds', 'histogram', 'Duration of the API '
+               'calls.')
+        for method, m in snapshot:
+            for bound, n in m['latency']['buckets']:
+                sample('call_duration_seconds_bucket',
+                       [('method', method), ('le', _number(bound))], n)
+            sample('call_duration_seconds_sum', [('method', method)],
+                   m['latency']['sum'])
+            sample('call_duration_seconds_count', [('method', method)],
+                   m['latency']['count'])
+        for name, help_text in [
+                ('request_bytes', 'JSON bytes sent.'),
+                ('request_wire_bytes', 'Bytes sent, after compression.'),
+                ('response_bytes', 'JSON bytes received.'),
+                ('response_wire_bytes', 'Bytes received, before '
+                 'decompression.'),
+                ('cache_hits', 'Calls answered by the response cache.'),
+                ('coalesced', 'Calls answered by the request of an '
+                 'identical call.')]:
+            family(name + '_total', 'counter', help_text)
+            for method, m in snapshot:
+                sample(name + '_total', [('method', method)], m[name])
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n')
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
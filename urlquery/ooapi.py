@@ -6,11 +6,22 @@ try:
 except ImportError:
     import json
 
-import requests
-from dateutil.parser import parse
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import time
 
+from . import parallel
+from . import records
+from .compression import (Decompressor, TransferStats, compress,
+                          decompress_chunks)
+from .cursor import ReportCursor
+from .feed import backfill
+from .errors import ServerError, is_error
+from .profiler import RequestProfile
+from .stream import FeedStream
+from .timeutil import last_closed, query_timestamp, slice_start
+from .transport import RequestsTransport
+
 
 base_url = 'https://uqapi.net/v3/json'
 gzip_default = False
@@ -21,11 +32,89 @@ gzip_default = False
 
 
 class URLQuery(object):
+    """
+        Client for the urlquery API.
+
+        All the HTTP requests of an instance are POSTed to base_url by its
+        transport. The default one keeps one connection pool, which can be
+        shared by any number of threads: each thread gets its own
+        lightweight requests.Session, but all of them are mounted on the
+        same HTTPAdapter, so connections (and their TLS sessions) are
+        reused across calls and across threads.
+
+        :param transport: Optional Transport sending the requests instead
+            of the default one, see urlquery.transport: Urllib3Transport
+            and HTTPXTransport (HTTP/2) cost less CPU per call,
+            RecordingTransport and ReplayTransport record the responses
+            and answer from the recordings without any network access.
+            The pool_* parameters are then ignored.
+
+        :param pool_connections: Number of per-host connection pools to
+            keep. (default: 10)
+
+        :param pool_maxsize: Maximum number of connections kept open to a
+            single host. (default: 10)
+
+        :param pool_block: If True, a thread wanting a connection while
+            pool_maxsize are in use waits for one to be released instead
+            of opening a throw-away connection. (default: False)
+
+        :param cache: Optional ResponseCache answering the calls it holds
+            without going to the network.
+
+        :param report_store: Optional ReportStore that report reads from
+            and writes to.
+
+        :param compress_threshold: When gzip is enabled for a call, its
+            request body is gzip compressed too if it is at least that
+            many bytes (None never compresses). Responses are always
+            decompressed as they are received, whether or not the server
+            flags them with Content-Encoding. (default: 8192)
+
+        :param records: If True, the responses of urlfeed, submit,
+            mass_submit, queue_status, report and report_list are decoded
+            into the compact objects of urlquery.records instead of dicts.
+            (default: False)
+
+        :param on_transfer: Optional callable called after every call
+            with its TransferStats (request and response sizes, before and
+            after compression). The stats of the last call made by the
+            current thread are also in last_transfer.
+
+        :param rate_limiter: Optional RateLimiter every request waits for,
+            which also sends throttled requests again.
+
+        :param retry_policy: Optional RetryPolicy retrying the idempotent
+            calls failing with a transient error, and with its circuit
+            breaker failing fast while the API is down. HTTP 5xx statuses
+            raise a ServerError.
+
+        :param single_flight: Optional SingleFlight making identical
+            concurrent calls share one request.
+
+        :param metrics: Optional Metrics recording the count, errors,
+            latency and sizes of the calls of every method.
+
+        :param profiler: Optional callable called with a RequestProfile
+            (urlquery.profiler) after every request sent by query and the
+            API methods, except the streamed ones: time spent serializing
+            the query, getting a connection, waiting for the response,
+            receiving, decompressing and decoding it. TraceFile writes
+            them to a file for trace viewers.
+    """
     __slots__ = ["_feed_type", "_intervals", "_priorities", "_search_types",
                  "_result_types", "_url_types", "gzip_default", "base_url",
-                 "_url_matchings", "apikey"]
-
-    def __init__(self, base_url=None, gzip_default=False, apikey=None):
+                 "_url_matchings", "_access_levels", "apikey", "transport",
+                 "_local", "cache", "report_store", "compress_threshold",
+                 "on_transfer", "records", "rate_limiter", "retry_policy",
+                 "single_flight", "metrics", "profiler"]
+
+    def __init__(self, base_url=None, gzip_default=False, apikey=None,
+                 pool_connections=10, pool_maxsize=10, pool_block=False,
+                 cache=None, report_store=None, compress_threshold=8192,
+                 on_transfer=None, records=False, rate_limiter=None,
+                 retry_policy=None, single_flight=None, transport=None,
+                 metrics=None, profiler=None):
         self._feed_type = ['unfiltered', 'flagged']
         self._intervals = ['hour', 'day']
         self._priorities = ['urlfeed', 'low', 'medium', 'high']
@@ -33,6 +122,7 @@ class URLQuery(object):
                               'urlquery_alert', 'js_script_hash']
         self._result_types = ['reports', 'url_list']
         self._url_matchings = ['url_host', 'url_path']
+        self._access_levels = ['public', 'nonpublic', 'private']
         self.gzip_default = gzip_default
 
         if base_url is not None:
@@ -45,10 +135,218 @@ class URLQuery(object):
         else:
             self.apikey = ''
 
-    def query(self, query, gzip=False, apikey=None):
-        if query.get('error') is not None:
-            return query
+        if transport is None:
+            transport = RequestsTransport(pool_connections, pool_maxsize,
+                                          pool_block)
+        self.transport = transport
+        self._local = threading.local()
+        self.cache = cache
+        self.report_store = report_store
+        self.compress_threshold = compress_threshold
+        self.on_transfer = on_transfer
+        self.records = records
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.single_flight = single_flight
+        self.metrics = metrics
+        self.profiler = profiler
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+            Closes all the pooled connections. The instance can still be
+            used afterwards, new connections are opened on demand.
+        """
+        self.transport.close()
 
+    def send(self, query):
+        """
+            POSTs an already prepared query (method, parameters and key)
+            to base_url with the transport and returns the decoded
+            response.
+        """
+        if self.metrics is None:
+            return self._send(query)
+        start = time.perf_counter()
+        try:
+            response = self._send(query)
+        except Exception as e:
+            self._observe(query, start, e)
+            raise
+        self._observe(query, start, response=response)
+        return response
+
+    def _observe(self, query, start, error=None, response=None):
+        if self.metrics is not None:
+            self.metrics.observe(query.get('method'),
+                                 time.perf_counter() - start, error,
+                                 response)
+
+    def _joined(self, query):
+        # Called for the calls answered by the request of another one.
+        if self.metrics is not None:
+            self.metrics.coalesced(query.get('method'))
+
+    def _send(self, query):
+        if self.cache is not None:
+            response = self.cache.get(query)
+            if response is not None:
+                if self.metrics is not None:
+                    self.metrics.cache_hit(query.get('method'))
+                return response
+        if self.single_flight is not None:
+            response = self.single_flight.do(query, self._fetch,
+                                             self._joined)
+        else:
+            response = self._fetch(query)
+        if self.cache is not None:
+            self.cache.put(query, response)
+        return response
+
+    def _fetch(self, query):
+        return self._retrying(self._post, query)
+
+    def _retrying(self, func, query):
+        if self.retry_policy is None:
+            return func(query)
+        return self.retry_policy.call(
+            query.get('method'), func, query,
+            exceptions=self.transport.transient_errors)
+
+    def stream(self, query, key, chunk_size=65536, hook=None):
+        """
+            POSTs an already prepared query whose response is a JSON
+            object holding the big array key, and returns a FeedStream
+            yielding the elements of that array as the body is received,
+            passed through hook if given. Only the sending of the request
+            is retried by retry_policy.
+        """
+        start = time.perf_counter()
+        try:
+            r, stats = self._retrying(self._open, query)
+        except Exception as e:
+            self._observe(query, start, e)
+            raise
+        chunks = decompress_chunks(r.stream(chunk_size), stats,
+                                   r.getheader('Content-Encoding'))
+
+        def close():
+            r.close()
+            self._transferred(stats)
+            self._observe(query, start)
+        return FeedStream(chunks, key, close, hook)
+
+    @property
+    def last_transfer(self):
+        """
+            TransferStats of the last call made by the current thread.
+        """
+        return getattr(self._local, 'transfer', None)
+
+    def _transferred(self, stats):
+        self._local.transfer = stats
+        if self.metrics is not None:
+            self.metrics.transferred(stats)
+        if self.on_transfer is not None:
+            self.on_transfer(stats)
+
+    def _encode(self, query):
+        stats = TransferStats(query.get('method'))
+        body = json.dumps(query).encode('utf-8')
+        stats.request_bytes = len(body)
+        # The bodies are read as received and decoded by Decompressor, so
+        # only the encodings it supports may be accepted.
+        headers = {'Accept-Encoding':
+                   'gzip' if query.get('gzip') else 'identity'}
+        if query.get('gzip'):
+            body, compressed = compress(body, self.compress_threshold)
+            if compressed:
+                headers['Content-Encoding'] = 'gzip'
+        stats.request_wire_bytes = len(body)
+        return body, headers, stats
+
+    def _open(self, query):
+        # _request for a body read by the caller: 5xx statuses are raised
+        # right away.
+        r, stats = self._request(query)
+        if r.status >= 500:
+            r.close()
+            raise ServerError(r.status)
+        return r, stats
+
+    def _request(self, query, profile=None):
+        if profile is not None:
+            start = time.perf_counter()
+        body, headers, stats = self._encode(query)
+        if profile is not None:
+            profile.add('serialize', start)
+        limiter = self.rate_limiter
+        for attempt in range(limiter.retries + 1 if limiter else 1):
+            if limiter is not None:
+                if profile is not None:
+                    start = time.perf_counter()
+                limiter.acquire(query)
+                if profile is not None:
+                    profile.add('throttle', start)
+            if profile is not None:
+                start = time.perf_counter()
+            r = self.transport.post(self.base_url, body, headers)
+            if profile is not None:
+                profile.sent(start, r.connect)
+            if limiter is None or attempt == limiter.retries or \
+                    not limiter.feedback(query, r.status,
+                                         r.getheader('Retry-After')):
+                break
+            # Reading the (small) body lets the connection be reused.
+            r.read()
+            r.close()
+        return r, stats
+
+    def _post(self, query, chunk_size=65536):
+        if self.profiler is not None:
+            return self._profiled_post(query, chunk_size)
+        r, stats = self._request(query)
+        try:
+            data = b''.join(decompress_chunks(
+                r.stream(chunk_size), stats,
+                r.getheader('Content-Encoding')))
+        finally:
+            r.close()
+        self._transferred(stats)
+        if r.status >= 500:
+            raise ServerError(r.status)
+        return json.loads(data.decode('utf-8'))
+
+    def _profiled_post(self, query, chunk_size):
+        # _post timing every phase of the request.
+        profile = RequestProfile(query.get('method'))
+        try:
+            r, stats = self._request(query, profile)
+            profile.status = r.status
+            try:
+                data = profile.read(r.stream(chunk_size), Decompressor(
+                    stats, r.getheader('Content-Encoding')))
+            finally:
+                r.close()
+            self._transferred(stats)
+            if r.status >= 500:
+                raise ServerError(r.status)
+            start = time.perf_counter()
+            response = json.loads(data.decode('utf-8'))
+            profile.add('decode', start)
+            return response
+        except Exception as e:
+            profile.error = type(e).__name__
+            raise
+        finally:
+            self.profiler(profile)
+
+    def _prepare(self, query, gzip=False, apikey=None):
         if self.gzip_default or gzip:
             query['gzip'] = True
 
@@ -56,9 +354,18 @@ class URLQuery(object):
             query['key'] = apikey
         else:
             query['key'] = self.apikey
+        return query
 
-        r = requests.post(base_url, data=json.dumps(query))
-        return r.json()
+    def _decode(self, method, response):
+        if self.records:
+            return records.decode(method, response)
+        return response
+
+    def query(self, query, gzip=False, apikey=None):
+        if query.get('error') is not None:
+            return query
+        response = self.send(self._prepare(query, gzip, apikey))
+        return self._decode(query['method'], response)
 
     def urlfeed(self, feed='unfiltered', interval='hour', timestamp=None,
                 gzip=False, apikey=None):
@@ -100,6 +407,85 @@ class URLQuery(object):
                 For more information on "feed", please see the README
 
         """
+        query = self._urlfeed_query(feed, interval, timestamp)
+        return self.query(query, gzip, apikey)
+
+    def iter_urlfeed(self, feed='unfiltered', interval='hour',
+                     timestamp=None, chunk_size=65536, gzip=False,
+                     apikey=None):
+        """
+            Same as urlfeed, but the response is streamed: the URL objects
+            of "feed" are parsed and yielded one by one while the body is
+            being received, so memory stays flat whatever the size of the
+            slice.
+
+                with uq.iter_urlfeed(interval='day') as urls:
+                    for url in urls:
+                        ...
+                    print(urls.start_time, urls.end_time)
+
+            :param chunk_size: Number of bytes read from the connection at
+                a time.
+
+            :return: FeedStream iterator over the URL objects. start_time
+                and end_time are available as attributes once received.
+                Raises ValueError if the parameters are invalid, and an
+                APIError at the end of the iteration if the API returned
+                an error.
+        """
+        query = self._urlfeed_query(feed, interval, timestamp)
+        if query.get('error') is not None:
+            raise ValueError(query['error'])
+        hook = records.Decoder().url if self.records else None
+        return self.stream(self._prepare(query, gzip, apikey), 'feed',
+                           chunk_size, hook)
+
+    def backfill(self, start, end=None, feed='unfiltered', interval='hour',
+                 max_workers=4, checkpoint=None, gzip=False, apikey=None):
+        """
+            Fetches all the urlfeed slices of a time range, for example to
+            rebuild the history after an outage.
+
+            The range is split in slices aligned on the hour or day slices
+            of the service (UTC), which are fetched in parallel and
+            returned in time order.
+
+            :param start: Start of the range: Unix epoch timestamp,
+                datetime or date string. The whole slice holding start is
+                fetched.
+
+            :param end: End of the range (excluded), same formats as start.
+                Default: the end of the last closed slice, the slice
+                still open is not fetched.
+
+            :param max_workers: Maximum number of slices fetched at the
+                same time.
+                Default: 4
+
+            :param checkpoint: Path of a checkpoint file. Slices are
+                recorded in it once processed (when the next one is
+                requested), and slices it holds are skipped, so an
+                interrupted backfill resumes where it stopped.
+
+            :return: Iterator of (slice start, URLFEED) tuples, the slice
+                start being a Unix epoch. An error returned for a slice is
+                raised as an APIError.
+        """
+        if feed not in self._feed_type:
+            raise ValueError('Feed can only be in ' +
+                             ', '.join(self._feed_type))
+        if interval not in self._intervals:
+            raise ValueError('Interval can only be in ' +
+                             ', '.join(self._intervals))
+        if end is None:
+            end = last_closed(interval)
+
+        def fetch(slice_start):
+            return self.urlfeed(feed, interval, slice_start, gzip, apikey)
+        return backfill(fetch, start, end, feed, interval, max_workers,
+                        checkpoint)
+
+    def _urlfeed_query(self, feed, interval, timestamp):
         query = {'method': 'urlfeed'}
         if feed not in self._feed_type:
             query.update({'error':
@@ -109,24 +495,16 @@ class URLQuery(object):
             query.update({'error':
                           'Interval can only be in ' +
                           ', '.join(self._intervals)})
-        if timestamp is None:
-            ts = datetime.now()
-            if interval == 'hour':
-                ts = ts - timedelta(hours=1)
-            if interval == 'day':
-                ts = ts - timedelta(days=1)
-            timestamp = time.mktime(ts.utctimetuple())
-        else:
-            try:
-                timestamp = time.mktime(parse(timestamp).utctimetuple())
-            except:
-                query.update({'error':
-                              'Unable to convert time to timestamp: ' +
-                              str(time)})
+        timestamp = query_timestamp(
+            query, timestamp, 86400 if interval == 'day' else 3600)
+        if timestamp is not None and interval in self._intervals:
+            # Any time of a slice selects it, its start makes identical
+            # requests for the same slice (cache, single flight).
+            timestamp = slice_start(timestamp, interval)
         query['feed'] = feed
         query['interval'] = interval
         query['timestamp'] = timestamp
-        return self.query(query, gzip, apikey)
+        return query
 
     def submit(self, url, useragent=None, referer=None, priority='low',
                access_level='public', callback_url=None, submit_vt=False,
@@ -231,17 +609,53 @@ class URLQuery(object):
 
     def mass_submit(self, urls, useragent=None, referer=None,
                     access_level='public', priority='low', callback_url=None,
+                    chunk_size=100, max_workers=4, retries=2, checkpoint=None,
                     gzip=False, apikey=None):
         """
             See submit for details. All URLs will be queued with the same
             settings.
 
+            Large lists are split into chunks of chunk_size URLs, sent in
+            parallel by up to max_workers threads. A failing chunk is
+            retried on its own up to retries times.
+
+            :param checkpoint: Path of a checkpoint file. Chunks recorded
+                in it by a previous, interrupted, call with the same URLs
+                are not submitted again.
+
             :return:
 
-                {
-                    [QUEUE_STATUS]  Array of QUEUE_STATUS objects, See submit
-                }
+                [QUEUE_STATUS]  Array of QUEUE_STATUS objects, See submit,
+                                in the order of urls
         """
+        query = self._mass_submit_query(useragent, referer, access_level,
+                                        priority, callback_url)
+        if query.get('error') is not None:
+            return query
+        return list(self._mass_submit(query, urls, chunk_size, max_workers,
+                                      retries, checkpoint, gzip, apikey))
+
+    def iter_mass_submit(self, urls, useragent=None, referer=None,
+                         access_level='public', priority='low',
+                         callback_url=None, chunk_size=100, max_workers=4,
+                         retries=2, checkpoint=None, gzip=False, apikey=None):
+        """
+            Same as mass_submit, but the QUEUE_STATUS objects are yielded
+            as soon as their chunk (and all the chunks before it) have
+            been submitted.
+
+            Raises ValueError if the parameters are invalid, and the error
+            of a chunk still failing after its retries.
+        """
+        query = self._mass_submit_query(useragent, referer, access_level,
+                                        priority, callback_url)
+        if query.get('error') is not None:
+            raise ValueError(query['error'])
+        return self._mass_submit(query, urls, chunk_size, max_workers,
+                                 retries, checkpoint, gzip, apikey)
+
+    def _mass_submit_query(self, useragent, referer, access_level, priority,
+                           callback_url):
         query = {'method': 'mass_submit'}
         if access_level not in self._access_levels:
             query.update({'error':
@@ -258,7 +672,22 @@ class URLQuery(object):
         query['priority'] = priority
         if callback_url is not None:
             query['callback_url'] = callback_url
-        return self.query(query, gzip, apikey)
+        return query
+
+    def _mass_submit(self, query, urls, chunk_size, max_workers, retries,
+                     checkpoint, gzip, apikey):
+        def send(chunk):
+            chunk_query = dict(query)
+            chunk_query['urls'] = chunk
+            return self.send(self._prepare(chunk_query, gzip, apikey))
+
+        decoder = records.Decoder() if self.records else None
+        for statuses in parallel.run_chunks(send, urls, chunk_size,
+                                            max_workers, retries, checkpoint):
+            for status in statuses:
+                if decoder is not None:
+                    status = decoder.queue_status(status)
+                yield status
 
     def queue_status(self, queue_id, gzip=False, apikey=None):
         """
@@ -271,7 +700,7 @@ class URLQuery(object):
         """
         query = {'method': 'queue_status'}
         query['queue_id'] = queue_id
-        return self.query(query, gzip=False, apikey=None)
+        return self.query(query, gzip, apikey)
 
     def report(self, report_id, recent_limit=0, include_details=False,
                include_screenshot=False, include_domain_graph=False,
@@ -328,8 +757,47 @@ class URLQuery(object):
             query['include_screenshot'] = True
         if include_domain_graph:
             query['include_domain_graph'] = True
+        if self.report_store is not None:
+            return self._stored_report(query, gzip, apikey)
         return self.query(query, gzip, apikey)
 
+    def _stored_report(self, query, gzip, apikey):
+        self._prepare(query, gzip, apikey)
+        report = self.report_store.get(query)
+        if report is None:
+            report = self.send(query)
+            if not is_error(report):
+                self.report_store.put(query, report)
+        return self._decode('report', report)
+
+    def report_many(self, report_ids, recent_limit=0, include_details=False,
+                    include_screenshot=False, include_domain_graph=False,
+                    max_workers=10, ordered=False, gzip=False, apikey=None):
+        """
+            Fetches many reports concurrently, see report for the
+            parameters applied to every report.
+
+            :param report_ids: Iterable of report IDs, for example the
+                report_id of every entry of report_list or search.
+
+            :param max_workers: Maximum number of reports fetched at the
+                same time.
+                Default: 10
+
+            :param ordered: Yield the reports in the order of report_ids
+                instead of as soon as they are fetched.
+                Default: False
+
+            :return: Iterator of (report_id, BASICREPORT, error) tuples.
+                error is the exception raised while fetching that report
+                (BASICREPORT is then None), it does not stop the batch.
+        """
+        def fetch(report_id):
+            return self.report(report_id, recent_limit, include_details,
+                               include_screenshot, include_domain_graph,
+                               gzip, apikey)
+        return parallel.imap(fetch, report_ids, max_workers, ordered)
+
     def report_list(self, timestamp=None, limit=50, gzip=False, apikey=None):
         """
         Returns a list of reports created from the given timestamp, if it’s
@@ -342,9 +810,10 @@ class URLQuery(object):
         To get reports which are nonpublic or private a API key is needed
         which has access to these.
 
-        :param timestamp: Unix Epoch timestamp from the starting point to get
+        :param timestamp: Unix epoch timestamp, datetime or date string
+            (UTC unless it has a timezone) from the starting point to get
             reports.
-            Default: If None, setted to datetime.now()
+            Default: If None, now
 
         :param limit: Number of reports in the list
             Default: 50
@@ -357,21 +826,49 @@ class URLQuery(object):
 
         """
         query = {'method': 'report_list'}
-        if timestamp is None:
-            ts = datetime.now()
-            timestamp = time.mktime(ts.utctimetuple())
-        else:
-            try:
-                timestamp = time.mktime(parse(timestamp).utctimetuple())
-            except:
-                query.update({'error':
-                              'Unable to convert time to timestamp: ' +
-                              str(time)})
-        query['timestamp'] = timestamp
+        query['timestamp'] = query_timestamp(query, timestamp)
         query['limit'] = limit
         return self.query(query, gzip, apikey)
 
-    def search(q, search_type='string', result_type='reports',
+    def iter_reports(self, since, until=None, page_size=50, gzip=False,
+                     apikey=None):
+        """
+            Iterates over all the reports created between since and until
+            by walking report_list pages. Reports repeated at the boundary
+            of two pages are only yielded once.
+
+            The next page is fetched in the background while the reports
+            of the current one are being consumed.
+
+            :param since: Start of the range: Unix epoch timestamp,
+                datetime or date string.
+
+            :param until: End of the range, same formats as since.
+                Default: None, no end: the iteration stops at the most
+                recent report.
+
+            :param page_size: Number of reports asked per report_list call.
+                Default: 50
+
+            :return: Iterator of BASICREPORT. An error returned by
+                report_list is raised as an APIError.
+        """
+        cursor = ReportCursor(since, until, page_size)
+        executor = ThreadPoolExecutor(1)
+        try:
+            page = executor.submit(self.report_list, cursor.position,
+                                   page_size, gzip, apikey)
+            while not cursor.done:
+                reports = cursor.advance(page.result())
+                if not cursor.done:
+                    page = executor.submit(self.report_list, cursor.position,
+                                           page_size, gzip, apikey)
+                for report in reports:
+                    yield report
+        finally:
+            executor.shutdown(wait=False)
+
+    def search(self, q, search_type='string', result_type='reports',
                url_matching='url_host', date_from=None, deep=False,
                gzip=False, apikey=None):
         """
@@ -402,8 +899,9 @@ class URLQuery(object):
                 * *url_path*: match against path
 
 
-            :param date_from: Unix epoch timestamp for starting search point.
-                Default: If None, setted to datetime.now()
+            :param date_from: Unix epoch timestamp, datetime or date string
+                (UTC unless it has a timezone) for starting search point.
+                Default: If None, now
 
 
             :param deep: Search all URLs, not just submitted URLs.
@@ -425,16 +923,7 @@ class URLQuery(object):
                           'url_matching can only be in '
                           + ', '.join(self._url_matchings)})
 
-        if date_from is None:
-            ts = datetime.now()
-            timestamp = time.mktime(ts.utctimetuple())
-        else:
-            try:
-                timestamp = time.mktime(parse(date_from).utctimetuple())
-            except:
-                query.update({'error':
-                              'Unable to convert time to timestamp: '
-                              + str(time)})
+        timestamp = query_timestamp(query, date_from)
 
         query['q'] = q
         query['search_type'] = search_type
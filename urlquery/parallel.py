@@ -0,0 +1,196 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import deque
+import hashlib
+import itertools
+import time
+
+from .checkpoint import Checkpoint
+from .errors import APIError, is_error
+from .retry import backoff_delay
+
+
+def _call(func, item):
+    try:
+        return item, func(item), None
+    except Exception as e:
+        return item, None, e
+
+
+def imap(func, items, max_workers=10, ordered=False):
+    """
+        Calls func on every item of items from a pool of max_workers
+        threads and yields (item, result, error) tuples. error is the
+        exception raised by func for that item (result is then None), it
+        never aborts the other items.
+
+        Only a small window of items is pulled from items ahead of the
+        results actually consumed, so items can be a lazy iterator.
+
+        :param max_workers: Maximum number of concurrent calls.
+            (default: 10)
+
+        :param ordered: If True, results are yielded in the order of
+            items, otherwise as soon as they are available.
+            (default: False)
+    """
+    items = iter(items)
+    window = max_workers * 2
+    executor = ThreadPoolExecutor(max_workers)
+    pending = deque() if ordered else set()
+
+    def fill():
+        while len(pending) < window:
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            future = executor.submit(_call, func, item)
+            if ordered:
+                pending.append(future)
+            else:
+                pending.add(future)
+
+    try:
+        fill()
+        while pending:
+            if ordered:
+                yield pending.popleft().result()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    yield future.result()
+            fill()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def chunks(items, size):
+    """
+        Splits the iterable items into lists of at most size elements.
+    """
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _chunk_key(index, chunk):
+    digest = hashlib.sha1('\n'.join(chunk).encode('utf-8')).hexdigest()
+    return '{}:{}'.format(index, digest)
+
+
+class ChunkAttempts(object):
+    """
+        Retries and checkpointing of one chunk of run_chunks, shared with
+        AsyncURLQuery which only differs by how it sends and waits:
+
+            attempts = ChunkAttempts(index, chunk, retries, checkpoint)
+            if attempts.done:
+                return attempts.response
+            while True:
+                try:
+                    response = send(chunk)
+                except Exception as e:
+                    wait = attempts.failed(e)
+                else:
+                    wait = attempts.result(response)
+                if wait is None:
+                    return attempts.response
+                time.sleep(wait)
+
+        :param backoff, max_backoff: See RetryPolicy, the delay before
+            the retries has the same full jitter.
+    """
+    __slots__ = ["key", "retries", "backoff", "max_backoff", "checkpoint",
+                 "attempt", "done", "response"]
+
+    def __init__(self, index, chunk, retries, checkpoint=None, backoff=.5,
+                 max_backoff=30.):
+        self.key = _chunk_key(index, chunk)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.checkpoint = checkpoint
+        self.attempt = 0
+        self.done = checkpoint is not None and self.key in checkpoint
+        self.response = checkpoint.get(self.key) if self.done else None
+
+    def result(self, response):
+        """
+            Called with the response of an attempt. Returns None once the
+            chunk succeeded (response is added to the checkpoint), the
+            seconds to wait before sending it again for an error response,
+            and raises an APIError after the last attempt.
+        """
+        if not is_error(response):
+            if self.checkpoint is not None:
+                self.checkpoint.add(self.key, response)
+            self.done = True
+            self.response = response
+            return None
+        return self.failed(APIError(response))
+
+    def failed(self, error):
+        """
+            Called with the exception raised by an attempt. Returns the
+            seconds to wait before sending the chunk again, raises error
+            after the last attempt.
+        """
+        if self.attempt >= self.retries:
+            raise error
+        wait = backoff_delay(self.attempt, self.backoff, self.max_backoff)
+        self.attempt += 1
+        return wait
+
+
+def run_chunks(send, items, chunk_size, max_workers=4, retries=2,
+               checkpoint=None, backoff=.5):
+    """
+        Splits items into chunks of chunk_size, calls send on each chunk
+        from a pool of max_workers threads and yields the responses in
+        the order of the chunks.
+
+        A chunk raising an exception or returning an error response is
+        retried on its own up to retries times, after a random delay
+        growing with the attempts (see RetryPolicy); if it still fails
+        the error (an APIError for error responses) is raised once all
+        the chunks before it have been yielded.
+
+        :param checkpoint: Optional Checkpoint, or path of one. Chunks it
+            already holds are not sent again, their recorded response is
+            yielded instead, and every successful chunk is added to it. A
+            chunk is identified by its position and its content.
+
+        :param backoff: Base delay in seconds before the retries.
+            (default: 0.5)
+    """
+    if checkpoint is not None and not isinstance(checkpoint, Checkpoint):
+        checkpoint = Checkpoint(checkpoint)
+
+    def call(numbered):
+        index, chunk = numbered
+        attempts = ChunkAttempts(index, chunk, retries, checkpoint, backoff)
+        while not attempts.done:
+            try:
+                response = send(chunk)
+            except Exception as e:
+                wait = attempts.failed(e)
+            else:
+                wait = attempts.result(response)
+            if wait is not None:
+                time.sleep(wait)
+        return attempts.response
+
+    numbered = enumerate(chunks(items, chunk_size))
+    for _, response, error in imap(call, numbered, max_workers, True):
+        if error is not None:
+            raise error
+        yield response
@@ -0,0 +1,175 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+import os
+import threading
+import time
+
+
+class RequestProfile(object):
+    """
+        Where the time of one HTTP request went, passed to the profiler of
+        a URLQuery once the request is over. phases is the list of
+        (name, start, seconds) tuples, start being relative to the start
+        attribute (time.perf_counter()), in this order:
+
+        * serialize: json.dumps of the query (and its compression),
+        * throttle: wait for the rate limiter, if any,
+        * connect: getting a connection from the pool, opening it if
+          needed (not measured by every transport),
+        * wait: sending the request and waiting for the response headers
+          (time to first byte),
+        * transfer: reading the body from the connection,
+        * decompress: gzip decompression of the body,
+        * decode: json.loads of the body.
+
+        transfer and decompress interleave as the body is received, they
+        are reported as their totals, one after the other. wait and
+        connect appear once per request sent, more than once when the
+        rate limiter had a throttled request sent again.
+    """
+    __slots__ = ["method", "start", "wall_start", "phases", "status",
+                 "error", "thread"]
+
+    def __init__(self, method):
+        self.method = method
+        self.start = time.perf_counter()
+        self.wall_start = time.time()
+        self.phases = []
+        self.status = None
+        self.error = None
+        self.thread = threading.current_thread().ident
+
+    def add(self, name, start, seconds=None):
+        """
+            Records the phase name, which started at start
+            (time.perf_counter()) and lasted seconds, by default until
+            now.
+        """
+        if seconds is None:
+            seconds = time.perf_counter() - start
+        self.phases.append((name, start - self.start, seconds))
+
+    def sent(self, start, connect):
+        # Phases of transport.post, which started at start. connect is
+        # Response.connect.
+        now = time.perf_counter()
+        if connect is not None:
+            self.add('connect', start, connect)
+            start += connect
+        self.add('wait', start, now - start)
+
+    def read(self, chunks, decompressor):
+        """
+            Reads and decompresses the chunks of a body, timing both.
+        """
+        start = time.perf_counter()
+        parts = []
+        transfer = decompress = 0.
+        chunks = iter(chunks)
+        while True:
+            t0 = time.perf_counter()
+            chunk = next(chunks, None)
+            t1 = time.perf_counter()
+            transfer += t1 - t0
+            if chunk is None:
+                break
+            parts.append(decompressor.feed(chunk))
+            decompress += time.perf_counter() - t1
+        t1 = time.perf_counter()
+        parts.append(decompressor.flush())
+        decompress += time.perf_counter() - t1
+        self.add('transfer', start, transfer)
+        self.add('decompress', start + transfer, decompress)
+        return b''.join(parts)
+
+    def durations(self):
+        """
+            :return: {phase: total seconds}, plus "total" for the whole
+                request.
+        """
+        result = {}
+        for name, start, seconds in self.phases:
+            result[name] = result.get(name, 0.) + seconds
+        if self.phases:
+            name, start, seconds = self.phases[-1]
+            result['total'] = start + seconds
+        return result
+
+    def __repr__(self):
+        return 'RequestProfile({!r}, {})'.format(
+            self.method, ', '.join('{}={:.6f}'.format(name, seconds)
+                                   for name, seconds in
+                                   sorted(self.durations().items())))
+
+
+class TraceFile(object):
+    """
+        Profiler writing the RequestProfiles to path in the Trace Event
+        Format, which chrome://tracing, Perfetto (ui.perfetto.dev) and
+        speedscope open: one event per request, named after its method,
+        with one nested event per phase, on the row of the thread which
+        sent it.
+
+            with TraceFile('urlquery.trace.json') as trace:
+                uq = URLQuery(profiler=trace)
+                ...
+
+        The events are written as the requests complete; a file which was
+        not closed is still readable by the viewers.
+    """
+    __slots__ = ["path", "_file", "_lock", "_pid", "_first"]
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'w')
+        self._file.write('[')
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._first = True
+
+    def _event(self, name, start, seconds, tid, args=None):
+        event = {'name': name, 'ph': 'X', 'pid': self._pid, 'tid': tid,
+                 'ts': round(start * 1e6, 3), 'dur': round(seconds * 1e6, 3)}
+        if args:
+            event['args'] = args
+        return json.dumps(event)
+
+    def __call__(self, profile):
+        # Timestamps are in microseconds since the epoch, so that the
+        # traces of several processes line up.
+        origin = profile.wall_start
+        total = profile.durations().get('total', 0.)
+        args = {'status': profile.status}
+        if profile.error is not None:
+            args['error'] = profile.error
+        events = [self._event(profile.method or 'request', origin, total,
+                              profile.thread, args)]
+        for name, start, seconds in profile.phases:
+            events.append(self._event(name, origin + start, seconds,
+                                      profile.thread))
+        with self._lock:
+            if self._file.closed:
+                return
+            for event in events:
+                self._file.write('\n' if self._first else ',\n')
+                self._file.write(event)
+                self._first = False
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.write('\n]\n')
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,286 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from email.utils import parsedate_tz, mktime_tz
+import hashlib
+import os
+import threading
+import time
+
+
+# HTTP statuses meaning the request was rejected because of its rate, and
+# can be sent again later.
+throttled_statuses = (429, 503)
+
+
+def retry_after(value, now=None):
+    """
+        Number of seconds to wait according to a Retry-After header (a
+        number of seconds or an HTTP date), None if it is missing or
+        invalid.
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    if now is None:
+        now = time.time()
+    return max(0., mktime_tz(parsed) - now)
+
+
+class TokenBucket(object):
+    """
+        Token bucket holding up to burst tokens, refilled at rate tokens
+        per second (None for no limit).
+
+        Tokens are reserved rather than waited for: reserve() takes them
+        right away, possibly going into debt, and returns how long the
+        caller must wait before using them. Callers are therefore served
+        in the order they asked, and the waiting can be done by a thread
+        as well as by a coroutine.
+
+        The configured rate is the limit; the current rate moves below it
+        when the service throttles the client (see throttled) and goes
+        back up as calls succeed (see succeeded).
+    """
+    __slots__ = ["limit", "burst", "rate", "tokens", "stamp", "changed",
+                 "decreased"]
+
+    def __init__(self, rate, burst=None):
+        self.limit = rate
+        self.burst = burst if burst is not None else max(1., rate or 1.)
+        self.rate = rate
+        self.tokens = self.burst
+        # Time from which tokens accrue, in the future during a pause.
+        self.stamp = time.time()
+        self.changed = self.decreased = 0.
+
+    def reserve(self, now, tokens=1):
+        """
+            Takes tokens and returns the number of seconds to wait before
+            they can be used.
+        """
+        wait = max(0., self.stamp - now)
+        if self.rate is None:
+            return wait
+        if now > self.stamp:
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+        self.tokens -= tokens
+        if self.tokens < 0:
+            wait += -self.tokens / self.rate
+        return wait
+
+    def pause(self, now, seconds):
+        """
+            Gives no token for the next seconds, then restarts empty.
+        """
+        self.tokens = min(self.tokens, 0.)
+        self.stamp = max(self.stamp, now + seconds)
+
+    def throttled(self, now, decrease, min_rate, delay):
+        """
+            Multiplicative decrease of the rate, at most once per delay
+            seconds so that the calls already in flight when the limit was
+            hit do not bring the rate down several times.
+        """
+        if self.rate is None or now - self.decreased < delay:
+            return
+        self.rate = max(min_rate, self.rate * decrease)
+        self.changed = self.decreased = now
+
+    def succeeded(self, now, increase):
+        """
+            Additive increase of the rate, by increase per second since
+            the last change, up to the configured limit.
+        """
+        if self.rate is None or self.rate >= self.limit:
+            return
+        self.rate = min(self.limit,
+                        self.rate + increase * max(0., now - self.changed))
+        self.changed = now
+
+    def state(self):
+        return [self.rate, self.tokens, self.stamp, self.changed,
+                self.decreased]
+
+    def restore(self, state):
+        (self.rate, self.tokens, self.stamp, self.changed,
+         self.decreased) = state
+
+
+class RateLimiter(object):
+    """
+        Client side rate limiter, see URLQuery(rate_limiter=...).
+
+        Every call takes a token from the global bucket and from the
+        buckets of its method and of its API key, when they have a rate.
+        When the service answers with 429 (or 503) the call is sent again
+        after the Retry-After delay, the buckets involved stop giving
+        tokens until then and their rate is multiplied by decrease; it
+        then grows back by increase (calls per second, per second) while
+        calls succeed, up to the configured rates (AIMD). Without a
+        configured rate a bucket never limits the calls but still honours
+        Retry-After.
+
+            limiter = RateLimiter(rate=20, methods={'mass_submit': 1},
+                                  key_rate=10)
+            uq = URLQuery(apikey=key, rate_limiter=limiter)
+
+        One RateLimiter can be shared by any number of clients and
+        threads. With path, the state of the buckets is kept in that file
+        (locked with fcntl for every call) and shared by all the processes
+        of the host using it.
+
+        :param rate: Calls per second for all the calls. (default: None)
+
+        :param burst: Number of calls that can be made at once after an
+            idle period. (default: one second worth of calls)
+
+        :param methods: Dict of method name to calls per second.
+
+        :param keys: Dict of API key to calls per second.
+
+        :param key_rate: Calls per second for the API keys not in keys.
+            (default: None)
+
+        :param retries: Number of times a throttled call is sent again
+            before its response is returned as is. (default: 5)
+    """
+    __slots__ = ["rate", "burst", "methods", "keys", "key_rate", "path",
+                 "retries", "min_rate", "increase", "decrease",
+                 "_buckets", "_lock"]
+
+    def __init__(self, rate=None, burst=None, methods=None, keys=None,
+                 key_rate=None, path=None, retries=5, min_rate=.1,
+                 increase=.5, decrease=.5):
+        if path is not None and fcntl is None:
+            raise ValueError('Sharing a RateLimiter between processes '
+                             'requires fcntl')
+        self.rate = rate
+        self.burst = burst
+        self.methods = dict(methods or {})
+        self.keys = dict(keys or {})
+        self.key_rate = key_rate
+        self.path = path
+        self.retries = retries
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, name, rate):
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            bucket = self._buckets[name] = TokenBucket(rate, self.burst)
+        return bucket
+
+    def _names(self, query):
+        # (kind, name, rate) of the buckets of query. API keys are only
+        # known by their hash, they end up in the shared file and in
+        # rates().
+        method = query.get('method')
+        key = query.get('key') or ''
+        scope = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        return [('*', '*', self.rate),
+                ('method', method, self.methods.get(method)),
+                ('key', scope, self.keys.get(key, self.key_rate))]
+
+    def _update(self, query, change):
+        # Runs change(now, buckets) on the buckets of query with the lock
+        # held, and for a shared limiter on the state stored in path.
+        with self._lock:
+            if self.path is None:
+                buckets = [self._bucket(name, name[2])
+                           for name in self._names(query)]
+                return change(time.time(), buckets)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                with os.fdopen(os.dup(fd), 'r+') as f:
+                    try:
+                        shared = json.loads(f.read() or '{}')
+                    except ValueError:
+                        shared = {}
+                    names = self._names(query)
+                    buckets = []
+                    for kind, name, rate in names:
+                        bucket = self._bucket((kind, name, rate), rate)
+                        state = shared.get('{}:{}'.format(kind, name))
+                        if state is not None:
+                            bucket.restore(state)
+                        buckets.append(bucket)
+                    result = change(time.time(), buckets)
+                    for (kind, name, _), bucket in zip(names, buckets):
+                        shared['{}:{}'.format(kind, name)] = bucket.state()
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(shared))
+            finally:
+                os.close(fd)
+            return result
+
+    def reserve(self, query):
+        """
+            Takes the tokens for the prepared query and returns the number
+            of seconds to wait before sending it.
+        """
+        return self._update(query, lambda now, buckets: max(
+            [bucket.reserve(now) for bucket in buckets]))
+
+    def acquire(self, query):
+        """
+            Blocks until the prepared query can be sent.
+        """
+        wait = self.reserve(query)
+        if wait > 0:
+            time.sleep(wait)
+
+    def feedback(self, query, status, retry_after_header=None):
+        """
+            Adjusts the rates to the HTTP status of the response to query.
+
+            :return: True if the query was throttled and should be sent
+                again.
+        """
+        throttled = status in throttled_statuses and \
+            (status == 429 or retry_after_header is not None)
+
+        def change(now, buckets):
+            if not throttled:
+                for bucket in buckets:
+                    bucket.succeeded(now, self.increase)
+                return
+            delay = retry_after(retry_after_header, now)
+            if delay is None:
+                delay = 1.
+            for bucket in buckets:
+                bucket.throttled(now, self.decrease, self.min_rate, delay)
+                bucket.pause(now, delay)
+        self._update(query, change)
+        return throttled
+
+    def rates(self):
+        """
+            Current rate of every bucket used so far, as a dict of
+            "kind:name" to calls per second (None when not limited).
+        """
+        with self._lock:
+            return dict(('{}:{}'.format(kind, name), bucket.rate)
+                        for (kind, name, _), bucket in self._buckets.items())
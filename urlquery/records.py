@@ -0,0 +1,358 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import binascii
+from collections import OrderedDict
+import mmap
+import sys
+
+from .errors import is_error
+
+try:
+    intern = sys.intern
+except AttributeError:
+    pass
+
+
+class Record(object):
+    """
+        Base of the compact objects the API responses can be decoded to,
+        see URLQuery(records=True). Every object of the README has its own
+        class with one attribute per field (None when the field was null
+        or not in the response); fields this module does not know about
+        are kept in extra. The slots of the absent fields are left unset,
+        so that to_dict gives back the explicit nulls only.
+
+        Records are lighter than the dicts they replace: they have no
+        per-instance __dict__, repeated strings (country codes, AS names,
+        TLDs, ...) are interned, and identical IP objects within a
+        response are one shared instance. Records must therefore be
+        treated as read-only.
+    """
+    __slots__ = ["extra"]
+    # (attribute, key in the JSON object) pairs.
+    _fields = ()
+    _attributes = frozenset(["extra"])
+
+    def __getattr__(self, name):
+        # Only called for the unset slots, the absent fields.
+        if name in self._attributes:
+            return None
+        raise AttributeError(name)
+
+    def __getstate__(self):
+        # Only the set slots, for copy and pickle to keep the absent
+        # fields absent.
+        state = {}
+        for name in self._attributes:
+            try:
+                state[name] = object.__getattribute__(self, name)
+            except AttributeError:
+                pass
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def to_dict(self):
+        """
+            Converts the record, and the records it holds, back to the
+            JSON object it was decoded from.
+        """
+        d = {}
+        for attribute, key in self._fields:
+            try:
+                value = object.__getattribute__(self, attribute)
+            except AttributeError:
+                continue
+            if isinstance(value, Record):
+                value = value.to_dict()
+            elif isinstance(value, list):
+                value = [v.to_dict() if isinstance(v, Record) else v
+                         for v in value]
+            d[key] = value
+        if self.extra:
+            d.update(self.extra)
+        return d
+
+    def __eq__(self, other):
+        return type(self) is type(other) and \
+            self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, self.to_dict())
+
+
+class IP(Record):
+    __slots__ = ["addr", "cc", "country", "asn", "as_"]
+    _fields = (("addr", "addr"), ("cc", "cc"), ("country", "country"),
+               ("asn", "asn"), ("as_", "as"))
+
+
+class URL(Record):
+    __slots__ = ["addr", "fqdn", "domain", "tld", "ip"]
+    _fields = (("addr", "addr"), ("fqdn", "fqdn"), ("domain", "domain"),
+               ("tld", "tld"), ("ip", "ip"))
+
+
+class Settings(Record):
+    __slots__ = ["useragent", "referer", "pool", "access_level"]
+    _fields = (("useragent", "useragent"), ("referer", "referer"),
+               ("pool", "pool"), ("access_level", "access_level"))
+
+
+class BinBlob(Record):
+    """
+        Screenshot or domain graph of a report. The payload stays base64
+        encoded until it is actually used, and is then decoded in chunks
+        of chunk_size base64 characters straight to where it is needed:
+        a bytes object (data), a caller provided writable buffer
+        (decode_into), a file (save) or a memory-mapped file (to_mmap).
+        Only one chunk is ever held in memory on top of the destination.
+    """
+    __slots__ = ["base64_data", "media_type"]
+    _fields = (("base64_data", "base64_data"), ("media_type", "media_type"))
+
+    chunk_size = 1 << 16
+
+    def _encoded(self):
+        encoded = self.base64_data or ''
+        if '\n' in encoded or '\r' in encoded:
+            # Line breaks would shift the chunks off 4 characters
+            # boundaries.
+            encoded = ''.join(encoded.split())
+            self.base64_data = encoded
+        return encoded
+
+    def _chunks(self):
+        encoded = self._encoded()
+        for start in range(0, len(encoded), self.chunk_size):
+            yield binascii.a2b_base64(
+                encoded[start:start + self.chunk_size])
+
+    @property
+    def size(self):
+        """
+            Size of the decoded payload, computed without decoding it.
+        """
+        encoded = self._encoded()
+        padding = len(encoded) - len(encoded.rstrip('='))
+        return len(encoded) // 4 * 3 - padding
+
+    @property
+    def data(self):
+        """
+            Decoded payload, as a new bytes object on every access.
+        """
+        # In one call: the decoded payload is the only allocation.
+        return binascii.a2b_base64(self._encoded())
+
+    def decode_into(self, buffer, offset=0):
+        """
+            Decodes the payload into the writable buffer (bytearray,
+            mmap, memoryview, ...) from offset, which can be reused for
+            many blobs.
+
+            :return: Number of bytes written.
+        """
+        view = memoryview(buffer)
+        position = offset
+        for chunk in self._chunks():
+            view[position:position + len(chunk)] = chunk
+            position += len(chunk)
+        return position - offset
+
+    def save(self, target):
+        """
+            Writes the decoded payload to target, a path or a binary file
+            object.
+
+            :return: Number of bytes written.
+        """
+        if not hasattr(target, 'write'):
+            with open(target, 'wb') as f:
+                return self.save(f)
+        written = 0
+        for chunk in self._chunks():
+            target.write(chunk)
+            written += len(chunk)
+        return written
+
+    def to_mmap(self, path):
+        """
+            Decodes the payload into the file path, memory-mapped, and
+            returns the mmap object.
+        """
+        size = self.size
+        with open(path, 'w+b') as f:
+            f.truncate(size)
+            if not size:
+                return None
+            mapped = mmap.mmap(f.fileno(), size)
+        self.decode_into(mapped)
+        return mapped
+
+
+class QueueStatus(Record):
+    __slots__ = ["status", "queue_id", "report_id", "priority", "url",
+                 "settings"]
+    _fields = (("status", "status"), ("queue_id", "queue_id"),
+               ("report_id", "report_id"), ("priority", "priority"),
+               ("url", "url"), ("settings", "settings"))
+
+
+class BasicReport(Record):
+    __slots__ = ["report_id", "date", "url", "settings",
+                 "urlquery_alert_count", "ids_alert_count",
+                 "blacklist_alert_count", "screenshot", "domain_graph"]
+    _fields = (("report_id", "report_id"), ("date", "date"), ("url", "url"),
+               ("settings", "settings"),
+               ("urlquery_alert_count", "urlquery_alert_count"),
+               ("ids_alert_count", "ids_alert_count"),
+               ("blacklist_alert_count", "blacklist_alert_count"),
+               ("screenshot", "screenshot"),
+               ("domain_graph", "domain_graph"))
+
+
+class URLFeed(Record):
+    __slots__ = ["start_time", "end_time", "feed"]
+    _fields = (("start_time", "start_time"), ("end_time", "end_time"),
+               ("feed", "feed"))
+
+
+for _cls in (IP, URL, Settings, BinBlob, QueueStatus, BasicReport, URLFeed):
+    _cls._keys = dict((key, attribute) for attribute, key in _cls._fields)
+    _cls._attributes = frozenset(_cls._keys.values()) | Record._attributes
+
+
+def field(obj, name, default=None):
+    """
+        Value of the field name of obj, whether obj is a record or the
+        dict it was decoded from.
+    """
+    if isinstance(obj, Record):
+        value = getattr(obj, name, None)
+        return default if value is None else value
+    return obj.get(name, default)
+
+
+def _intern(value):
+    if type(value) is str:
+        return intern(value)
+    return value
+
+
+class Decoder(object):
+    """
+        Decodes JSON objects into records. Identical IP objects decoded
+        by the same Decoder are shared, so one Decoder should be used for
+        a whole response (or a whole stream of URL objects).
+
+        :param max_ips: Number of distinct IP objects remembered for
+            sharing, the least recently seen are forgotten first, so that
+            a long stream does not grow the table forever.
+            (default: 65536)
+    """
+    __slots__ = ["max_ips", "_ips"]
+
+    # Fields with few distinct values, interned.
+    _interned = frozenset(["cc", "country", "as", "tld", "useragent",
+                           "pool", "access_level", "status", "priority",
+                           "media_type"])
+
+    def __init__(self, max_ips=65536):
+        self.max_ips = max_ips
+        self._ips = OrderedDict()
+
+    def _fill(self, record, d, nested=None):
+        extra = None
+        keys = record._keys
+        for key, value in d.items():
+            attribute = keys.get(key)
+            if attribute is None:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+                continue
+            if nested is not None and key in nested and value is not None:
+                value = nested[key](value)
+            elif key in self._interned:
+                value = _intern(value)
+            setattr(record, attribute, value)
+        record.extra = extra
+        return record
+
+    def ip(self, d):
+        ip = self._fill(IP(), d)
+        if ip.extra is None:
+            # The keys are part of it so that an absent field and a null
+            # one are not merged.
+            key = tuple(d.items())
+            ips = self._ips
+            shared = ips.get(key)
+            if shared is not None:
+                ips.move_to_end(key)
+                return shared
+            ips[key] = ip
+            if len(ips) > self.max_ips:
+                ips.popitem(last=False)
+        return ip
+
+    def url(self, d):
+        return self._fill(URL(), d, {'ip': self.ip})
+
+    def settings(self, d):
+        return self._fill(Settings(), d)
+
+    def binblob(self, d):
+        return self._fill(BinBlob(), d)
+
+    def queue_status(self, d):
+        return self._fill(QueueStatus(), d, {'url': self.url,
+                                             'settings': self.settings})
+
+    def basic_report(self, d):
+        return self._fill(BasicReport(), d, {'url': self.url,
+                                             'settings': self.settings,
+                                             'screenshot': self.binblob,
+                                             'domain_graph': self.binblob})
+
+    def urlfeed(self, d):
+        return self._fill(URLFeed(), d, {
+            'feed': lambda urls: [self.url(u) for u in urls]})
+
+    def decode(self, method, response):
+        """
+            Decodes the response of an API method. Error responses, and
+            the responses of methods without a record type (search,
+            reputation, user_agent_list), are returned unchanged.
+        """
+        if is_error(response):
+            return response
+        if method == 'urlfeed':
+            return self.urlfeed(response)
+        if method in ('submit', 'queue_status'):
+            return self.queue_status(response)
+        if method == 'mass_submit':
+            return [self.queue_status(status) for status in response]
+        if method == 'report':
+            return self.basic_report(response)
+        if method == 'report_list':
+            decoded = dict(response)
+            decoded['reports'] = [self.basic_report(report)
+                                  for report in response.get('reports', [])]
+            return decoded
+        return response
+
+
+def decode(method, response):
+    """
+        Decodes the response of an API method with a new Decoder.
+    """
+    return Decoder().decode(method, response)
@@ -0,0 +1,205 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+import random
+import threading
+import time
+import zlib
+
+from .errors import CircuitOpenError, ServerError
+
+
+# Methods that can be sent again without side effects.
+idempotent_methods = frozenset(['report', 'report_list', 'search',
+                                'reputation', 'queue_status', 'urlfeed',
+                                'user_agent_list'])
+
+
+def backoff_delay(attempt, backoff, max_backoff):
+    """
+        Seconds to wait before retry attempt (from 0): drawn uniformly
+        between 0 and min(max_backoff, backoff * 2 ** attempt).
+    """
+    return random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+
+
+class CircuitBreaker(object):
+    """
+        Stops sending calls once failures calls in a row have failed, so
+        that an unavailable API makes the callers fail right away instead
+        of piling up blocked threads. After reset_timeout seconds one
+        call is let through: if it succeeds the calls go on normally,
+        otherwise the breaker stays open for another reset_timeout.
+
+        :param failures: Number of consecutive failures opening the
+            breaker. (default: 5)
+
+        :param reset_timeout: Seconds before a call is tried again.
+            (default: 30)
+    """
+    __slots__ = ["failures", "reset_timeout", "_failed", "_opened",
+                 "_trial", "_lock"]
+
+    def __init__(self, failures=5, reset_timeout=30.):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self._failed = 0
+        self._opened = None
+        # Start time of the call let through while half-open.
+        self._trial = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """
+            'closed', 'open' or 'half-open'.
+        """
+        with self._lock:
+            if self._opened is None:
+                return 'closed'
+            if time.time() - self._opened >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def before(self):
+        """
+            Raises a CircuitOpenError if a call cannot be sent now.
+        """
+        with self._lock:
+            if self._opened is None:
+                return
+            now = time.time()
+            if now - self._opened >= self.reset_timeout and \
+                    (self._trial is None or
+                     now - self._trial >= self.reset_timeout):
+                self._trial = now
+                return
+        raise CircuitOpenError('Circuit open after {} failures'.format(
+            self._failed))
+
+    def success(self):
+        with self._lock:
+            self._failed = 0
+            self._opened = None
+            self._trial = None
+
+    def failure(self):
+        with self._lock:
+            self._failed += 1
+            if self._trial is not None or self._failed >= self.failures:
+                self._opened = time.time()
+                self._trial = None
+
+
+class RetryPolicy(object):
+    """
+        Retries of the calls failing with a transient error: a connection
+        error or timeout, an HTTP 5xx status (ServerError), or a truncated
+        response body (invalid JSON or gzip data). Only the idempotent
+        methods are sent again; the others fail on the first error.
+
+        The delay before retry n (from 0) is drawn uniformly between 0 and
+        min(max_backoff, backoff * 2 ** n) ("full jitter"), so clients
+        failing together do not retry together.
+
+            uq = URLQuery(retry_policy=RetryPolicy(
+                retries=4, breaker=CircuitBreaker()))
+
+        :param retries: Maximum number of retries of a call. (default: 3)
+
+        :param backoff: Base delay in seconds. (default: 0.5)
+
+        :param max_backoff: Maximum delay in seconds. (default: 30)
+
+        :param methods: Methods that can be retried. (default:
+            idempotent_methods)
+
+        :param exceptions: Exception classes considered transient.
+            (default: EnvironmentError, ServerError, json.JSONDecodeError
+            and zlib.error)
+
+        :param breaker: Optional CircuitBreaker all the calls (retried or
+            not) go through.
+    """
+    __slots__ = ["retries", "backoff", "max_backoff", "methods",
+                 "exceptions", "breaker"]
+
+    def __init__(self, retries=3, backoff=.5, max_backoff=30.,
+                 methods=idempotent_methods,
+                 exceptions=(EnvironmentError, ServerError,
+                             json.JSONDecodeError, zlib.error),
+                 breaker=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.methods = frozenset(methods)
+        self.exceptions = tuple(exceptions)
+        self.breaker = breaker
+
+    def before(self, error=None):
+        """
+            Called before every attempt, raises a CircuitOpenError while
+            the breaker is open. error is the failure of the previous
+            attempt of the call, if any: it is raised instead when the
+            failures of the call itself opened the breaker, so the caller
+            gets the actual cause.
+        """
+        if self.breaker is None:
+            return
+        try:
+            self.breaker.before()
+            return
+        except CircuitOpenError:
+            if error is None:
+                raise
+        raise error
+
+    def succeeded(self):
+        if self.breaker is not None:
+            self.breaker.success()
+
+    def failed(self, method, error, attempt, exceptions=()):
+        """
+            Called when attempt (from 0) of a call to method raised error.
+
+            :param exceptions: Transient exception classes on top of the
+                policy ones (those of the HTTP library).
+
+            :return: Number of seconds to wait before the next attempt, or
+                None if error must be raised.
+        """
+        if not isinstance(error, self.exceptions + tuple(exceptions)):
+            return None
+        if self.breaker is not None:
+            self.breaker.failure()
+        if method not in self.methods or attempt >= self.retries:
+            return None
+        return backoff_delay(attempt, self.backoff, self.max_backoff)
+
+    def call(self, method, func, *args, exceptions=()):
+        """
+            Calls func(*args) with the retries allowed for method.
+
+            :param exceptions: See failed.
+        """
+        attempt = 0
+        error = None
+        while True:
+            self.before(error)
+            try:
+                result = func(*args)
+            except Exception as e:
+                wait = self.failed(method, e, attempt, exceptions)
+                if wait is None:
+                    raise
+                error = e
+                time.sleep(wait)
+                attempt += 1
+            else:
+                self.succeeded()
+                return result
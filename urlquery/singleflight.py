@@ -0,0 +1,99 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+from concurrent.futures import Future
+import threading
+
+from .retry import idempotent_methods
+
+
+class SingleFlight(object):
+    """
+        Coalesces identical concurrent calls: while a call is in flight,
+        the same call (same method, parameters and API key) made by other
+        threads does not send a request of its own but waits for the
+        first one and gets its response (or its exception).
+
+            uq = URLQuery(apikey=key, single_flight=SingleFlight())
+
+        Only the read-only methods are coalesced, never submit or
+        mass_submit. The shared responses must not be modified.
+
+        A SingleFlight can be shared by several URLQuery instances, or by
+        several AsyncURLQuery instances running on the same loop, but not
+        by both kinds at once.
+
+        :param methods: Methods to coalesce. (default:
+            retry.idempotent_methods)
+    """
+    __slots__ = ["methods", "calls", "coalesced", "_inflight", "_lock"]
+
+    def __init__(self, methods=idempotent_methods):
+        self.methods = frozenset(methods)
+        self.calls = 0
+        self.coalesced = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _key(self, query):
+        if query.get('method') not in self.methods:
+            return None
+        params = dict(query)
+        params.pop('gzip', None)
+        return json.dumps(params, sort_keys=True)
+
+    def _join(self, query, new_future):
+        # Returns (key, future, leader): the caller sends the request if
+        # it is the leader, and waits for future otherwise. key is None
+        # for the calls not coalesced.
+        key = self._key(query)
+        if key is None:
+            return None, None, True
+        with self._lock:
+            self.calls += 1
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return key, future, False
+            future = self._inflight[key] = new_future()
+            return key, future, True
+
+    def _leave(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def do(self, query, func, on_join=None):
+        """
+            Returns func(query), unless the same query is already in
+            flight, in which case its outcome is returned (and on_join,
+            if given, is called with query).
+        """
+        key, future, leader = self._join(query, Future)
+        if key is None:
+            return func(query)
+        if not leader:
+            if on_join is not None:
+                on_join(query)
+            return future.result()
+        try:
+            response = func(query)
+        except BaseException as e:
+            self._leave(key)
+            future.set_exception(e)
+            raise
+        self._leave(key)
+        future.set_result(response)
+        return response
+
+    def stats(self):
+        """
+            :return: {"calls": int, "coalesced": int, "in_flight": int}
+        """
+        with self._lock:
+            return {'calls': self.calls, 'coalesced': self.coalesced,
+                    'in_flight': len(self._inflight)}
@@ -0,0 +1,157 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+
+
+DETAILS = 1
+SCREENSHOT = 2
+DOMAIN_GRAPH = 4
+
+_includes = [('include_details', DETAILS),
+             ('include_screenshot', SCREENSHOT),
+             ('include_domain_graph', DOMAIN_GRAPH)]
+_blobs = [('screenshot', SCREENSHOT), ('domain_graph', DOMAIN_GRAPH)]
+
+_schema = """
+CREATE TABLE IF NOT EXISTS reports (
+    report_id    TEXT    NOT NULL,
+    scope        TEXT    NOT NULL,
+    recent_limit INTEGER NOT NULL,
+    flags        INTEGER NOT NULL,
+    stored       REAL    NOT NULL,
+    data         BLOB    NOT NULL,
+    PRIMARY KEY (report_id, scope, recent_limit, flags)
+) WITHOUT ROWID
+"""
+
+
+def flags(query):
+    """
+        Bitmask of the include_* parameters of a report query.
+    """
+    value = 0
+    for name, flag in _includes:
+        if query.get(name):
+            value |= flag
+    return value
+
+
+class ReportStore(object):
+    """
+        Persistent store of reports, in a SQLite database, that
+        URLQuery.report reads and writes through:
+
+            uq = URLQuery(apikey=key, report_store=ReportStore(path))
+
+        Reports are stored compressed, keyed by report_id, the include_*
+        flags and recent_limit they were fetched with and the API key (as
+        a hash, so reports fetched with different permissions are kept
+        apart). A request is answered by any stored copy with at least
+        the requested details; the screenshot and domain graph are
+        dropped from the answer if they were not asked for.
+
+        The database is in WAL mode, so any number of processes can read
+        it while one of them writes.
+
+        :param path: Path of the SQLite database, created if missing.
+
+        :param timeout: Seconds to wait for a lock held by another
+            process. (default: 30)
+    """
+    __slots__ = ["path", "timeout", "_local"]
+
+    def __init__(self, path, timeout=30.):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        with self._connection() as db:
+            db.execute(_schema)
+
+    def _connection(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.timeout)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def close(self):
+        """
+            Closes the connection of the calling thread.
+        """
+        db = getattr(self._local, 'db', None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+    @staticmethod
+    def _scope(apikey):
+        return hashlib.sha1((apikey or '').encode('utf-8')).hexdigest()
+
+    def get(self, query):
+        """
+            Returns the stored report answering the report query (as
+            prepared by URLQuery, with its key), None if there is none.
+        """
+        wanted = flags(query)
+        row = self._connection().execute(
+            'SELECT data FROM reports WHERE report_id = ? AND scope = ? '
+            'AND recent_limit = ? AND flags & ? = ? ORDER BY flags LIMIT 1',
+            (str(query['report_id']), self._scope(query.get('key')),
+             query.get('recent_limit') or 0, wanted, wanted)).fetchone()
+        if row is None:
+            return None
+        report = json.loads(zlib.decompress(row[0]).decode('utf-8'))
+        for name, flag in _blobs:
+            if not wanted & flag:
+                report.pop(name, None)
+        return report
+
+    def put(self, query, report):
+        """
+            Stores the report returned by the report query.
+        """
+        data = zlib.compress(json.dumps(report).encode('utf-8'))
+        with self._connection() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?, ?, ?)',
+                (str(query['report_id']), self._scope(query.get('key')),
+                 query.get('recent_limit') or 0, flags(query), time.time(),
+                 sqlite3.Binary(data)))
+
+    def __len__(self):
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM reports').fetchone()[0]
+
+    def compact(self):
+        """
+            Deletes the copies made redundant by a copy of the same report
+            with more details, then rebuilds the database file to give the
+            free space back.
+
+            :return: Number of copies deleted.
+        """
+        db = self._connection()
+        with db:
+            deleted = db.execute(
+                'DELETE FROM reports WHERE EXISTS ('
+                'SELECT 1 FROM reports AS other '
+                'WHERE other.report_id = reports.report_id '
+                'AND other.scope = reports.scope '
+                'AND other.recent_limit = reports.recent_limit '
+                'AND other.flags != reports.flags '
+                'AND other.flags & reports.flags = reports.flags)').rowcount
+        db.execute('VACUUM')
+        db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return deleted
@@ -0,0 +1,217 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+import codecs
+import re
+
+from .errors import APIError, is_error
+
+
+_whitespace = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+
+class ArrayParser(object):
+    """
+        Incremental parser of a JSON object holding one big array, like
+        the URLFEED response and its "feed" array.
+
+        The raw response body is pushed with feed(), which returns the
+        elements of the array completed so far. The other members of the
+        object are decoded as they come and collected in metadata. Only
+        the part of the body not parsed yet is kept in memory.
+
+        :param key: Name of the member holding the array to stream.
+    """
+    __slots__ = ["key", "metadata", "_text", "_pos", "_state", "_member",
+                 "_utf8"]
+
+    def __init__(self, key):
+        self.key = key
+        self.metadata = {}
+        self._text = ''
+        self._pos = 0
+        self._state = 'start'
+        self._member = None
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+
+    def _skip(self):
+        self._pos = _whitespace.match(self._text, self._pos).end()
+        if self._pos < len(self._text):
+            return self._text[self._pos]
+        return None
+
+    def _decode(self, final):
+        # A value ending exactly at the end of the buffer might be cut
+        # (a number for instance), it is only trusted at the end of the
+        # body.
+        try:
+            value, end = _decoder.raw_decode(self._text, self._pos)
+        except ValueError:
+            if final:
+                raise
+            return False, None
+        if end == len(self._text) and not final:
+            return False, None
+        self._pos = end
+        return True, value
+
+    def feed(self, data, final=False):
+        """
+            Parses the next bytes of the body.
+
+            :param final: True for the last call, data may then be empty.
+
+            :return: List of the array elements completed by data.
+        """
+        text = self._utf8.decode(data, final)
+        if self._pos:
+            self._text = self._text[self._pos:] + text
+            self._pos = 0
+        else:
+            self._text += text
+
+        items = []
+        while True:
+            c = self._skip()
+            if c is None:
+                break
+            if self._state == 'start':
+                if c != '{':
+                    raise ValueError('Expected a JSON object')
+                self._pos += 1
+                self._state = 'member'
+            elif self._state == 'member':
+                if c == ',':
+                    self._pos += 1
+                elif c == '}':
+                    self._pos += 1
+                    self._state = 'end'
+                else:
+                    done, self._member = self._decode(final)
+                    if not done:
+                        break
+                    self._state = 'colon'
+            elif self._state == 'colon':
+                if c != ':':
+                    raise ValueError('Expected ":"')
+                self._pos += 1
+                self._state = 'value'
+            elif self._state == 'value':
+                if self._member == self.key and c == '[':
+                    self._pos += 1
+                    self._state = 'array'
+                    continue
+                done, value = self._decode(final)
+                if not done:
+                    break
+                self.metadata[self._member] = value
+                self._state = 'member'
+            elif self._state == 'array':
+                if c == ',':
+                    self._pos += 1
+                elif c == ']':
+                    self._pos += 1
+                    self._state = 'member'
+                else:
+                    done, value = self._decode(final)
+                    if not done:
+                        break
+                    items.append(value)
+            else:
+                raise ValueError('Extra data after the JSON object')
+        if final and self._state != 'end':
+            raise ValueError('Truncated JSON object')
+        return items
+
+    def check(self):
+        """
+            Raises an APIError if the members parsed so far make up an
+            error response.
+        """
+        if is_error(self.metadata):
+            raise APIError(self.metadata)
+
+
+class FeedStream(object):
+    """
+        Iterator over the elements of a streamed array (the URL objects
+        of a urlfeed), see URLQuery.iter_urlfeed.
+
+        The other members of the response are available in metadata as
+        soon as they have been received; start_time and end_time are
+        shortcuts for the URLFEED ones. Once the iteration is over an
+        APIError is raised if the response was an error.
+
+        If hook is given, the elements are passed through it before being
+        yielded.
+    """
+    __slots__ = ["_parser", "_chunks", "_items", "_close", "_hook"]
+
+    def __init__(self, chunks, key='feed', close=None, hook=None):
+        self._parser = ArrayParser(key)
+        self._chunks = iter(chunks)
+        self._items = iter(())
+        self._close = close
+        self._hook = hook
+
+    @property
+    def metadata(self):
+        return self._parser.metadata
+
+    @property
+    def start_time(self):
+        return self._parser.metadata.get('start_time')
+
+    @property
+    def end_time(self):
+        return self._parser.metadata.get('end_time')
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while True:
+            for item in self._items:
+                if self._hook is not None:
+                    item = self._hook(item)
+                return item
+            if self._chunks is None:
+                raise StopIteration
+            try:
+                data = next(self._chunks)
+                final = False
+            except StopIteration:
+                data = b''
+                final = True
+            try:
+                self._items = iter(self._parser.feed(data, final))
+            except Exception:
+                self.close()
+                raise
+            if final:
+                self.close()
+                self._parser.check()
+
+    next = __next__
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+            Releases the underlying connection, also done once the whole
+            response has been read.
+        """
+        self._chunks = None
+        if self._close is not None:
+            self._close()
+            self._close = None
@@ -0,0 +1,130 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import calendar
+from datetime import date, datetime
+import re
+import time
+
+
+_iso8601 = re.compile(
+    r'\s*(\d{4})-(\d\d)-(\d\d)'
+    r'(?:[T ](\d\d):(\d\d)(?::(\d\d)(?:[.,](\d+))?)?)?'
+    r'\s*(Z|[+-]\d\d(?::?\d\d)?)?\s*$', re.IGNORECASE)
+_epoch = datetime(1970, 1, 1)
+
+
+def _parse_iso8601(value):
+    # Unix epoch of an ISO-8601 date or date and time, None if value is
+    # not in one of the usual ISO-8601 forms.
+    m = _iso8601.match(value)
+    if m is None:
+        return None
+    year, month, day, hour, minute, second, fraction, zone = m.groups()
+    try:
+        moment = datetime(int(year), int(month), int(day), int(hour or 0),
+                          int(minute or 0), int(second or 0))
+    except ValueError:
+        return None
+    epoch = (moment - _epoch).total_seconds()
+    if fraction:
+        epoch += int(fraction[:6]) / 10. ** len(fraction[:6])
+    if zone and zone not in 'zZ':
+        offset = int(zone[1:3]) * 3600 + int(zone[-2:] if len(zone) > 3
+                                             else 0) * 60
+        epoch += -offset if zone[0] == '+' else offset
+    return epoch
+
+
+def to_epoch(value):
+    """
+        Converts value to a Unix epoch timestamp (float). value can be an
+        epoch (int or float), a datetime, a date or a date string. Naive
+        datetimes and strings without a timezone are taken as UTC.
+
+        Numbers, datetimes and ISO-8601 strings ("2014-05-01",
+        "2014-05-01T12:00:00Z", "2014-05-01 12:00:00.5+02:00", ...) are
+        converted directly; only the other strings go through dateutil's
+        parser.
+
+        :raises ValueError: If value cannot be converted.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None or value.utcoffset() is None:
+            return (value - _epoch).total_seconds()
+        return calendar.timegm(value.utctimetuple()) + \
+            value.microsecond / 1e6
+    if isinstance(value, date):
+        return float(calendar.timegm(value.timetuple()))
+    if not isinstance(value, str):
+        raise ValueError('Unsupported time: {!r}'.format(value))
+    epoch = _parse_iso8601(value)
+    if epoch is not None:
+        return epoch
+    from dateutil.parser import parse
+    try:
+        return to_epoch(parse(value))
+    except (ValueError, OverflowError):
+        raise ValueError('Unable to convert time to timestamp: {!r}'.format(
+            value))
+
+
+def query_timestamp(query, value, ago=0):
+    """
+        Unix epoch of value for the query being built, or of ago seconds
+        before now when value is None. When value cannot be converted the
+        error is recorded in query, which is then not sent, and None is
+        returned.
+    """
+    if value is None:
+        return time.time() - ago
+    try:
+        return to_epoch(value)
+    except ValueError:
+        query['error'] = 'Unable to convert time to timestamp: {!r}'.format(
+            value)
+        return None
+
+
+_slice_seconds = {'hour': 3600, 'day': 86400}
+
+
+def slice_start(value, interval):
+    """
+        Start (Unix epoch) of the urlfeed slice of the given interval
+        ('hour' or 'day', in UTC) holding value.
+    """
+    value = int(to_epoch(value) // 1)
+    return value - value % _slice_seconds[interval]
+
+
+def slice_end(value, interval):
+    """
+        End (Unix epoch, excluded) of the urlfeed slice of the given
+        interval holding value.
+    """
+    return slice_start(value, interval) + _slice_seconds[interval]
+
+
+def last_closed(interval, now=None):
+    """
+        End of the last closed urlfeed slice of the given interval, that
+        is the start of the one still open at now (default: the current
+        time).
+    """
+    return slice_start(time.time() if now is None else now, interval)
+
+
+def slices(start, end, interval):
+    """
+        Generator of the start of every urlfeed slice of the given
+        interval overlapping [start, end), in time order.
+    """
+    step = _slice_seconds[interval]
+    current = slice_start(start, interval)
+    end = to_epoch(end)
+    while current < end:
+        yield current
+        current += step
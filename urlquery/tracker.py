@@ -0,0 +1,245 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import heapq
+import itertools
+import threading
+import time
+
+from .api import default_client
+from .errors import APIError
+from .records import field
+
+
+class SubmissionError(APIError):
+    """
+        Raised through a tracked future when the API reports a status
+        other than queued, processing or done for a submission. The
+        QUEUE_STATUS (or error response) is in the response attribute.
+    """
+
+    def __init__(self, response):
+        super(SubmissionError, self).__init__(
+            response, 'Unexpected queue status: {}'.format(response))
+
+
+class _Pending(object):
+    __slots__ = ["queue_id", "priority", "apikey", "future", "submitted",
+                 "interval", "errors"]
+
+    def __init__(self, queue_id, priority, apikey, future, interval):
+        self.queue_id = queue_id
+        self.priority = priority
+        self.apikey = apikey
+        self.future = future
+        self.submitted = time.time()
+        self.interval = interval
+        self.errors = 0
+
+
+class SubmissionTracker(object):
+    """
+        Waits for submitted URLs to be processed and resolves them to
+        their report.
+
+        track() takes a QUEUE_STATUS returned by submit or mass_submit
+        and returns a concurrent.futures.Future resolving to the finished
+        report. A single background thread polls queue_status for all the
+        outstanding submissions:
+
+            * the first poll of a submission happens once most of the
+              expected processing time for its priority has elapsed. The
+              expected times start from the defaults below and follow the
+              processing times actually observed.
+            * while a submission is still queued the delay between two
+              polls grows by backoff, up to max_interval. Once it is
+              processing it is polled every min_interval.
+            * polls are never sent faster than max_polls_per_second, no
+              matter how many submissions are outstanding.
+
+        :param client: URLQuery instance used to poll and fetch the
+            reports. (default: the module level default_client())
+
+        :param max_polls_per_second: Upper bound of queue_status calls
+            per second. (default: 2)
+
+        :param include_details: Passed to report when fetching the
+            finished reports. (default: False)
+
+        :param workers: Number of threads sending the queue_status and
+            report calls. (default: 4)
+    """
+    __slots__ = ["client", "max_polls_per_second", "min_interval",
+                 "max_interval", "backoff", "max_errors", "include_details",
+                 "_estimates", "_heap", "_seq", "_cond", "_closed",
+                 "_thread", "_workers"]
+
+    # Expected processing time in seconds, per priority.
+    estimates = {'urlfeed': 3600., 'low': 120., 'medium': 60., 'high': 30.}
+
+    def __init__(self, client=None, max_polls_per_second=2.,
+                 min_interval=5., max_interval=600., backoff=1.5,
+                 max_errors=5, include_details=False, workers=4):
+        if client is None:
+            client = default_client()
+        self.client = client
+        self.max_polls_per_second = max_polls_per_second
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_errors = max_errors
+        self.include_details = include_details
+        self._estimates = dict(self.estimates)
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+        self._workers = ThreadPoolExecutor(workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._heap)
+
+    def track(self, queue_status, apikey=None):
+        """
+            Starts tracking a submission.
+
+            :param queue_status: QUEUE_STATUS returned by submit (or one
+                entry of the list returned by mass_submit).
+
+            :param apikey: Key used to poll and fetch the report, it must
+                be the one the URL has been submitted with.
+
+            :return: Future resolving to the BASICREPORT once processed.
+        """
+        future = Future()
+        queue_id = field(queue_status, 'queue_id')
+        report_id = field(queue_status, 'report_id')
+        if field(queue_status, 'status') == 'done' and report_id is not None:
+            self._workers.submit(self._fetch_report, future, report_id,
+                                 apikey)
+            return future
+        if queue_id is None:
+            future.set_exception(SubmissionError(queue_status))
+            return future
+
+        priority = field(queue_status, 'priority', 'low')
+        with self._cond:
+            estimate = self._estimates.get(priority, self._estimates['low'])
+        entry = _Pending(queue_id, priority, apikey, future,
+                         max(self.min_interval, estimate / 10.))
+        self._schedule(entry, estimate * .75)
+        return future
+
+    def track_many(self, queue_statuses, apikey=None):
+        """
+            Calls track on every QUEUE_STATUS and returns the list of
+            futures, in the same order.
+        """
+        return [self.track(status, apikey) for status in queue_statuses]
+
+    def close(self, wait=True):
+        """
+            Stops polling. Futures still pending are cancelled.
+        """
+        with self._cond:
+            self._closed = True
+            pending, self._heap = self._heap, []
+            self._cond.notify_all()
+        for _, _, entry in pending:
+            entry.future.cancel()
+        if wait and self._thread is not None:
+            self._thread.join()
+        self._workers.shutdown(wait=wait)
+
+    def _schedule(self, entry, delay):
+        with self._cond:
+            if self._closed:
+                entry.future.cancel()
+                return
+            heapq.heappush(self._heap,
+                           (time.time() + delay, next(self._seq), entry))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify()
+
+    def _next_due(self):
+        with self._cond:
+            while not self._closed:
+                if self._heap:
+                    delay = self._heap[0][0] - time.time()
+                    if delay <= 0:
+                        return heapq.heappop(self._heap)[2]
+                    self._cond.wait(delay)
+                else:
+                    self._cond.wait()
+        return None
+
+    def _run(self):
+        spacing = 1. / self.max_polls_per_second
+        last_poll = 0.
+        while True:
+            entry = self._next_due()
+            if entry is None:
+                return
+            if entry.future.cancelled():
+                continue
+            delay = last_poll + spacing - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            last_poll = time.time()
+            self._workers.submit(self._poll, entry)
+
+    def _poll(self, entry):
+        try:
+            status = self.client.queue_status(entry.queue_id,
+                                              apikey=entry.apikey)
+        except Exception as e:
+            entry.errors += 1
+            if entry.errors >= self.max_errors:
+                if entry.future.set_running_or_notify_cancel():
+                    entry.future.set_exception(e)
+            else:
+                self._schedule(entry, entry.interval * entry.errors)
+            return
+
+        state = field(status, 'status')
+        report_id = field(status, 'report_id')
+        if state == 'done' and report_id is not None:
+            self._observe(entry)
+            self._fetch_report(entry.future, report_id, entry.apikey)
+        elif state == 'processing':
+            entry.interval = self.min_interval
+            self._schedule(entry, entry.interval)
+        elif state == 'queued':
+            entry.interval = min(entry.interval * self.backoff,
+                                 self.max_interval)
+            self._schedule(entry, entry.interval)
+        elif entry.future.set_running_or_notify_cancel():
+            entry.future.set_exception(SubmissionError(status))
+
+    def _observe(self, entry):
+        elapsed = time.time() - entry.submitted
+        with self._cond:
+            estimate = self._estimates.get(entry.priority, elapsed)
+            self._estimates[entry.priority] = .8 * estimate + .2 * elapsed
+
+    def _fetch_report(self, future, report_id, apikey):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(self.client.report(
+                report_id, include_details=self.include_details,
+                apikey=apikey))
+        except Exception as e:
+            future.set_exception(e)
@@ -0,0 +1,388 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+import gzip
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+from .errors import RecordingNotFound
+
+
+class Response(object):
+    """
+        HTTP response returned by the transports.
+
+        :param status: HTTP status code.
+
+        :param headers: dict of the response headers, with lower case
+            names.
+
+        :param chunks: Function of a chunk size returning an iterator over
+            the body, as received (not decompressed).
+
+        :param close: Function releasing the connection, if any.
+
+        :param connect: Seconds spent waiting for a connection from the
+            pool and opening it, None if the transport cannot tell.
+    """
+    __slots__ = ["status", "headers", "_chunks", "_close", "connect"]
+
+    def __init__(self, status, headers, chunks, close=None, connect=None):
+        self.status = status
+        self.headers = headers
+        self._chunks = chunks
+        self._close = close
+        self.connect = connect
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    def stream(self, chunk_size=65536):
+        return self._chunks(chunk_size)
+
+    def read(self):
+        return b''.join(self.stream())
+
+    def close(self):
+        if self._close is not None:
+            self._close()
+
+
+def _lower(headers):
+    return dict((name.lower(), value) for name, value in headers.items())
+
+
+# Seconds spent by the current thread getting a connection from a pool
+# and connecting it, see _timed_pools.
+_timing = threading.local()
+_pool_classes = {}
+
+
+def _connect_time(start):
+    _timing.connect = getattr(_timing, 'connect', 0.) + \
+        time.perf_counter() - start
+
+
+def _timed_pools():
+    # urllib3 connection pools measuring the time taken to get a
+    # connection, for Response.connect. Empty if this urllib3 does not
+    # have the (private) methods they override.
+    if not _pool_classes:
+        try:
+            from urllib3 import connection, connectionpool
+        except ImportError:
+            return _pool_classes
+        if not hasattr(connectionpool.HTTPConnectionPool, '_get_conn') or \
+                not hasattr(connection.HTTPConnection, 'connect'):
+            return _pool_classes
+
+        def timed(pool_class, connection_class):
+            class TimedConnection(connection_class):
+                def connect(self, *args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return super(TimedConnection, self).connect(
+                            *args, **kwargs)
+                    finally:
+                        _connect_time(start)
+
+            class TimedPool(pool_class):
+                ConnectionCls = TimedConnection
+
+                def _get_conn(self, *args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return super(TimedPool, self)._get_conn(
+                            *args, **kwargs)
+                    finally:
+                        _connect_time(start)
+            return TimedPool
+
+        _pool_classes.update({
+            'http': timed(connectionpool.HTTPConnectionPool,
+                          connection.HTTPConnection),
+            'https': timed(connectionpool.HTTPSConnectionPool,
+                           connection.HTTPSConnection)})
+    return _pool_classes
+
+
+def _time_connections(manager):
+    # Makes the urllib3 PoolManager manager use _timed_pools, if they
+    # subclass its own pools: an old requests bundles its own copy of
+    # urllib3, whose pools cannot be replaced. Returns whether the
+    # connections are timed.
+    pools = _timed_pools()
+    current = getattr(manager, 'pool_classes_by_scheme', None)
+    if not pools or not current or \
+            not all(issubclass(pools.get(scheme, object), pool_class)
+                    for scheme, pool_class in current.items()):
+        return False
+    manager.pool_classes_by_scheme = pools
+    return True
+
+
+class Transport(object):
+    """
+        Sends the requests of a URLQuery. post(url, body, headers) sends
+        one request and returns a Response, close() closes the pooled
+        connections. Transports are shared by all the threads using a
+        client.
+
+        transient_errors are the exception classes of the HTTP library
+        which do not subclass EnvironmentError but mean that the request
+        may succeed if sent again (refused connection, timeout, ...): the
+        RetryPolicy of the client retries them too.
+    """
+    __slots__ = []
+    transient_errors = ()
+
+    def post(self, url, body, headers):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class RequestsTransport(Transport):
+    """
+        Default transport: requests, with one session per thread over a
+        shared pool of keep-alive connections. requests is only imported,
+        and the pool only created, for the first request.
+
+        :param pool_connections, pool_maxsize, pool_block: See
+            requests.adapters.HTTPAdapter.
+    """
+    __slots__ = ["_pool", "_adapter", "_lock", "_local", "_timed"]
+
+    def __init__(self, pool_connections=10, pool_maxsize=10,
+                 pool_block=False):
+        self._pool = {'pool_connections': pool_connections,
+                      'pool_maxsize': pool_maxsize, 'pool_block': pool_block}
+        self._adapter = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._timed = False
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            import requests
+            if self._adapter is None:
+                with self._lock:
+                    if self._adapter is None:
+                        adapter = requests.adapters.HTTPAdapter(
+                            **self._pool)
+                        self._timed = _time_connections(
+                            adapter.poolmanager)
+                        self._adapter = adapter
+            session = requests.Session()
+            session.mount('https://', self._adapter)
+            session.mount('http://', self._adapter)
+            self._local.session = session
+        return session
+
+    def post(self, url, body, headers):
+        session = self._session()
+        _timing.connect = 0.
+        r = session.post(url, data=body, headers=headers, stream=True)
+
+        def chunks(chunk_size):
+            return r.raw.stream(chunk_size, decode_content=False)
+        return Response(r.status_code, _lower(r.headers), chunks, r.close,
+                        _timing.connect if self._timed else None)
+
+    def close(self):
+        if self._adapter is not None:
+            self._adapter.close()
+
+
+class Urllib3Transport(Transport):
+    """
+        Transport calling urllib3 directly, skipping the sessions,
+        hooks and header merging of requests: less CPU per call.
+
+        :param maxsize: Number of connections kept per host.
+
+        :param block: Wait for a free connection instead of opening more
+            than maxsize.
+
+        :param timeout: Connect and read timeout in seconds, None waits
+            forever.
+    """
+    __slots__ = ["_manager", "timeout", "transient_errors", "_timed"]
+
+    def __init__(self, maxsize=10, block=False, timeout=None):
+        import urllib3
+        from urllib3 import exceptions
+        self._manager = urllib3.PoolManager(maxsize=maxsize, block=block)
+        self._timed = _time_connections(self._manager)
+        self.timeout = timeout
+        self.transient_errors = (exceptions.NewConnectionError,
+                                 exceptions.ProtocolError,
+                                 exceptions.TimeoutError,
+                                 exceptions.SSLError,
+                                 exceptions.ProxyError)
+
+    def post(self, url, body, headers):
+        _timing.connect = 0.
+        r = self._manager.urlopen('POST', url, body=body, headers=headers,
+                                  preload_content=False,
+                                  decode_content=False, retries=False,
+                                  timeout=self.timeout)
+
+        def chunks(chunk_size):
+            return r.stream(chunk_size, decode_content=False)
+
+        def close():
+            # Closes the connection if the body was not entirely read,
+            # gives it back to the pool otherwise.
+            r.close()
+            r.release_conn()
+        return Response(r.status, _lower(r.headers), chunks, close,
+                        _timing.connect if self._timed else None)
+
+    def close(self):
+        self._manager.clear()
+
+
+class HTTPXTransport(Transport):
+    """
+        Transport based on httpx, which can speak HTTP/2: all the
+        requests to the API are multiplexed over a few connections.
+        Needs httpx, and h2 for HTTP/2 ("pip install httpx[http2]").
+
+        :param http2: Use HTTP/2 when the server supports it.
+
+        :param max_connections: Maximum number of open connections.
+
+        :param timeout: Timeout in seconds, None waits forever.
+    """
+    __slots__ = ["_client", "transient_errors"]
+
+    def __init__(self, http2=True, max_connections=10, timeout=None):
+        import httpx
+        self.transient_errors = (httpx.TransportError,)
+        self._client = httpx.Client(
+            http2=http2, timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections))
+
+    def post(self, url, body, headers):
+        request = self._client.build_request('POST', url, content=body,
+                                             headers=headers)
+        r = self._client.send(request, stream=True)
+        return Response(r.status_code, _lower(r.headers), r.iter_raw,
+                        r.close)
+
+    def close(self):
+        self._client.close()
+
+
+def recording_key(body, headers):
+    """
+        Name of the recording of a request: hash of its query without
+        the API key and the gzip flag, so recordings can be shared and
+        replayed whatever the key or compression of the client.
+    """
+    if headers.get('Content-Encoding') == 'gzip':
+        body = gzip.decompress(body)
+    query = json.loads(body.decode('utf-8'))
+    query.pop('key', None)
+    query.pop('gzip', None)
+    query = json.dumps(query, sort_keys=True)
+    return hashlib.sha1(query.encode('utf-8')).hexdigest(), query
+
+
+class RecordingTransport(Transport):
+    """
+        Sends the requests with transport and saves every response in
+        the directory path, for ReplayTransport. A response is saved once
+        its body has been entirely read, in two files: <key>.json (status
+        and headers) and <key>.body (body as received). The last response
+        to identical queries wins.
+
+        :param transport: Transport sending the requests, default
+            RequestsTransport().
+    """
+    __slots__ = ["path", "transport", "transient_errors"]
+
+    def __init__(self, path, transport=None):
+        self.path = path
+        self.transport = transport if transport is not None else \
+            RequestsTransport()
+        self.transient_errors = self.transport.transient_errors
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def post(self, url, body, headers):
+        key, query = recording_key(body, headers)
+        r = self.transport.post(url, body, headers)
+        fd, temp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        out = os.fdopen(fd, 'wb')
+        state = {'complete': False}
+
+        def chunks(chunk_size):
+            for chunk in r.stream(chunk_size):
+                out.write(chunk)
+                yield chunk
+            state['complete'] = True
+
+        def close():
+            r.close()
+            out.close()
+            if not state['complete']:
+                os.remove(temp)
+                return
+            with open(os.path.join(self.path, key + '.json'), 'w') as f:
+                json.dump({'query': json.loads(query), 'status': r.status,
+                           'headers': r.headers}, f, sort_keys=True)
+            os.rename(temp, os.path.join(self.path, key + '.body'))
+        return Response(r.status, r.headers, chunks, close, r.connect)
+
+    def close(self):
+        self.transport.close()
+
+
+class ReplayTransport(Transport):
+    """
+        Answers the requests with the responses saved by a
+        RecordingTransport in the directory path, without any network
+        access. Raises RecordingNotFound for a query never recorded.
+    """
+    __slots__ = ["path", "_meta", "_lock"]
+
+    def __init__(self, path):
+        self.path = path
+        self._meta = {}
+        self._lock = threading.Lock()
+
+    def _load(self, key):
+        meta = self._meta.get(key)
+        if meta is None:
+            try:
+                with open(os.path.join(self.path, key + '.json')) as f:
+                    meta = json.load(f)
+            except IOError:
+                return None
+            with self._lock:
+                self._meta[key] = meta
+        return meta
+
+    def post(self, url, body, headers):
+        key, query = recording_key(body, headers)
+        meta = self._load(key)
+        if meta is None:
+            raise RecordingNotFound(query)
+        f = open(os.path.join(self.path, key + '.body'), 'rb')
+
+        def chunks(chunk_size):
+            return iter(lambda: f.read(chunk_size), b'')
+        return Response(meta['status'], meta['headers'], chunks, f.close)
@@ -0,0 +1,258 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import collections
+import ipaddress
+
+from .records import Record, field
+
+
+class Automaton(object):
+    """
+        Aho-Corasick automaton: finds all the patterns contained in a
+        text in a single pass over the text, whatever the number of
+        patterns.
+
+        :param patterns: Dict of pattern to the values reported when the
+            pattern is found.
+    """
+    __slots__ = ["_goto", "_fail", "_out"]
+
+    def __init__(self, patterns):
+        goto = [{}]
+        out = [frozenset()]
+        for pattern, values in patterns.items():
+            state = 0
+            for c in pattern:
+                following = goto[state].get(c)
+                if following is None:
+                    following = len(goto)
+                    goto[state][c] = following
+                    goto.append({})
+                    out.append(frozenset())
+                state = following
+            out[state] = out[state] | frozenset(values)
+
+        fail = [0] * len(goto)
+        queue = collections.deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for c, following in goto[state].items():
+                queue.append(following)
+                f = fail[state]
+                while f and c not in goto[f]:
+                    f = fail[f]
+                fail[following] = goto[f].get(c, 0)
+                out[following] = out[following] | out[fail[following]]
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def _step(self, state, c):
+        # Transition of a state without a goto edge for c, through the
+        # failure links. It is remembered as a goto edge, so the automaton
+        # turns into a DFA for the (state, character) pairs actually seen.
+        goto = self._goto
+        following = goto[state].get(c)
+        if following is None:
+            following = self._step(self._fail[state], c) if state else 0
+            goto[state][c] = following
+        return following
+
+    def search(self, text):
+        """
+            Returns the set of the values of the patterns found in text.
+        """
+        goto, out = self._goto, self._out
+        found = set()
+        state = 0
+        for c in text:
+            following = goto[state].get(c)
+            if following is None:
+                following = self._step(state, c)
+            state = following
+            if out[state]:
+                found |= out[state]
+        return found
+
+
+class PrefixTable(object):
+    """
+        Longest-prefix style lookup of IP addresses in a set of CIDR
+        blocks. Blocks are grouped by prefix length in hash tables keyed
+        by the network number, so a lookup costs one hash lookup per
+        distinct prefix length (at most 33 for IPv4, 129 for IPv6) and
+        does not depend on the number of blocks.
+
+        :param blocks: Dict of CIDR block to the values reported for the
+            addresses it contains.
+    """
+    __slots__ = ["_tables"]
+
+    def __init__(self, blocks):
+        tables = {4: {}, 6: {}}
+        for block, values in blocks.items():
+            network = ipaddress.ip_network(block, strict=False)
+            by_length = tables[network.version].setdefault(
+                network.prefixlen, {})
+            shift = network.max_prefixlen - network.prefixlen
+            key = int(network.network_address) >> shift
+            by_length[key] = by_length.get(key, frozenset()) | \
+                frozenset(values)
+        self._tables = dict(
+            (version, [(bits - length, table)
+                       for length, table in sorted(by_length.items())])
+            for version, bits, by_length in ((4, 32, tables[4]),
+                                             (6, 128, tables[6])))
+
+    def search(self, addr):
+        """
+            Returns the set of the values of the blocks containing addr,
+            an empty set for an invalid address.
+        """
+        try:
+            address = ipaddress.ip_address(addr)
+        except ValueError:
+            return set()
+        number = int(address)
+        found = set()
+        for shift, table in self._tables[address.version]:
+            values = table.get(number >> shift)
+            if values:
+                found |= values
+        return found
+
+
+class WatchList(object):
+    """
+        Compiled set of watch rules over URL objects (urlfeed entries),
+        matched in time linear in the number of entries whatever the
+        number of rules.
+
+            watch = WatchList()
+            watch.add('bank', hosts=['paypal', 'apple-id'],
+                      urls=['/wp-admin/'], cidrs=['192.0.2.0/24'])
+            watch.add('lu', countries=['LU'], tlds=['lu'])
+            for url, names in watch.scan(uq.urlfeed()['feed']):
+                ...
+
+        A rule matches a URL object if any of its conditions does:
+
+        * hosts: substrings of the fqdn (or domain), case insensitive,
+        * urls: substrings of the URL,
+        * fqdns: exact fqdns, case insensitive,
+        * tlds: exact TLDs, case insensitive,
+        * cidrs: CIDR blocks (IPv4 or IPv6) containing ip.addr,
+        * asns: ip.asn values,
+        * countries: ip.cc codes or ip.country names.
+
+        The substrings are compiled in Aho-Corasick automatons, the CIDR
+        blocks in a PrefixTable, and the other values in hash tables. The
+        rules are compiled on the first match after a change. As hosts and
+        IP addresses repeat a lot in the feed, up to cache_size results are
+        remembered.
+    """
+    __slots__ = ["cache_size", "_rules", "_compiled", "_cache"]
+
+    def __init__(self, cache_size=100000):
+        self.cache_size = cache_size
+        self._rules = collections.OrderedDict()
+        self._compiled = None
+        self._cache = {}
+
+    def __len__(self):
+        return len(self._rules)
+
+    def add(self, name, hosts=(), urls=(), fqdns=(), tlds=(), cidrs=(),
+            asns=(), countries=()):
+        """
+            Adds (or replaces) the rule name.
+        """
+        for block in cidrs:
+            # Fail early on invalid blocks.
+            ipaddress.ip_network(block, strict=False)
+        self._rules[name] = {
+            'hosts': [h.lower() for h in hosts], 'urls': list(urls),
+            'fqdns': [f.lower() for f in fqdns],
+            'tlds': [t.lower() for t in tlds], 'cidrs': list(cidrs),
+            'asns': list(asns), 'countries': list(countries)}
+        self._compiled = None
+
+    def remove(self, name):
+        """
+            Removes the rule name.
+        """
+        del self._rules[name]
+        self._compiled = None
+
+    def _compile(self):
+        tables = dict((kind, {}) for kind in ('hosts', 'urls', 'fqdns',
+                                              'tlds', 'cidrs', 'asns',
+                                              'countries'))
+        for name, rule in self._rules.items():
+            for kind, values in rule.items():
+                for value in values:
+                    tables[kind].setdefault(value, set()).add(name)
+        for kind in ('fqdns', 'tlds', 'asns', 'countries'):
+            tables[kind] = dict((value, frozenset(names))
+                                for value, names in tables[kind].items())
+        tables['hosts'] = Automaton(tables['hosts'])
+        tables['urls'] = Automaton(tables['urls'])
+        tables['cidrs'] = PrefixTable(tables['cidrs'])
+        self._cache = {}
+        self._compiled = tables
+
+    def _cached(self, key, compute):
+        found = self._cache.get(key)
+        if found is None:
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            found = self._cache[key] = compute()
+        return found
+
+    def match(self, url):
+        """
+            Returns the set of the names of the rules matching the URL
+            object url (dict or record).
+        """
+        if self._compiled is None:
+            self._compile()
+        tables = self._compiled
+        if not isinstance(url, (dict, Record)):
+            return set()
+        found = set()
+        fqdn = field(url, 'fqdn') or field(url, 'domain')
+        if fqdn:
+            fqdn = fqdn.lower()
+            found |= self._cached(('host', fqdn), lambda: frozenset(
+                tables['hosts'].search(fqdn) |
+                tables['fqdns'].get(fqdn, frozenset())))
+        addr = field(url, 'addr')
+        if addr:
+            found |= tables['urls'].search(addr)
+        tld = field(url, 'tld')
+        if tld:
+            found |= tables['tlds'].get(tld.lower(), frozenset())
+        ip = field(url, 'ip')
+        if ip:
+            ip_addr = field(ip, 'addr')
+            if ip_addr:
+                found |= self._cached(('ip', ip_addr), lambda: frozenset(
+                    tables['cidrs'].search(ip_addr)))
+            asn = field(ip, 'asn')
+            if asn is not None:
+                found |= tables['asns'].get(asn, frozenset())
+            for country in (field(ip, 'cc'), field(ip, 'country')):
+                if country:
+                    found |= tables['countries'].get(country, frozenset())
+        return found
+
+    def scan(self, urls):
+        """
+            Matches every URL object of urls and yields (url, names) for
+            the ones matching at least one rule.
+        """
+        for url in urls:
+            names = self.match(url)
+            if names:
+                yield url, names